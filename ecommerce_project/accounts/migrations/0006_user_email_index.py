@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+# RegistrationForm.clean_email and password_reset_request look users up by
+# email. auth_user belongs to django.contrib.auth, so the index is created
+# here rather than declared on the model.
+EMAIL_INDEX = models.Index(fields=["email"], name="auth_user_email_idx")
+
+
+def add_email_index(apps, schema_editor):
+    schema_editor.add_index(apps.get_model("auth", "User"), EMAIL_INDEX)
+
+
+def remove_email_index(apps, schema_editor):
+    schema_editor.remove_index(apps.get_model("auth", "User"), EMAIL_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0005_alter_profile_account_type"),
+        ("auth", "0012_alter_user_first_name_max_length"),
+    ]
+
+    operations = [
+        migrations.RunPython(add_email_index, remove_email_index),
+    ]
@@ -7,6 +7,7 @@ urlpatterns = [
     path("register/", views.register, name="register"),
     path("login/", views.user_login, name="login"),
     path("logout/", views.user_logout, name="logout"),
+    path("fragments/", views.user_fragments, name="fragments"),
     path(
         "password_reset/",
         views.password_reset_request,
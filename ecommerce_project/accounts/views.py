@@ -3,14 +3,30 @@ from django.contrib.auth import login, authenticate, logout
 # from django.urls import reverse
 from django.contrib import messages
 from django.contrib.auth.models import User
-from django.core.mail import EmailMessage
+from django.db import transaction
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
 from django.template.loader import render_to_string
 from django.contrib.auth.tokens import default_token_generator
+from django.http import Http404, JsonResponse
+from django.views.decorators.cache import never_cache
 
 from .forms import RegistrationForm, CustomAuthenticationForm
 from .models import Profile  # Import the Profile model
+from functions.mail import queue_email
+from functions.pagecache import SIGNED_IN_COOKIE
+from products.cache import get_product_or_404
+
+# Per-user parts of shared pages, served by user_fragments: the name used in
+# the pages' data-fragment attributes -> template.
+FRAGMENTS = {
+    "nav": "partials/user_nav.html",
+    "cart": "partials/cart_badge.html",
+    "product_actions": "products/partials/product_actions.html",
+    "review_actions": "products/partials/review_actions.html",
+}
+# Fragments rendered for a product (the page's data-product attribute).
+PRODUCT_FRAGMENTS = {"product_actions", "review_actions"}
 
 
 def register(request):
@@ -133,19 +149,71 @@ def user_logout(request):
     """
     logout(request)
     messages.info(request, "Logged out successfully.")
-    return redirect("accounts:login")
+    response = redirect("accounts:login")
+    response.delete_cookie(SIGNED_IN_COOKIE, samesite="Lax")
+    return response
+
+
+@never_cache
+def user_fragments(request):
+    """
+    Render the per-user parts of a shared page as JSON.
+
+    Cached pages are rendered as for a visitor who is not logged in (see
+    functions.pagecache), and base.html fetches this for logged-in users
+    to fill in the welcome line, the cart badge and the action buttons.
+
+    Args:
+        request (HttpRequest): The HTTP request object. ``names`` lists the
+            fragments wanted, separated by commas; ``product`` is the id of
+            the product shown, for the product fragments.
+
+    Returns:
+        JsonResponse: {"authenticated": bool, "fragments": {name: html}},
+        never cached.
+
+    Raises:
+        Http404: If the product does not exist.
+    """
+    names = [
+        name
+        for name in request.GET.get("names", "").split(",")
+        if name in FRAGMENTS
+    ]
+    context = {}
+    product_id = request.GET.get("product", "")
+    if product_id:
+        if not product_id.isdigit():
+            raise Http404("No Product matches the given query.")
+        context["product"] = get_product_or_404(product_id)
+    else:
+        names = [name for name in names if name not in PRODUCT_FRAGMENTS]
+    fragments = {
+        name: render_to_string(FRAGMENTS[name], context, request=request)
+        for name in names
+    }
+    response = JsonResponse(
+        {
+            "authenticated": request.user.is_authenticated,
+            "fragments": fragments,
+        }
+    )
+    if not request.user.is_authenticated:
+        # The session expired: stop loading fragments into shared pages.
+        response.delete_cookie(SIGNED_IN_COOKIE, samesite="Lax")
+    return response
 
 
 def password_reset_request(request):
     """
-    Handles password reset requests by sending a password reset email
+    Handles password reset requests by queuing a password reset email
     to the user.
 
     This view processes POST requests containing an email address, checks if
-    there are any users associated with the provided email, and sends a
-    password reset email to each associated user. If no users are found,
-    an error message is displayed. For GET requests, it renders the password
-    reset form.
+    there are any users associated with the provided email, and queues a
+    password reset email to each associated user in the email outbox. If no
+    users are found, an error message is displayed. For GET requests, it
+    renders the password reset form.
 
     Args:
         request (HttpRequest): The HTTP request object containing metadata
@@ -163,23 +231,24 @@ def password_reset_request(request):
         email = request.POST.get("email")
         associated_users = User.objects.filter(email=email)
         if associated_users.exists():
-            for user in associated_users:
-                subject = "Password Reset Requested"
-                email_template_name = "accounts/password_reset_email.txt"
-                context = {
-                    "email": user.email,
-                    "domain": request.META["HTTP_HOST"],
-                    "site_name": "eCommerce Site",
-                    "uid": urlsafe_base64_encode(force_bytes(user.pk)),
-                    "user": user,
-                    "token": default_token_generator.make_token(user),
-                    "protocol": "http",
-                }
-                email_body = render_to_string(email_template_name, context)
-                email_message = EmailMessage(
-                    subject, email_body, to=[user.email]
-                )
-                email_message.send()
+            # Emails go to the outbox and are sent by the outbox worker.
+            with transaction.atomic():
+                for user in associated_users:
+                    subject = "Password Reset Requested"
+                    email_template_name = "accounts/password_reset_email.txt"
+                    context = {
+                        "email": user.email,
+                        "domain": request.META["HTTP_HOST"],
+                        "site_name": "eCommerce Site",
+                        "uid": urlsafe_base64_encode(force_bytes(user.pk)),
+                        "user": user,
+                        "token": default_token_generator.make_token(user),
+                        "protocol": "http",
+                    }
+                    email_body = render_to_string(
+                        email_template_name, context
+                    )
+                    queue_email(subject, email_body, [user.email])
             messages.success(
                 request, "A password reset link has been sent to your email."
             )
@@ -37,6 +37,8 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    # Used by the {% load humanize %} in reviews/review_list.html
+    "django.contrib.humanize",
     # Third-party apps for API functionality
     "rest_framework",
     "rest_framework_xml",
@@ -47,14 +49,30 @@ INSTALLED_APPS = [
     "orders",
     "reviews",
     "accounts.apps.AccountsConfig",
+    # Shared helpers and background workers (email and tweet outboxes)
+    "functions",
 ]
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    # Routes reads to the replicas, keeping recent writers on the primary
+    "functions.routers.PrimaryStickinessMiddleware",
+    # Drops per-process cache entries that other processes invalidated
+    "functions.versions.VersionSyncMiddleware",
+    # Request counts and latencies per view for the /metrics endpoint
+    "functions.metrics.MetricsMiddleware",
+    # Server-Timing headers and the slow-query log
+    "functions.instrumentation.SQLInstrumentationMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    # Profiles requests on demand; needs the user set just above
+    "functions.profiling.ProfilingMiddleware",
+    # Samples the memory requests allocate, per view and release
+    "functions.memprofile.MemoryProfilingMiddleware",
+    # Logs queries run inside template loops when TEMPLATE_QUERY_DEBUG is on
+    "functions.templatequeries.TemplateQueryMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -63,7 +81,8 @@ ROOT_URLCONF = "ecommerce_project.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # Django templates, timed for the Server-Timing header
+        "BACKEND": "functions.instrumentation.TimedDjangoTemplates",
         # Global templates directory;
         # app templates are discovered automatically
         "DIRS": [
@@ -91,7 +110,11 @@ WSGI_APPLICATION = "ecommerce_project.wsgi.application"
 # Database configuration – will be using MySQL Workbench.
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.mysql",
+        # The MySQL backend with pooled connections (functions/pool.py):
+        # requests reuse open connections instead of connecting to MySQL
+        # every time. Use "django.db.backends.mysql" with CONN_MAX_AGE = 60
+        # and CONN_HEALTH_CHECKS = True for plain persistent connections.
+        "ENGINE": "functions.db.mysql_pool",
         # Switch from sqlite to MySQL
         "NAME": "db_name",  # Replace with your actual DB name
         "USER": "your_db_user",  # Replace with your actual DB user
@@ -100,9 +123,42 @@ DATABASES = {
         # (e.g., localhost)
         "PORT": "3306",  # Replace with your actual DB port
         # (e.g., 3306 for MySQL)
-    }
+        # The pool owns connections between requests, so Django must hand
+        # them back after every request.
+        "CONN_MAX_AGE": 0,
+        "POOL": {
+            "max_size": 20,  # Per process (processes x 20 < max_connections)
+            "timeout": 5,  # Seconds to wait for a free connection
+            "max_lifetime": 1800,  # Below MySQL's wait_timeout
+        },
+    },
+    # Read replicas of "default" (add one entry per replica and list it in
+    # DATABASE_REPLICAS below):
+    # "replica1": {
+    #     "ENGINE": "functions.db.mysql_pool",
+    #     "NAME": "db_name",
+    #     "USER": "your_db_readonly_user",
+    #     "PASSWORD": "your_db_password",
+    #     "HOST": "db_replica_host",
+    #     "PORT": "3306",
+    #     "CONN_MAX_AGE": 0,
+    #     # Tests read the test database instead of a replica.
+    #     "TEST": {"MIRROR": "default"},
+    # },
 }
 
+# Writes go to DATABASE_PRIMARY and reads to a random DATABASE_REPLICAS
+# entry (see functions/routers.py). With no replicas everything uses the
+# primary. After writing, a user reads from the primary for
+# DATABASE_STICKY_SECONDS so they always see their own changes.
+DATABASE_ROUTERS = ["functions.routers.PrimaryReplicaRouter"]
+DATABASE_PRIMARY = "default"
+DATABASE_REPLICAS = []  # e.g. ["replica1"]
+DATABASE_STICKY_SECONDS = 10  # Longer than the worst replication lag
+DATABASE_STICKY_COOKIE = "db_primary"
+# Writes to these apps do not pin the user to the primary.
+DATABASE_STICKY_IGNORE_APPS = ["sessions"]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -184,6 +240,46 @@ DEFAULT_FROM_EMAIL = "Your Store <your_email@gmail.com>"
 
 # For using Gmail, the settings should be updated like this:
 
+# Outbound emails are written to an outbox table and delivered by
+# 'python manage.py send_outbox_emails', so views never wait on SMTP.
+EMAIL_OUTBOX_BATCH_SIZE = 50  # Emails sent per SMTP connection
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5  # Failed attempts before an email is dead
+EMAIL_OUTBOX_RETRY_DELAY = 60  # Seconds; doubled after every failure
+EMAIL_OUTBOX_MAX_RETRY_DELAY = 3600  # Upper bound for the back-off
+EMAIL_OUTBOX_LEASE = 300  # Seconds a worker may hold a claimed batch
+
+# Background task queue (functions.taskqueue), run with
+# 'python manage.py runworkers --processes N'. Tasks live in a database
+# table, so no external broker is needed.
+TASK_BATCH_SIZE = 10  # Tasks a worker claims at a time
+TASK_MAX_ATTEMPTS = 5
+TASK_RETRY_DELAY = 30  # Seconds; doubled after every failure
+TASK_MAX_RETRY_DELAY = 3600
+TASK_LEASE = 600  # Seconds before a claimed task is considered abandoned
+# Periodic tasks: registered task name -> seconds between runs.
+TASK_QUEUE_PERIODIC = {
+    "functions.send_outbox_emails": 10,
+    "functions.publish_tweets": 60,
+}
+
+# Twitter (X) integration. New stores and products are queued in a tweet
+# outbox and posted by 'python manage.py publish_tweets'. Obtain the access
+# tokens once with 'python manage.py twitter_login'.
+TWITTER_CONSUMER_KEY = "YOUR_CONSUMER_KEY"
+TWITTER_CONSUMER_SECRET = "YOUR_CONSUMER_SECRET"
+TWITTER_ACCESS_TOKEN = ""  # Leave blank to keep tweets queued
+TWITTER_ACCESS_TOKEN_SECRET = ""
+TWEET_API_URL = "https://api.twitter.com/2/tweets"
+TWEET_TRANSPORT = "functions.tweet.OAuthTransport"
+TWEET_TIMEOUT = 10  # Seconds per API call
+TWEET_BATCH_SIZE = 10
+TWEET_RATE_LIMIT = 50  # Posts allowed per TWEET_RATE_WINDOW
+TWEET_RATE_WINDOW = 900  # Seconds
+TWEET_MAX_ATTEMPTS = 5
+TWEET_RETRY_DELAY = 60  # Seconds; doubled after every failure
+TWEET_MAX_RETRY_DELAY = 3600
+TWEET_LEASE = 300
+
 # Django REST Framework settings – allow JSON and XML output.
 # Set default permission.
 REST_FRAMEWORK = {
@@ -196,6 +292,109 @@ REST_FRAMEWORK = {
     ),
 }
 
+# Seconds browsers and shared caches may reuse /api/reviews/summary/
+# responses.
+REVIEW_SUMMARY_MAX_AGE = 60
+
+# Shared cache used by every worker process. The in-memory default is per
+# process; in production point all processes at one Redis server:
+# CACHES = {
+#     "default": {
+#         "BACKEND": "django.core.cache.backends.redis.RedisCache",
+#         "LOCATION": "redis://127.0.0.1:6379",
+#     }
+# }
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+# Product cache (products.cache): a per-process LRU in front of the shared
+# cache. Changes reach the other processes' LRUs through version counters
+# in the shared cache (functions.versions), checked at the start of every
+# request; PRODUCT_CACHE_LOCAL_TTL bounds staleness outside requests.
+PRODUCT_CACHE_LOCAL_SIZE = 1000
+PRODUCT_CACHE_LOCAL_TTL = 5
+PRODUCT_CACHE_TTL = 300
+# Seconds a rebuild may hold its lock, and others wait for it.
+PRODUCT_CACHE_LOCK = 10
+PRODUCT_CACHE_WAIT = 1.0
+
+# Full-page cache for anonymous catalog pages (functions.pagecache). Pages
+# stay in the shared cache for up to PAGE_CACHE_TIMEOUT seconds and are
+# purged as soon as a product, store or review they show changes. Browsers
+# and proxies may reuse them for PAGE_CACHE_MAX_AGE seconds.
+PAGE_CACHE_TIMEOUT = 300
+PAGE_CACHE_MAX_AGE = 30
+
+# Request instrumentation (functions.instrumentation): the share of requests
+# whose SQL, template and view times are measured and sent in a
+# Server-Timing header, the statements slower than SQL_SLOW_QUERY_MS that
+# are logged, and how many of the slowest are listed in the header when
+# DEBUG is on.
+SQL_TIMING_SAMPLE_RATE = 1.0
+SQL_SLOW_QUERY_MS = 100
+SQL_TIMING_SLOWEST = 3
+
+# Plans of slow SELECTs are stored in functions.CapturedQuery (re-explained
+# at most every QUERY_PLAN_REFRESH seconds per process) for the query_plans
+# command, which flags full scans of QUERY_PLAN_WATCHED_TABLES. Their bind
+# parameters are stored too, until the rows are deleted: string parameters
+# of statements on QUERY_PLAN_REDACTED_TABLES are replaced first, so list
+# every table holding personal data or secrets there.
+QUERY_PLAN_CAPTURE = True
+QUERY_PLAN_REFRESH = 3600
+QUERY_PLAN_WATCHED_TABLES = [
+    "products_product",
+    "orders_orderitem",
+    "reviews_review",
+]
+QUERY_PLAN_REDACTED_TABLES = ["auth_user", "django_session"]
+
+# On-demand request profiles (functions.profiling) are kept in PROFILE_DIR,
+# the newest PROFILE_KEEP of them. Signed X-Profile headers expire after
+# PROFILE_TOKEN_MAX_AGE seconds; the sampling profiler reads the stack
+# every PROFILE_SAMPLE_INTERVAL seconds.
+PROFILING_ENABLED = True
+PROFILE_DIR = BASE_DIR / "profiles"
+PROFILE_KEEP = 200
+PROFILE_TOKEN_MAX_AGE = 3600
+PROFILE_SAMPLE_INTERVAL = 0.005
+
+# Prometheus metrics (functions.metrics), served at /metrics to staff, to
+# METRICS_ALLOWED_IPS and to scrapers sending "Authorization: Bearer
+# <METRICS_TOKEN>". METRICS_ALLOWED_IPS is matched against REMOTE_ADDR:
+# behind a reverse proxy on the same host every client comes from
+# 127.0.0.1, so only list addresses that reach the server directly, and
+# prefer the token. Under a multi-process server, point METRICS_DIR at a
+# host-local directory emptied at each deploy (e.g. /run/ecommerce-metrics):
+# every process writes its values there every METRICS_FLUSH_INTERVAL
+# seconds and /metrics sums them.
+METRICS_DIR = None
+METRICS_FLUSH_INTERVAL = 1
+METRICS_TOKEN = None
+METRICS_ALLOWED_IPS = []
+
+# Template query detection (functions.templatequeries). In development,
+# queries run inside {% for %} loops are logged with the template line that
+# ran them. The test runner fails the run when a test triggers one, except
+# at the "template:line" locations in TEMPLATE_LOOP_QUERY_ALLOW.
+TEMPLATE_QUERY_DEBUG = DEBUG
+TEMPLATE_LOOP_QUERY_ALLOW = []
+TEST_RUNNER = "functions.testrunner.TemplateQueryRunner"
+
+# Memory profiling (functions.memprofile). A MEMORY_PROFILE_SAMPLE_RATE
+# share of requests (and staff requests with "?memprofile=1") run under
+# tracemalloc; their peak and retained memory and the MEMORY_PROFILE_TOP_SITES
+# lines allocating the most are stored, the newest MEMORY_PROFILE_KEEP per
+# view and release. Set RELEASE at each deploy (e.g. to the commit hash) so
+# the compare_memory command can compare deploys.
+RELEASE = ""
+MEMORY_PROFILE_SAMPLE_RATE = 0
+MEMORY_PROFILE_TOP_SITES = 10
+MEMORY_PROFILE_KEEP = 500
+
 # Set the login URL for the login_required decorator
 LOGIN_URL = "/login/"
 # LOGIN_REDIRECT_URL = "/"
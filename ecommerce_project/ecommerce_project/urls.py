@@ -19,6 +19,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from functions.views import prometheus_metrics
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -28,10 +29,15 @@ urlpatterns = [
     path("products/", include("products.urls")),
     path("orders/", include("orders.urls")),
     path("reviews/", include("reviews.urls")),
-    # API endpoints for stores, products, and reviews
+    # API endpoints for stores, products, reviews, and orders
     path("api/store/", include("store.api_urls")),
     path("api/products/", include("products.api_urls")),
     path("api/reviews/", include("reviews.api_urls")),
+    path("api/orders/", include("orders.api_urls")),
+    # Staff-only operations pages (request profiles)
+    path("ops/", include("functions.urls")),
+    # Prometheus metrics
+    path("metrics", prometheus_metrics, name="metrics"),
     # Optionally, you could set the home page route
     path(
         "", include("ecommerce_project.home_urls")
@@ -0,0 +1,19 @@
+from django.apps import AppConfig
+
+
+class FunctionsConfig(AppConfig):
+    """
+    Configuration class for the 'functions' application.
+
+    The 'functions' app holds the project's shared helpers (for example the
+    Tweet integration) together with the background-delivery machinery they
+    need, such as the outbound email outbox.
+
+    Attributes:
+        default_auto_field (str): Specifies the type of primary key to use for
+            models in this app. Defaults to "django.db.models.BigAutoField".
+        name (str): The full Python path to the application, in this case,
+            "functions".
+    """
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "functions"
@@ -0,0 +1,440 @@
+import random
+import time
+import tracemalloc
+from contextlib import ExitStack
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
+from django.db import connections
+from django.test import Client
+from django.urls import URLResolver, get_resolver, reverse
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlencode, urlsafe_base64_encode
+
+from accounts.models import Profile
+from orders.models import Order, OrderItem
+from orders.purchases import backfill_purchases
+from orders.rollups import rebuild_daily_sales
+from products.cache import product_cache
+from products.models import Product
+from reviews.models import Review
+from reviews.ratings import rebuild_rating_summaries
+from store.models import Store
+
+# URL names driven as the seeded vendor; every other URL is driven as the
+# buyer, except PUBLIC_URLS, which are driven without logging in.
+VENDOR_URLS = {
+    "store:vendor_dashboard",
+    "store:vendor_orders",
+    "store:vendor_analytics",
+    "store:create_store",
+    "store:edit_store",
+    "store:delete_store",
+    "store:store_products",
+    "products:create_product",
+    "products:edit_product",
+    "products:delete_product",
+    "api_add_store",
+    "api_store_sales",
+    "api_add_product",
+}
+PUBLIC_URLS = {
+    "home",
+    "accounts:register",
+    "accounts:login",
+    "accounts:password_reset",
+    "accounts:password_reset_confirm",
+}
+# URL trees that are not part of the shop.
+SKIPPED_NAMESPACES = {"admin", "ops"}
+# Query strings of the URLs that need one: name -> Dataset method.
+URL_QUERIES = {"api_review_summaries": "summary_query"}
+
+
+class Dataset:
+    """
+    The rows seeded by ``seed``, and the values used for URL parameters.
+
+    Attributes:
+        vendor (User): A vendor owning ``store``.
+        buyer (User): A buyer with orders and reviews.
+        store (Store): One of the vendor's stores.
+        product (Product): The product with the most reviews.
+        product_ids (list[int]): The first products, for batch endpoints.
+        namespaces (list[str]): The cache version namespaces of every
+            seeded product and store (see functions.versions).
+        counts (dict): The number of rows seeded per model.
+    """
+    def __init__(
+        self, vendor, buyer, store, product, product_ids, namespaces, counts
+    ):
+        self.vendor = vendor
+        self.buyer = buyer
+        self.store = store
+        self.product = product
+        self.product_ids = product_ids
+        self.namespaces = namespaces
+        self.counts = counts
+
+    def url_kwargs(self):
+        """
+        Return the value of every URL parameter the project's routes use.
+        """
+        return {
+            "product_id": self.product.id,
+            "store_id": self.store.id,
+            "vendor_id": self.vendor.id,
+            "uidb64": urlsafe_base64_encode(force_bytes(self.buyer.pk)),
+            "token": default_token_generator.make_token(self.buyer),
+        }
+
+    def summary_query(self):
+        return {"ids": ",".join(map(str, self.product_ids))}
+
+
+def _users(prefix, count, account_type):
+    """
+    Bulk-create users with profiles; signals are skipped, so the profiles
+    are created here.
+    """
+    User.objects.bulk_create(
+        [
+            User(username=f"{prefix}{i}", email=f"{prefix}{i}@example.com")
+            for i in range(count)
+        ]
+    )
+    # Re-read: not every database returns the ids of bulk-created rows.
+    users = list(
+        User.objects.filter(username__startswith=prefix).order_by("id")
+    )
+    Profile.objects.bulk_create(
+        [Profile(user=user, account_type=account_type) for user in users]
+    )
+    return users
+
+
+def seed(
+    vendors=5,
+    stores_per_vendor=2,
+    products=200,
+    buyers=20,
+    orders=200,
+    reviews=500,
+    seed_value=0,
+):
+    """
+    Fill the database with a synthetic shop for the benchmarks.
+
+    Rows are bulk-created, so no signals run; the derived tables (daily
+    sales, purchases and rating totals) are rebuilt at the end. Users are
+    named "bench_vendor<n>" and "bench_buyer<n>" and have no usable
+    password; benchmarks log in with ``Client.force_login``.
+
+    Args:
+        vendors (int, optional): Vendor accounts.
+        stores_per_vendor (int, optional): Stores per vendor.
+        products (int, optional): Products, spread over the stores.
+        buyers (int, optional): Buyer accounts.
+        orders (int, optional): Orders, spread over the buyers, of one to
+            five items each.
+        reviews (int, optional): Reviews, at most one per buyer and
+            product.
+        seed_value (int, optional): Seed of the random generator, so runs
+            compare like with like.
+
+    Returns:
+        Dataset: The seeded rows.
+    """
+    rng = random.Random(seed_value)
+    vendor_users = _users("bench_vendor", vendors, "vendor")
+    buyer_users = _users("bench_buyer", buyers, "buyer")
+    Store.objects.bulk_create(
+        [
+            Store(vendor=vendor, name=f"Store {vendor.id}-{i}")
+            for vendor in vendor_users
+            for i in range(stores_per_vendor)
+        ]
+    )
+    stores = list(Store.objects.filter(vendor__in=vendor_users))
+    Product.objects.bulk_create(
+        [
+            Product(
+                store=stores[i % len(stores)],
+                name=f"Product {i}",
+                description=f"Benchmark product {i}.",
+                price=Decimal(rng.randint(100, 100000)) / 100,
+                stock=rng.randint(0, 500),
+            )
+            for i in range(products)
+        ],
+        batch_size=1000,
+    )
+    catalog = list(
+        Product.objects.filter(store__in=stores)
+        .select_related("store")
+        .order_by("id")
+    )
+
+    now = timezone.now()
+    Order.objects.bulk_create(
+        [
+            Order(user=buyer_users[i % len(buyer_users)])
+            for i in range(orders)
+        ],
+        batch_size=1000,
+    )
+    order_rows = list(
+        Order.objects.filter(user__in=buyer_users).order_by("id")
+    )
+    items = []
+    for order in order_rows:
+        # Spread over the last 90 days, for the sales reports.
+        order.created_at = now - timedelta(minutes=rng.randint(0, 129600))
+        chosen = rng.sample(catalog, min(len(catalog), rng.randint(1, 5)))
+        lines = [
+            OrderItem(
+                order=order,
+                product=product,
+                quantity=rng.randint(1, 3),
+                price=product.price,
+                store=product.store,
+                vendor_id=product.store.vendor_id,
+                created_at=order.created_at,
+            )
+            for product in chosen
+        ]
+        order.item_count = sum(line.quantity for line in lines)
+        order.total = sum(line.price * line.quantity for line in lines)
+        items.extend(lines)
+    OrderItem.objects.bulk_create(items, batch_size=1000)
+    Order.objects.bulk_update(
+        order_rows, ["created_at", "item_count", "total"], batch_size=1000
+    )
+
+    pairs = set()
+    # Skewed toward the first products, so some have many reviews.
+    weights = [1 / (rank + 1) for rank in range(len(catalog))]
+    for _ in range(reviews * 3):
+        if len(pairs) >= min(reviews, len(catalog) * len(buyer_users)):
+            break
+        product = rng.choices(catalog, weights)[0]
+        pairs.add((product.id, rng.choice(buyer_users).id))
+    Review.objects.bulk_create(
+        [
+            Review(
+                product_id=product_id,
+                reviewer_id=reviewer_id,
+                rating=rng.randint(1, 5),
+                title="Benchmark review",
+                content="Seeded by the benchmark.",
+            )
+            for product_id, reviewer_id in pairs
+        ],
+        batch_size=1000,
+    )
+
+    rebuild_daily_sales()
+    backfill_purchases()
+    rebuild_rating_summaries()
+    return Dataset(
+        vendor=vendor_users[0],
+        buyer=buyer_users[0],
+        store=stores[0],
+        product=catalog[0],
+        product_ids=[product.id for product in catalog[:50]],
+        namespaces=[
+            "catalog",
+            *(f"store:{store.id}" for store in stores),
+            *(f"product:{product.id}" for product in catalog),
+            *(f"product:{product.id}:reviews" for product in catalog),
+        ],
+        counts={
+            "vendors": len(vendor_users),
+            "buyers": len(buyer_users),
+            "stores": len(stores),
+            "products": len(catalog),
+            "orders": len(order_rows),
+            "order_items": len(items),
+            "reviews": len(pairs),
+        },
+    )
+
+
+def discover_urls(patterns=None, prefix=""):
+    """
+    List every named route of the project's URLconf.
+
+    Args:
+        patterns (list, optional): The patterns to walk. Defaults to the
+            root URLconf.
+        prefix (str, optional): The namespace of ``patterns``.
+
+    Returns:
+        list[tuple]: (name, parameter names) pairs, in URLconf order.
+    """
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    routes = []
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            if pattern.namespace in SKIPPED_NAMESPACES:
+                continue
+            namespace = prefix
+            if pattern.namespace:
+                namespace = f"{prefix}{pattern.namespace}:"
+            routes.extend(discover_urls(pattern.url_patterns, namespace))
+        elif pattern.name:
+            params = list(getattr(pattern.pattern, "converters", {}))
+            routes.append((f"{prefix}{pattern.name}", params))
+    return routes
+
+
+def persona(name):
+    """
+    Return who drives a URL: "vendor", "buyer" or "anonymous".
+    """
+    if name in VENDOR_URLS:
+        return "vendor"
+    if name in PUBLIC_URLS:
+        return "anonymous"
+    return "buyer"
+
+
+class QueryTimer:
+    """
+    A database execute wrapper that counts queries and their time.
+    """
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+
+def percentile(values, percent):
+    """
+    Return the nearest-rank percentile of a non-empty list.
+    """
+    ordered = sorted(values)
+    rank = max(1, round(percent / 100 * len(ordered) + 0.5))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def _prepare(client, user, clear_cache):
+    """
+    Log in and clear the caches before a request, unmeasured.
+    """
+    if user is not None:
+        client.force_login(user)
+    if clear_cache:
+        cache.clear()
+        product_cache.reset()
+
+
+def measure(
+    dataset,
+    name,
+    params,
+    iterations,
+    warmup,
+    memory_iterations,
+    clear_cache=False,
+):
+    """
+    Drive one URL through the test client and summarize its cost.
+
+    Latency, queries and SQL time come from ``iterations`` requests after
+    ``warmup`` unmeasured ones. Allocated memory (the peak traced by
+    tracemalloc during a request) comes from ``memory_iterations`` extra
+    requests, because tracing slows the interpreter down.
+
+    Args:
+        dataset (Dataset): The seeded rows.
+        name (str): The URL name.
+        params (list[str]): The URL's parameter names.
+        iterations (int): Measured requests.
+        warmup (int): Unmeasured requests first.
+        memory_iterations (int): Requests measured for memory.
+        clear_cache (bool, optional): Clear the caches before every
+            request, to measure cold pages.
+
+    Returns:
+        dict: The URL's results.
+    """
+    all_kwargs = dataset.url_kwargs()
+    url = reverse(name, kwargs={param: all_kwargs[param] for param in params})
+    if name in URL_QUERIES:
+        url += "?" + urlencode(getattr(dataset, URL_QUERIES[name])())
+    role = persona(name)
+    user = {"vendor": dataset.vendor, "buyer": dataset.buyer}.get(role)
+    client = Client()
+
+    for _ in range(warmup):
+        _prepare(client, user, clear_cache)
+        client.get(url)
+    latencies = []
+    queries = []
+    sql_seconds = []
+    status = None
+    for _ in range(iterations):
+        timer = QueryTimer()
+        with ExitStack() as stack:
+            _prepare(client, user, clear_cache)
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(timer)
+                )
+            started = time.perf_counter()
+            response = client.get(url)
+            latencies.append(time.perf_counter() - started)
+        status = response.status_code
+        queries.append(timer.count)
+        sql_seconds.append(timer.seconds)
+
+    allocated = []
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    try:
+        for _ in range(memory_iterations):
+            _prepare(client, user, clear_cache)
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            client.get(url)
+            allocated.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+
+    def ms(seconds):
+        return round(seconds * 1000, 3)
+
+    return {
+        "name": name,
+        "url": url,
+        "persona": role,
+        "status": status,
+        "iterations": iterations,
+        "latency_ms": {
+            "p50": ms(percentile(latencies, 50)),
+            "p90": ms(percentile(latencies, 90)),
+            "p99": ms(percentile(latencies, 99)),
+            "mean": ms(sum(latencies) / len(latencies)),
+            "max": ms(max(latencies)),
+        },
+        "queries": round(sum(queries) / len(queries), 2),
+        "sql_ms": ms(sum(sql_seconds) / len(sql_seconds)),
+        "allocated_kb": (
+            round(max(allocated) / 1024, 1) if allocated else None
+        ),
+    }
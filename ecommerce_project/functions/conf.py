@@ -0,0 +1,99 @@
+from django.conf import settings
+
+# The defaults of the settings read by the functions app and the product
+# cache, used when the project leaves one out. ecommerce_project/settings.py
+# sets and documents each of them.
+DEFAULTS = {
+    # functions.routers
+    "DATABASE_PRIMARY": "default",
+    "DATABASE_REPLICAS": (),
+    "DATABASE_STICKY_SECONDS": 10,
+    "DATABASE_STICKY_COOKIE": "db_primary",
+    "DATABASE_STICKY_IGNORE_APPS": ("sessions",),
+    # functions.mail
+    "EMAIL_OUTBOX_BATCH_SIZE": 50,
+    "EMAIL_OUTBOX_MAX_ATTEMPTS": 5,
+    "EMAIL_OUTBOX_RETRY_DELAY": 60,
+    "EMAIL_OUTBOX_MAX_RETRY_DELAY": 3600,
+    "EMAIL_OUTBOX_LEASE": 300,
+    # functions.taskqueue
+    "TASK_BATCH_SIZE": 10,
+    "TASK_MAX_ATTEMPTS": 5,
+    "TASK_RETRY_DELAY": 30,
+    "TASK_MAX_RETRY_DELAY": 3600,
+    "TASK_LEASE": 600,
+    "TASK_QUEUE_PERIODIC": {},
+    # functions.tweet
+    "TWITTER_ACCESS_TOKEN": "",
+    "TWITTER_ACCESS_TOKEN_SECRET": "",
+    "TWEET_API_URL": "https://api.twitter.com/2/tweets",
+    "TWEET_TRANSPORT": "functions.tweet.OAuthTransport",
+    "TWEET_TIMEOUT": 10,
+    "TWEET_BATCH_SIZE": 10,
+    "TWEET_RATE_LIMIT": 50,
+    "TWEET_RATE_WINDOW": 900,
+    "TWEET_MAX_ATTEMPTS": 5,
+    "TWEET_RETRY_DELAY": 60,
+    "TWEET_MAX_RETRY_DELAY": 3600,
+    "TWEET_LEASE": 300,
+    # reviews.api_views
+    "REVIEW_SUMMARY_MAX_AGE": 60,
+    # products.cache
+    "PRODUCT_CACHE_LOCAL_SIZE": 1000,
+    "PRODUCT_CACHE_LOCAL_TTL": 5,
+    "PRODUCT_CACHE_TTL": 300,
+    "PRODUCT_CACHE_LOCK": 10,
+    "PRODUCT_CACHE_WAIT": 1.0,
+    # functions.pagecache
+    "PAGE_CACHE_TIMEOUT": 300,
+    "PAGE_CACHE_MAX_AGE": 30,
+    # functions.instrumentation and functions.queryplans
+    "SQL_TIMING_SAMPLE_RATE": 1.0,
+    "SQL_SLOW_QUERY_MS": 100,
+    "SQL_TIMING_SLOWEST": 3,
+    "QUERY_PLAN_CAPTURE": True,
+    "QUERY_PLAN_REFRESH": 3600,
+    "QUERY_PLAN_WATCHED_TABLES": (
+        "products_product",
+        "orders_orderitem",
+        "reviews_review",
+    ),
+    "QUERY_PLAN_REDACTED_TABLES": ("auth_user", "django_session"),
+    # functions.profiling; no PROFILE_DIR means BASE_DIR / "profiles"
+    "PROFILING_ENABLED": True,
+    "PROFILE_DIR": None,
+    "PROFILE_KEEP": 200,
+    "PROFILE_TOKEN_MAX_AGE": 3600,
+    "PROFILE_SAMPLE_INTERVAL": 0.005,
+    # functions.metrics
+    "METRICS_DIR": None,
+    "METRICS_FLUSH_INTERVAL": 1,
+    "METRICS_TOKEN": None,
+    "METRICS_ALLOWED_IPS": (),
+    # functions.templatequeries
+    "TEMPLATE_QUERY_DEBUG": False,
+    "TEMPLATE_LOOP_QUERY_ALLOW": (),
+    # functions.memprofile
+    "RELEASE": "",
+    "MEMORY_PROFILE_SAMPLE_RATE": 0,
+    "MEMORY_PROFILE_FRAMES": 1,
+    "MEMORY_PROFILE_TOP_SITES": 10,
+    "MEMORY_PROFILE_KEEP": 500,
+}
+
+
+def setting(name):
+    """
+    Return a project setting, or its default from DEFAULTS when the
+    project does not set it.
+
+    Args:
+        name (str): The setting, e.g. "TASK_LEASE".
+
+    Raises:
+        KeyError: If the project does not set it and it has no default.
+    """
+    try:
+        return getattr(settings, name)
+    except AttributeError:
+        return DEFAULTS[name]
@@ -0,0 +1,500 @@
+import bisect
+import math
+import multiprocessing
+import os
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate
+from statistics import NormalDist
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connection, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from accounts.models import Profile
+from orders.models import Order, OrderItem
+from products.models import Product
+from reviews.models import Review
+from store.models import Store
+
+_MASK = (1 << 64) - 1
+# Share of each star rating in real shop reviews: mostly fives, with more
+# ones than twos (the usual "J-shaped" distribution).
+RATING_WEIGHTS = {5: 0.45, 4: 0.25, 3: 0.12, 2: 0.07, 1: 0.11}
+# Every generated user can log in with this password (e.g. in load tests).
+PASSWORD = "password"
+
+# The plan of the running generation, set in every worker process.
+_plan = None
+
+
+def _uniform(seed, stream, index):
+    """
+    Return a uniform float in [0, 1) fixed by (seed, stream, index).
+
+    A splitmix64 hash, so any process can recompute a product's attributes
+    from its index instead of reading them back from the database.
+    """
+    x = (seed * 0x9E3779B97F4A7C15 + stream * 0xBF58476D1CE4E5B9 + index)
+    x &= _MASK
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK
+    return (x ^ (x >> 31)) / 2**64
+
+
+def _stride(n):
+    """
+    Return a multiplier coprime with ``n``, so that ``i * stride % n``
+    permutes 0..n-1.
+    """
+    stride = max(1, int(n * 0.6180339887))
+    while math.gcd(stride, n) != 1:
+        stride += 1
+    return stride
+
+
+class Zipf:
+    """
+    Sample ranks 0..n-1 with probability proportional to 1 / (rank + 1)^s,
+    then spread the ranks over the items with a fixed permutation, so the
+    popular items are not simply the first ones.
+
+    Args:
+        n (int): The number of items.
+        s (float, optional): The skew; 0 is uniform. Defaults to 1.
+    """
+    def __init__(self, n, s=1.0):
+        self.n = n
+        self.cumulative = list(
+            accumulate(1 / (rank + 1) ** s for rank in range(n))
+        )
+        self.total = self.cumulative[-1]
+        self.stride = _stride(n)
+
+    def rank(self, u):
+        """
+        Return the rank drawn by a uniform number ``u`` in [0, 1).
+        """
+        return min(
+            bisect.bisect_left(self.cumulative, u * self.total), self.n - 1
+        )
+
+    def item(self, rank):
+        """
+        Return the item (0..n-1) at a rank.
+        """
+        return (rank * self.stride) % self.n
+
+    def sample(self, u):
+        """
+        Return the item (0..n-1) drawn by a uniform number ``u``.
+        """
+        return self.item(self.rank(u))
+
+
+class ReviewSlots:
+    """
+    Give every review index its own (product, buyer) pair, so no buyer
+    reviews a product twice however the reviews are split into chunks.
+
+    Products get a share of the reviews proportional to their popularity,
+    at most one per buyer, and the k-th review of a product is by the k-th
+    buyer of a fixed per-product permutation of the buyers. Review indexes
+    are spread over the slots with another permutation, so consecutive
+    reviews are of different products.
+
+    Args:
+        popularity (Zipf): The products' popularity.
+        reviews (int): The number of reviews wanted.
+        buyers (int): The number of buyers.
+        seed (int): The plan's seed.
+    """
+    def __init__(self, popularity, reviews, buyers, seed):
+        self.popularity = popularity
+        self.buyers = buyers
+        self.seed = seed
+        quotas = []
+        left = reviews
+        previous = 0
+        for cumulative in popularity.cumulative:
+            # This rank's share of the weight not handed out yet.
+            share = (cumulative - previous) / (popularity.total - previous)
+            quota = min(buyers, left, round(left * share))
+            quotas.append(quota)
+            left -= quota
+            previous = cumulative
+        self.cumulative = list(accumulate(quotas))
+        # Fewer than asked for when there are more than products * buyers.
+        self.total = self.cumulative[-1]
+        self.stride = _stride(self.total)
+        self.buyer_stride = _stride(buyers)
+
+    def slot(self, index):
+        """
+        Return the (product, buyer) of the review ``index``, both from 0,
+        or None when ``index`` is past the last slot.
+        """
+        if index >= self.total:
+            return None
+        index = (index * self.stride) % self.total
+        rank = bisect.bisect_right(self.cumulative, index)
+        nth = index - (self.cumulative[rank - 1] if rank else 0)
+        product = self.popularity.item(rank)
+        offset = int(_uniform(self.seed, 4, product) * self.buyers)
+        return product, (offset + nth * self.buyer_stride) % self.buyers
+
+
+class Plan:
+    """
+    What to generate, and the first primary key of each table.
+
+    Rows get explicit primary keys from these bases, so every chunk can be
+    generated in any process without reading back the rows another chunk
+    inserted.
+    """
+    def __init__(
+        self,
+        vendors,
+        buyers,
+        stores,
+        products,
+        orders,
+        reviews,
+        seed=0,
+        days=365,
+        batch_size=5000,
+    ):
+        self.counts = {
+            "vendors": vendors,
+            "buyers": buyers,
+            "stores": stores,
+            "products": products,
+            "orders": orders,
+            "reviews": reviews,
+        }
+        self.seed = seed
+        self.days = days
+        self.batch_size = batch_size
+        self.now = timezone.now()
+        self.password = make_password(PASSWORD)
+        user_base = _next_id(User)
+        self.vendor_base = user_base
+        self.buyer_base = user_base + vendors
+        self.store_base = _next_id(Store)
+        self.product_base = _next_id(Product)
+        self.order_base = _next_id(Order)
+        self._tables = None
+
+    def prepare(self):
+        """
+        Build the sampling tables; done before forking, so the workers
+        share them.
+        """
+        if self._tables is None:
+            popularity = Zipf(max(1, self.counts["products"]), 1.0)
+            self._tables = {
+                "stores": Zipf(max(1, self.counts["stores"]), 1.1),
+                "popularity": popularity,
+                "buyers": Zipf(max(1, self.counts["buyers"]), 0.8),
+                "reviews": ReviewSlots(
+                    popularity,
+                    self.counts["reviews"],
+                    max(1, self.counts["buyers"]),
+                    self.seed,
+                ),
+            }
+        return self._tables
+
+    def __getstate__(self):
+        # Workers started with "spawn" rebuild the tables themselves.
+        state = dict(self.__dict__)
+        state["_tables"] = None
+        return state
+
+    def product_store(self, index):
+        """
+        Return the store id of the product ``index``: stores get a skewed
+        number of products.
+        """
+        tables = self.prepare()
+        store = tables["stores"].sample(_uniform(self.seed, 1, index))
+        return self.store_base + store
+
+    def store_vendor(self, index):
+        """
+        Return the vendor id of the store ``index``.
+        """
+        vendors = max(1, self.counts["vendors"])
+        return self.vendor_base + int(_uniform(self.seed, 3, index) * vendors)
+
+    def product_price(self, index):
+        """
+        Return the price of the product ``index``: log-normal around R200.
+        """
+        u = min(max(_uniform(self.seed, 2, index), 1e-9), 1 - 1e-9)
+        price = math.exp(math.log(200) + NormalDist().inv_cdf(u))
+        return Decimal(min(max(price, 1), 999999)).quantize(Decimal("0.01"))
+
+    def moment(self, rng):
+        """
+        Return a random time within the last ``days`` days.
+        """
+        return self.now - timedelta(seconds=rng.random() * self.days * 86400)
+
+
+def _next_id(model):
+    return (model.objects.aggregate(top=Max("pk"))["top"] or 0) + 1
+
+
+@contextmanager
+def _explicit_timestamps(*fields):
+    """
+    Let generated rows keep their own ``auto_now_add`` timestamps, so
+    orders and reviews are spread over time. Only used in the generator's
+    processes.
+    """
+    previous = [field.auto_now_add for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in zip(fields, previous):
+            field.auto_now_add = value
+
+
+def _users(plan, rng, start, stop):
+    vendors = plan.counts["vendors"]
+    users = []
+    profiles = []
+    for index in range(start, stop):
+        pk = plan.vendor_base + index
+        kind = "vendor" if index < vendors else "buyer"
+        users.append(
+            User(
+                pk=pk,
+                username=f"gen_{kind}_{pk}",
+                email=f"gen_{kind}_{pk}@example.com",
+                password=plan.password,
+                date_joined=plan.moment(rng),
+            )
+        )
+        profiles.append(Profile(user_id=pk, account_type=kind))
+    User.objects.bulk_create(users, batch_size=plan.batch_size)
+    Profile.objects.bulk_create(profiles, batch_size=plan.batch_size)
+    return len(users)
+
+
+def _stores(plan, rng, start, stop):
+    Store.objects.bulk_create(
+        [
+            Store(
+                pk=plan.store_base + index,
+                vendor_id=plan.store_vendor(index),
+                name=f"Store {plan.store_base + index}",
+                description="A generated store.",
+            )
+            for index in range(start, stop)
+        ],
+        batch_size=plan.batch_size,
+    )
+    return stop - start
+
+
+def _products(plan, rng, start, stop):
+    Product.objects.bulk_create(
+        [
+            Product(
+                pk=plan.product_base + index,
+                store_id=plan.product_store(index),
+                name=f"Product {plan.product_base + index}",
+                description="A generated product.",
+                price=plan.product_price(index),
+                stock=rng.randrange(0, 500),
+            )
+            for index in range(start, stop)
+        ],
+        batch_size=plan.batch_size,
+    )
+    return stop - start
+
+
+def _orders(plan, rng, start, stop):
+    tables = plan.prepare()
+    orders = []
+    items = []
+    for index in range(start, stop):
+        created_at = plan.moment(rng)
+        order = Order(
+            pk=plan.order_base + index,
+            user_id=plan.buyer_base + tables["buyers"].sample(rng.random()),
+            created_at=created_at,
+        )
+        chosen = {
+            tables["popularity"].sample(rng.random())
+            for _ in range(rng.choice((1, 1, 1, 2, 2, 3, 4, 5)))
+        }
+        total = 0
+        count = 0
+        for product in chosen:
+            quantity = rng.choice((1, 1, 1, 2, 3))
+            price = plan.product_price(product)
+            store_id = plan.product_store(product)
+            vendor_id = plan.store_vendor(store_id - plan.store_base)
+            items.append(
+                OrderItem(
+                    order_id=order.pk,
+                    product_id=plan.product_base + product,
+                    quantity=quantity,
+                    price=price,
+                    store_id=store_id,
+                    vendor_id=vendor_id,
+                    created_at=created_at,
+                )
+            )
+            total += price * quantity
+            count += quantity
+        order.total = total
+        order.item_count = count
+        orders.append(order)
+    with _explicit_timestamps(Order._meta.get_field("created_at")):
+        Order.objects.bulk_create(orders, batch_size=plan.batch_size)
+    OrderItem.objects.bulk_create(items, batch_size=plan.batch_size)
+    return len(orders)
+
+
+def _reviews(plan, rng, start, stop):
+    slots = plan.prepare()["reviews"]
+    ratings = list(RATING_WEIGHTS)
+    weights = list(accumulate(RATING_WEIGHTS.values()))
+    reviews = []
+    for index in range(start, stop):
+        # One review per buyer and product, as the review form allows.
+        slot = slots.slot(index)
+        if slot is None:
+            break
+        product, reviewer = slot
+        rating = rng.choices(ratings, cum_weights=weights)[0]
+        reviews.append(
+            Review(
+                product_id=plan.product_base + product,
+                reviewer_id=plan.buyer_base + reviewer,
+                rating=rating,
+                title=f"{rating} stars",
+                content="A generated review.",
+                created_at=plan.moment(rng),
+                # Set from the purchase index once it is rebuilt, as
+                # reviewers may or may not have ordered the product.
+                verified=False,
+            )
+        )
+    with _explicit_timestamps(Review._meta.get_field("created_at")):
+        Review.objects.bulk_create(reviews, batch_size=plan.batch_size)
+    return len(reviews)
+
+
+# Stages in insertion order (foreign keys point to earlier stages):
+# name -> (row builder, number of rows).
+STAGES = {
+    "users": (_users, lambda counts: counts["vendors"] + counts["buyers"]),
+    "stores": (_stores, lambda counts: counts["stores"]),
+    "products": (_products, lambda counts: counts["products"]),
+    "orders": (_orders, lambda counts: counts["orders"]),
+    "reviews": (_reviews, lambda counts: counts["reviews"]),
+}
+
+
+def chunks(plan, stage, chunk_size):
+    """
+    Split a stage into (stage, chunk, start, stop) work items.
+    """
+    total = STAGES[stage][1](plan.counts)
+    return [
+        (stage, number, start, min(start + chunk_size, total))
+        for number, start in enumerate(range(0, total, chunk_size))
+    ]
+
+
+def init_worker(plan):
+    """
+    Pool initializer: remember the plan and tune the worker's connection.
+    """
+    global _plan
+    _plan = plan
+    if connection.vendor == "sqlite" and not connection.in_atomic_block:
+        # Generated data can be regenerated; skip the fsync per commit.
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous = OFF")
+
+
+def run_chunk(work):
+    """
+    Generate and insert one chunk in one transaction.
+
+    Each chunk has its own random generator, seeded from the plan's seed,
+    the stage and the chunk number, so the data does not depend on the
+    number of processes or the order the chunks run in.
+
+    Args:
+        work (tuple): (stage, chunk, start, stop) from ``chunks``.
+
+    Returns:
+        tuple: The stage and the number of rows inserted.
+    """
+    stage, number, start, stop = work
+    rng = random.Random(f"{_plan.seed}:{stage}:{number}")
+    with transaction.atomic():
+        rows = STAGES[stage][0](_plan, rng, start, stop)
+    return stage, rows
+
+
+def run_stage(plan, stage, processes=1, chunk_size=20000):
+    """
+    Generate every chunk of one stage, in parallel when asked to.
+
+    Stages must run in STAGES order, since each one's rows reference the
+    previous ones'. With one process the chunks run in this process, and
+    inside the caller's transaction if there is one.
+
+    Args:
+        plan (Plan): What to generate.
+        stage (str): A key of STAGES.
+        processes (int, optional): Worker processes. Defaults to 1.
+        chunk_size (int, optional): Rows per chunk and transaction.
+
+    Returns:
+        int: The number of rows inserted.
+    """
+    work = chunks(plan, stage, chunk_size)
+    if processes > 1 and len(work) > 1:
+        # Children must not share the parent's database sockets.
+        connections.close_all()
+        context = multiprocessing.get_context(
+            "fork" if os.name == "posix" else "spawn"
+        )
+        with context.Pool(
+            processes, initializer=init_worker, initargs=(plan,)
+        ) as pool:
+            return sum(
+                count for _, count in pool.imap_unordered(run_chunk, work)
+            )
+    init_worker(plan)
+    return sum(run_chunk(item)[1] for item in work)
+
+
+def reset_sequences():
+    """
+    Move the id sequences past the explicit primary keys, on databases
+    that need it (PostgreSQL; MySQL and SQLite do it themselves).
+    """
+    statements = connection.ops.sequence_reset_sql(
+        no_style(), [User, Store, Product, Order]
+    )
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
@@ -0,0 +1,51 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.mysql import base as mysql
+
+from functions.pool import get_pool
+
+
+class DatabaseWrapper(mysql.DatabaseWrapper):
+    """
+    The MySQL backend with connections borrowed from a process-wide pool.
+
+    Use it by setting a database's ENGINE to "functions.db.mysql_pool" and
+    its CONN_MAX_AGE to 0. Django then "closes" the connection at the end
+    of every request, which returns it to the pool instead of
+    disconnecting, so requests skip the TCP, TLS and authentication
+    handshake. The optional POOL dictionary of the database settings holds
+    the ConnectionPool options, e.g.::
+
+        "POOL": {"max_size": 20, "timeout": 5, "max_lifetime": 1800}
+
+    Every idle connection is pinged before it is reused, and any
+    transaction left open is rolled back when it is returned.
+    """
+    def __init__(self, settings_dict, alias=mysql.DEFAULT_DB_ALIAS):
+        super().__init__(settings_dict, alias)
+        if self.settings_dict["CONN_MAX_AGE"] != 0:
+            raise ImproperlyConfigured(
+                "Pooled connections require CONN_MAX_AGE = 0; the pool "
+                "keeps connections open between requests."
+            )
+
+    @property
+    def pool(self):
+        """
+        The pool of this database alias, shared by every thread.
+        """
+        return get_pool(
+            self.alias,
+            lambda: mysql.DatabaseWrapper.get_new_connection(
+                self, self.get_connection_params()
+            ),
+            reset=lambda conn: conn.rollback(),
+            **self.settings_dict.get("POOL", {}),
+        )
+
+    def get_new_connection(self, conn_params):
+        return self.pool.acquire()
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.release(self.connection)
@@ -0,0 +1,315 @@
+import hashlib
+import re
+import statistics
+import time
+
+from django.apps import apps
+from django.db import connections, models
+
+from .queryplans import explain
+
+_PREDICATE = re.compile(
+    r'"(\w+)"\."(\w+)"\s*(=|IN\b|>=|<=|>|<|BETWEEN\b|IS NULL\b|LIKE\b)',
+    re.IGNORECASE,
+)
+_ORDER_ITEM = re.compile(r'"(\w+)"\."(\w+)"(\s+DESC)?', re.IGNORECASE)
+_CLAUSE_END = re.compile(r"\b(?:GROUP BY|HAVING|ORDER BY|LIMIT)\b")
+_SELECT_LIST = re.compile(r"^\s*SELECT\s+(.*?)\s+FROM\s", re.S | re.I)
+_FROM = re.compile(r'\bFROM "(\w+)"')
+
+_SQLITE_SCAN = re.compile(r"\bSCAN (\w+)(?!.*\bUSING\b)")
+_SQLITE_SORT = re.compile(r"USE TEMP B-TREE FOR (?:ORDER|GROUP) BY")
+_MYSQL_SCAN = re.compile(r"\btable=(\w+) type=ALL\b")
+_MYSQL_SORT = re.compile(r"\btable=(\w+) .*Using filesort")
+_POSTGRES_SCAN = re.compile(r"\bSeq Scan on (\w+)")
+
+# Widest index proposed to cover a query's selected columns too.
+COVERING_COLUMNS = 4
+
+
+class Proposal:
+    """
+    An index proposed for one table.
+
+    Attributes:
+        model (type): The model of the table.
+        fields (list[str]): The index fields, "-" marking descending ones.
+        covering (bool): The index also holds every column the queries
+            select, so they never read the table.
+        queries (list[CapturedQuery]): The captured queries it serves.
+        reasons (set[str]): Why: "full scan" and/or "sort".
+    """
+    def __init__(self, model, fields, covering):
+        self.model = model
+        self.fields = fields
+        self.covering = covering
+        self.queries = []
+        self.reasons = set()
+
+    @property
+    def table(self):
+        return self.model._meta.db_table
+
+    def index(self):
+        """
+        Return the models.Index, with a name derived from its fields that
+        fits the 30-character limit.
+        """
+        base = "_".join(
+            [self.model._meta.model_name]
+            + [field.lstrip("-") for field in self.fields]
+        )
+        if len(base) > 26:
+            digest = hashlib.sha1(base.encode()).hexdigest()[:4]
+            base = f"{base[:21]}_{digest}"
+        return models.Index(fields=self.fields, name=f"{base}_idx")
+
+    def as_dict(self):
+        index = self.index()
+        return {
+            "table": self.table,
+            "model": self.model._meta.label,
+            "fields": self.fields,
+            "name": index.name,
+            "covering": self.covering,
+            "reasons": sorted(self.reasons),
+            "queries": [query.fingerprint for query in self.queries],
+        }
+
+
+def _tables():
+    return {model._meta.db_table: model for model in apps.get_models()}
+
+
+def _problems(plan, main_table):
+    """
+    Return {table: reasons} for the tables a plan scans in full or sorts.
+    """
+    problems = {}
+    for line in plan:
+        for pattern in (_SQLITE_SCAN, _MYSQL_SCAN, _POSTGRES_SCAN):
+            for table in pattern.findall(line):
+                problems.setdefault(table, set()).add("full scan")
+        for table in _MYSQL_SORT.findall(line):
+            problems.setdefault(table, set()).add("sort")
+        if _SQLITE_SORT.search(line) and main_table:
+            problems.setdefault(main_table, set()).add("sort")
+    return problems
+
+
+def parse(sql):
+    """
+    Return the columns a Django-generated statement filters and sorts on.
+
+    Args:
+        sql (str): The statement.
+
+    Returns:
+        dict: {table: {"equal": [...], "range": [...], "order": [...],
+        "selected": [...]}}, columns in the order they appear; "order"
+        columns are prefixed with "-" when descending.
+    """
+    columns = {}
+
+    def entry(table):
+        return columns.setdefault(
+            table, {"equal": [], "range": [], "order": [], "selected": []}
+        )
+
+    def add(values, column):
+        if column not in values:
+            values.append(column)
+
+    select = _SELECT_LIST.search(sql)
+    if select:
+        for table, column, _ in _ORDER_ITEM.findall(select.group(1)):
+            add(entry(table)["selected"], column)
+
+    where = sql.find(" WHERE ")
+    if where >= 0:
+        end = _CLAUSE_END.search(sql, where)
+        clause = sql[where: end.start() if end else len(sql)]
+        for table, column, operator in _PREDICATE.findall(clause):
+            kind = "equal" if operator.upper() in ("=", "IN", "IS NULL") else (
+                "range"
+            )
+            add(entry(table)[kind], column)
+
+    order = re.search(r"\bORDER BY (.*?)(?:\bLIMIT\b|$)", sql, re.S)
+    if order:
+        for table, column, descending in _ORDER_ITEM.findall(order.group(1)):
+            add(entry(table)["order"], ("-" if descending else "") + column)
+    return columns
+
+
+def _existing_indexes(table, alias):
+    """
+    Return the column lists of the table's indexes and unique constraints.
+    """
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+    return [
+        constraint["columns"]
+        for constraint in constraints.values()
+        if constraint["index"] or constraint["unique"]
+        or constraint["primary_key"]
+    ]
+
+
+def _covered(columns, indexes):
+    return any(index[: len(columns)] == columns for index in indexes)
+
+
+def _candidate(model, predicates):
+    """
+    Return the index fields and whether they cover the query: equality
+    columns first, then the first range column or else the sort columns.
+    """
+    fields_by_column = {
+        field.column: field.name for field in model._meta.concrete_fields
+    }
+
+    def field(column):
+        name = fields_by_column.get(column.lstrip("-"))
+        if name is None:
+            return None
+        return ("-" if column.startswith("-") else "") + name
+
+    columns = list(predicates["equal"])
+    if predicates["range"]:
+        columns.append(predicates["range"][0])
+    else:
+        columns += [
+            column
+            for column in predicates["order"]
+            if column.lstrip("-") not in columns
+        ]
+    fields = [field(column) for column in columns]
+    if not fields or None in fields:
+        return None, False
+    extra = [
+        column
+        for column in predicates["selected"]
+        if column not in columns and column != model._meta.pk.column
+    ]
+    if extra and len(columns) + len(extra) <= COVERING_COLUMNS:
+        extra_fields = [field(column) for column in extra]
+        if None not in extra_fields:
+            return fields + extra_fields, True
+    return fields, False
+
+
+def advise(queries):
+    """
+    Propose indexes for captured slow queries.
+
+    Each query is explained again. For every table its plan scans in full
+    or sorts, an index is proposed on the columns the query compares for
+    equality, followed by its first range column or else its sort
+    columns; and on the selected columns too when that stays narrow (a
+    covering index). Tables that already have an index starting with
+    those columns are skipped, and a proposal that is a prefix of another
+    on the same table is merged into it.
+
+    Args:
+        queries (Iterable[CapturedQuery]): The captured queries.
+
+    Returns:
+        list[Proposal]: The proposals, the ones serving most queries first.
+    """
+    tables = _tables()
+    proposals = {}
+    for query in queries:
+        plan = explain(query.database, query.sql, query.params)
+        main = _FROM.search(query.sql)
+        problems = _problems(plan, main.group(1) if main else None)
+        for table, predicates in parse(query.sql).items():
+            model = tables.get(table)
+            if model is None or table not in problems:
+                continue
+            fields, covering = _candidate(model, predicates)
+            if fields is None:
+                continue
+            columns = [
+                model._meta.get_field(name.lstrip("-")).column
+                for name in fields
+            ]
+            if _covered(columns, _existing_indexes(table, query.database)):
+                continue
+            key = (table, tuple(fields))
+            if key not in proposals:
+                proposals[key] = Proposal(model, fields, covering)
+            proposals[key].queries.append(query)
+            proposals[key].reasons |= problems[table]
+
+    merged = []
+    for key, proposal in sorted(
+        proposals.items(), key=lambda item: -len(item[0][1])
+    ):
+        wider = next(
+            (
+                other
+                for other in merged
+                if other.table == proposal.table
+                and other.fields[: len(proposal.fields)] == proposal.fields
+            ),
+            None,
+        )
+        if wider is None:
+            merged.append(proposal)
+        else:
+            wider.queries += proposal.queries
+            wider.reasons |= proposal.reasons
+    return sorted(merged, key=lambda proposal: -len(proposal.queries))
+
+
+def time_query(query, repeat):
+    """
+    Return the median time of a captured query, in milliseconds.
+    """
+    connection = connections[query.database]
+    timings = []
+    with connection.cursor() as cursor:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            cursor.execute(query.sql, query.params)
+            cursor.fetchall()
+            timings.append(time.perf_counter() - started)
+    return round(statistics.median(timings) * 1000, 3)
+
+
+def create_sql(proposal, alias):
+    """
+    Return the statement creating a proposal's index on a database.
+    """
+    # The statement is only built, so the editor is never entered: SQLite's
+    # refuses to be inside a transaction.
+    editor = connections[alias].schema_editor(collect_sql=True)
+    return str(proposal.index().create_sql(proposal.model, editor))
+
+
+def benchmark(proposal, alias, repeat=20):
+    """
+    Time a proposal's queries without and with its index.
+
+    The index is created on ``alias`` and left there: run this inside a
+    transaction that is rolled back, on a database that can roll back
+    DDL (SQLite, PostgreSQL).
+
+    Returns:
+        list[dict]: Per query: "fingerprint", "before_ms", "after_ms"
+        and the "plan" with the index.
+    """
+    before = [time_query(query, repeat) for query in proposal.queries]
+    with connections[alias].cursor() as cursor:
+        cursor.execute(create_sql(proposal, alias))
+    return [
+        {
+            "fingerprint": query.fingerprint,
+            "before_ms": ms,
+            "after_ms": time_query(query, repeat),
+            "plan": explain(query.database, query.sql, query.params),
+        }
+        for query, ms in zip(proposal.queries, before)
+    ]
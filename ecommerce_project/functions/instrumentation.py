@@ -0,0 +1,290 @@
+import heapq
+import logging
+import random
+import re
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+from .conf import setting
+
+logger = logging.getLogger(__name__)
+
+# Metrics of the request being served (None outside instrumented requests).
+_current = ContextVar("request_metrics", default=None)
+
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r"\b\d+(?:\.\d+)?\b")
+_LISTS = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)")
+_ROWS = re.compile(r"(\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+")
+_SPACES = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql):
+    """
+    Normalize a SQL statement so that executions differing only in their
+    values share one fingerprint.
+
+    Placeholders, string and number literals become "?", lists of them
+    (as in "IN (...)" or multi-row VALUES) collapse to "(...)", and
+    whitespace is collapsed.
+
+    Args:
+        sql (str): The statement.
+
+    Returns:
+        str: The fingerprint, e.g.
+        'SELECT ... FROM "products_product" WHERE "id" IN (...)'.
+    """
+    sql = sql.replace("%s", "?")
+    sql = _STRINGS.sub("?", sql)
+    sql = _NUMBERS.sub("?", sql)
+    sql = _LISTS.sub("(...)", sql)
+    sql = _ROWS.sub(r"\1", sql)
+    return _SPACES.sub(" ", sql).strip()
+
+
+def resolve_view_name(request, view_func):
+    """
+    Return the dotted path of the view serving a request, e.g.
+    "products.views.product_detail", and keep it as request.view_name.
+
+    The metrics, instrumentation and profiling middlewares all label
+    requests by view; the first one to see the view names it and the
+    others reuse the name.
+
+    Args:
+        request (HttpRequest): The request.
+        view_func (callable): The view, as given to process_view().
+
+    Returns:
+        str: The view's dotted path. Class-based and API views report
+        their class.
+    """
+    name = getattr(request, "view_name", None)
+    if name is None:
+        view = getattr(view_func, "view_class", view_func)
+        name = request.view_name = f"{view.__module__}.{view.__name__}"
+    return name
+
+
+class RequestMetrics:
+    """
+    Database and rendering timings of one request.
+
+    Attributes:
+        queries (int): Statements executed.
+        sql_seconds (float): Time spent executing them.
+        template_seconds (float): Time spent rendering templates.
+        view_seconds (float): Time from the view starting until the
+            response came back to the middleware.
+        total_seconds (float): Time spent inside the middleware.
+        view_name (str): The dotted path of the view, e.g.
+            "orders.views.checkout", or the path before the view runs.
+        slow (list): The statements slower than the slow-query threshold,
+            as (alias, sql, params, seconds, many) tuples.
+    """
+    def __init__(self, view_name, slowest=3):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self.view_seconds = 0.0
+        self.total_seconds = 0.0
+        self.view_name = view_name
+        self.slow = []
+        self._keep = slowest
+        self._slowest = []
+        self._template_depth = 0
+
+    def record_query(self, sql, seconds):
+        self.queries += 1
+        self.sql_seconds += seconds
+        # Fingerprinting waits until slowest() is read: most statements
+        # never make the list.
+        entry = (seconds, self.queries, sql)
+        if len(self._slowest) < self._keep:
+            heapq.heappush(self._slowest, entry)
+        elif seconds > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, entry)
+
+    def slowest(self):
+        """
+        Return the slowest statements, slowest first, as
+        {"fingerprint", "ms"} dicts.
+        """
+        return [
+            {"fingerprint": fingerprint(sql), "ms": round(seconds * 1000, 2)}
+            for seconds, _, sql in sorted(self._slowest, reverse=True)
+        ]
+
+    def server_timing(self, details=False):
+        """
+        Return the value of the Server-Timing header.
+
+        Args:
+            details (bool, optional): Also list the slowest statements'
+                fingerprints. They reveal the schema, so only send them to
+                developers.
+        """
+        entries = [
+            f'db;dur={self.sql_seconds * 1000:.1f};desc="{self.queries} '
+            f'queries"',
+            f"tpl;dur={self.template_seconds * 1000:.1f}",
+            f"view;dur={self.view_seconds * 1000:.1f}",
+            f"total;dur={self.total_seconds * 1000:.1f}",
+        ]
+        if details:
+            for number, query in enumerate(self.slowest(), 1):
+                desc = query["fingerprint"][:100]
+                desc = desc.replace("\\", "\\\\").replace('"', '\\"')
+                entries.append(
+                    f'sql-{number};dur={query["ms"]:.1f};desc="{desc}"'
+                )
+        return ", ".join(entries)
+
+
+def current_metrics():
+    """
+    Return the RequestMetrics of the request being served, or None when
+    it is not instrumented.
+    """
+    return _current.get()
+
+
+class _QueryRecorder:
+    """
+    A database execute wrapper that times every statement of a request
+    and logs the slow ones.
+    """
+    def __init__(self, metrics, slow_seconds):
+        self.metrics = metrics
+        self.slow_seconds = slow_seconds
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            seconds = time.perf_counter() - started
+            self.metrics.record_query(sql, seconds)
+            if seconds >= self.slow_seconds:
+                self.metrics.slow.append(
+                    (context["connection"].alias, sql, params, seconds, many)
+                )
+                logger.warning(
+                    "Slow query (%.1f ms) in %s on %s: %s",
+                    seconds * 1000,
+                    self.metrics.view_name,
+                    context["connection"].alias,
+                    fingerprint(sql),
+                )
+
+
+class TimedTemplate(Template):
+    """
+    A Django template that adds its rendering time to the request's
+    metrics. Templates rendered while rendering another (e.g. by
+    ``render_to_string`` in a template tag) are only counted once.
+    """
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(context, request)
+        metrics._template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics._template_depth -= 1
+            if not metrics._template_depth:
+                metrics.template_seconds += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    The Django template backend, with rendering times recorded by
+    SQLInstrumentationMiddleware. Set it as the BACKEND in TEMPLATES.
+    """
+    def from_string(self, template_code):
+        template = super().from_string(template_code)
+        return TimedTemplate(template.template, self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+class SQLInstrumentationMiddleware:
+    """
+    Time the database statements, template rendering and view of a
+    sample of requests.
+
+    For a sampled request (settings.SQL_TIMING_SAMPLE_RATE, between 0 and
+    1), every statement on every database connection is timed, and the
+    response gets a Server-Timing header with the query count and SQL
+    time ("db"), the template time ("tpl"), the view time ("view") and
+    the time spent below this middleware ("total"). Browsers show it in
+    their developer tools. With DEBUG on, the slowest statements'
+    fingerprints are listed too. Statements slower than
+    settings.SQL_SLOW_QUERY_MS are logged as warnings with the view name,
+    and their query plans are captured (see functions.queryplans).
+    The metrics are also left on ``request.metrics``.
+
+    The cost is a timer per statement; requests that are not sampled
+    are not instrumented at all. List it near the top of MIDDLEWARE so
+    the queries of the other middleware (sessions, authentication) count
+    too. The "view" time includes the response handling of the middleware
+    listed after it.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = setting("SQL_TIMING_SAMPLE_RATE")
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            return self.get_response(request)
+
+        metrics = RequestMetrics(
+            request.path, setting("SQL_TIMING_SLOWEST")
+        )
+        recorder = _QueryRecorder(
+            metrics, setting("SQL_SLOW_QUERY_MS") / 1000
+        )
+        request.metrics = metrics
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(
+                        connections[alias].execute_wrapper(recorder)
+                    )
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        finished = time.perf_counter()
+        metrics.total_seconds = finished - started
+        view_started = getattr(request, "_view_started", None)
+        if view_started is not None:
+            metrics.view_seconds = finished - view_started
+        response["Server-Timing"] = metrics.server_timing(
+            details=settings.DEBUG
+        )
+        if metrics.slow and setting("QUERY_PLAN_CAPTURE"):
+            # Imported here: the plans are stored in a model.
+            from .queryplans import capture
+
+            capture(metrics)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = getattr(request, "metrics", None)
+        if metrics is not None:
+            metrics.view_name = resolve_view_name(request, view_func)
+            request._view_started = time.perf_counter()
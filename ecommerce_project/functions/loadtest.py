@@ -0,0 +1,643 @@
+import asyncio
+import random
+import time
+from http.cookies import SimpleCookie
+from itertools import accumulate
+from urllib.parse import urlencode, urlsplit
+
+from django.urls import reverse
+
+from .benchmark import percentile
+
+# The built-in scenarios; see ``load_scenarios`` for the format.
+DEFAULT_SCENARIOS = [
+    {
+        "name": "browse",
+        "weight": 50,
+        "persona": "anonymous",
+        "steps": [
+            {"name": "product_list", "url": "products:product_list"},
+            {
+                "name": "product_detail",
+                "url": "products:product_detail",
+                "kwargs": {"product_id": "{product}"},
+            },
+            {
+                "name": "api_review_summary",
+                "url": "api_review_summary",
+                "kwargs": {"product_id": "{product}"},
+            },
+        ],
+    },
+    {
+        "name": "buy",
+        "weight": 20,
+        "persona": "buyer",
+        "steps": [
+            {"name": "product_list", "url": "products:product_list"},
+            {
+                "name": "product_detail",
+                "url": "products:product_detail",
+                "kwargs": {"product_id": "{product}"},
+            },
+            {"name": "fragments", "url": "accounts:fragments"},
+            {
+                "name": "add_to_cart",
+                "url": "orders:add_to_cart",
+                "kwargs": {"product_id": "{product}"},
+                "method": "POST",
+                "data": {"quantity": "1"},
+                "expect": [302],
+            },
+            {"name": "view_cart", "url": "orders:view_cart"},
+            {
+                "name": "checkout",
+                "url": "orders:checkout",
+                "expect": [302],
+                # Failed checkouts redirect too, to the cart.
+                "redirect": "products:product_list",
+            },
+        ],
+    },
+    {
+        "name": "api_reads",
+        "weight": 20,
+        "persona": "anonymous",
+        "steps": [
+            {"name": "api_list_stores", "url": "api_list_stores"},
+            {
+                "name": "api_store_products",
+                "url": "api_product_list",
+                "query": {"store": "{store}"},
+            },
+            {
+                "name": "api_list_reviews",
+                "url": "api_list_reviews",
+                "kwargs": {"product_id": "{product}"},
+            },
+            {
+                "name": "api_review_summaries",
+                "url": "api_review_summaries",
+                "query": {"ids": "{products}"},
+            },
+        ],
+    },
+    {
+        "name": "sell",
+        "weight": 10,
+        "persona": "vendor",
+        "steps": [
+            {"name": "vendor_dashboard", "url": "store:vendor_dashboard"},
+            {
+                "name": "create_product",
+                "url": "products:create_product",
+                "kwargs": {"store_id": "{own_store}"},
+                "method": "POST",
+                "data": {
+                    "name": "Load test product {unique}",
+                    "description": "Created by the load test.",
+                    "price": "99.99",
+                    "stock": "10",
+                },
+                "expect": [302],
+            },
+        ],
+    },
+]
+PERSONAS = ("anonymous", "buyer", "vendor")
+
+
+class LoadTestError(Exception):
+    """
+    Raised for an invalid scenario or a response the client cannot parse.
+    """
+
+
+def load_scenarios(scenarios):
+    """
+    Validate scenarios and fill in their defaults.
+
+    A scenario is a dict with a "name", a relative "weight" (default 1), a
+    "persona" ("anonymous", "buyer" or "vendor"; buyers and vendors log in
+    through accounts:login first) and a list of "steps". A step has:
+
+    - "url": the URL name passed to ``reverse``;
+    - "name": the name it is reported under (default: the URL name);
+    - "kwargs" and "query": the URL arguments and query string;
+    - "method": "GET" (default) or "POST", with the form fields in "data";
+      POSTs carry the CSRF token;
+    - "expect": the statuses that count as success (default [200]);
+    - "redirect": the URL name a successful redirect points to, when a
+      failure redirects as well (e.g. checkout, back to the cart);
+    - "think": seconds to wait after the step, or [min, max].
+
+    Strings in "kwargs", "query" and "data" may use the placeholders
+    {product} (a product, popular ones more often), {products} (a few
+    product ids, comma separated), {store}, {own_store} (a store of the
+    logged-in vendor) and {unique} (a number unique in the run). Each is
+    drawn once per visit, so a visit's steps share the same product.
+
+    Args:
+        scenarios (list): The scenarios, e.g. loaded from a JSON file.
+
+    Returns:
+        list: The scenarios with every default filled in.
+
+    Raises:
+        LoadTestError: If a scenario is invalid.
+    """
+    loaded = []
+    for scenario in scenarios:
+        name = scenario.get("name", "scenario")
+        persona = scenario.get("persona", "anonymous")
+        if persona not in PERSONAS:
+            raise LoadTestError(f"{name}: unknown persona {persona!r}.")
+        if not scenario.get("steps"):
+            raise LoadTestError(f"{name}: no steps.")
+        steps = []
+        for step in scenario["steps"]:
+            if "url" not in step:
+                raise LoadTestError(f"{name}: a step has no url.")
+            method = step.get("method", "GET").upper()
+            if method not in ("GET", "POST"):
+                raise LoadTestError(f"{name}: unsupported method {method}.")
+            think = step.get("think", 0)
+            if not isinstance(think, list):
+                think = [think, think]
+            steps.append(
+                {
+                    "name": step.get("name", step["url"]),
+                    "url": step["url"],
+                    "kwargs": step.get("kwargs", {}),
+                    "query": step.get("query", {}),
+                    "method": method,
+                    "data": step.get("data", {}),
+                    "expect": step.get("expect", [200]),
+                    "redirect": step.get("redirect"),
+                    "think": think,
+                }
+            )
+        loaded.append(
+            {
+                "name": name,
+                "weight": scenario.get("weight", 1),
+                "persona": persona,
+                "steps": steps,
+            }
+        )
+    return loaded
+
+
+class Response:
+    """
+    A parsed HTTP response.
+    """
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def header(self, name):
+        for key, value in self.headers:
+            if key == name:
+                return value
+        return None
+
+
+class HttpClient:
+    """
+    A minimal asyncio HTTP/1.1 client for one virtual user.
+
+    Keeps one keep-alive connection to the server and a cookie jar, so the
+    session and CSRF cookies set by Django are sent back. Redirects are not
+    followed: they are reported as the step's status.
+
+    Args:
+        base_url (str): The server, e.g. "http://127.0.0.1:8000".
+        timeout (float): Seconds allowed per request.
+    """
+    def __init__(self, base_url, timeout=30):
+        parts = urlsplit(base_url)
+        if parts.scheme != "http":
+            raise LoadTestError("Only http:// servers are supported.")
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.cookies = {}
+        self._reader = None
+        self._writer = None
+
+    def reset(self):
+        """
+        Start a new visit: forget the cookies, keep the connection.
+        """
+        self.cookies = {}
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except OSError:
+                pass
+        self._reader = self._writer = None
+
+    async def request(self, method, path, data=None):
+        """
+        Send a request and return the Response.
+
+        Args:
+            method (str): "GET" or "POST".
+            path (str): The path and query string.
+            data (dict, optional): Form fields of a POST. The CSRF token
+                from the cookie jar is added.
+        """
+        try:
+            return await asyncio.wait_for(
+                self._request(method, path, data), self.timeout
+            )
+        except BaseException:
+            # Never reuse a connection left in an unknown state.
+            await self.close()
+            raise
+
+    async def _request(self, method, path, data):
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(
+                self.host, self.port
+            )
+        headers = {
+            "Host": f"{self.host}:{self.port}",
+            "User-Agent": "ecommerce-loadtest",
+            "Accept": "text/html,application/json",
+        }
+        if self.cookies:
+            headers["Cookie"] = "; ".join(
+                f"{key}={value}" for key, value in self.cookies.items()
+            )
+        body = b""
+        if method == "POST":
+            token = self.cookies.get("csrftoken", "")
+            body = urlencode(
+                {**(data or {}), "csrfmiddlewaretoken": token}
+            ).encode()
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+            headers["X-CSRFToken"] = token
+            headers["Referer"] = self.base_url + path
+        headers["Content-Length"] = str(len(body))
+        head = f"{method} {path} HTTP/1.1\r\n" + "".join(
+            f"{key}: {value}\r\n" for key, value in headers.items()
+        )
+        self._writer.write(head.encode("latin-1") + b"\r\n" + body)
+        await self._writer.drain()
+
+        response = await self._read_response()
+        self._store_cookies(response)
+        if (response.header("connection") or "").lower() == "close":
+            await self.close()
+        return response
+
+    async def _read_response(self):
+        try:
+            return await self._parse_response()
+        except (asyncio.IncompleteReadError, ValueError) as exc:
+            # A body cut short, a bad length or chunk size, or a line
+            # over the stream's limit: fail the step, not the run.
+            raise LoadTestError(f"Malformed response: {exc!r}") from exc
+
+    async def _parse_response(self):
+        line = await self._reader.readline()
+        if not line:
+            raise LoadTestError("The server closed the connection.")
+        try:
+            status = int(line.split()[1])
+        except (IndexError, ValueError):
+            raise LoadTestError(f"Bad status line {line!r}.")
+        headers = []
+        while True:
+            line = await self._reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            headers.append((key.strip().lower(), value.strip()))
+        response = Response(status, headers, b"")
+        length = response.header("content-length")
+        if length is not None:
+            response.body = await self._reader.readexactly(int(length))
+        elif response.header("transfer-encoding") == "chunked":
+            response.body = await self._read_chunked()
+        elif status not in (204, 304):
+            # No length: the body ends when the server closes.
+            response.body = await self._reader.read()
+            response.headers.append(("connection", "close"))
+        return response
+
+    async def _read_chunked(self):
+        chunks = []
+        while True:
+            size = int((await self._reader.readline()).split(b";")[0], 16)
+            if not size:
+                await self._reader.readline()
+                return b"".join(chunks)
+            chunks.append(await self._reader.readexactly(size))
+            await self._reader.readline()
+
+    def _store_cookies(self, response):
+        for key, value in response.headers:
+            if key != "set-cookie":
+                continue
+            for name, morsel in SimpleCookie(value).items():
+                if morsel["max-age"] == "0" or (
+                    not morsel.value and morsel["expires"]
+                ):
+                    self.cookies.pop(name, None)
+                else:
+                    self.cookies[name] = morsel.value
+
+
+class StepStats:
+    """
+    Latencies and outcomes of one step, over the whole run.
+    """
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.reasons = {}
+
+    def record(self, seconds, error=None):
+        self.latencies.append(seconds * 1000)
+        if error is not None:
+            self.errors += 1
+            self.reasons[error] = self.reasons.get(error, 0) + 1
+
+    def report(self, elapsed):
+        count = len(self.latencies)
+        ordered = sorted(self.latencies)
+        return {
+            "requests": count,
+            "throughput": round(count / elapsed, 2) if elapsed else 0,
+            "errors": self.errors,
+            "error_rate": round(self.errors / count, 4) if count else 0,
+            "latency_ms": {
+                "p50": round(percentile(ordered, 50), 2),
+                "p95": round(percentile(ordered, 95), 2),
+                "p99": round(percentile(ordered, 99), 2),
+                "max": round(ordered[-1], 2) if ordered else 0,
+            },
+            "reasons": self.reasons,
+        }
+
+
+class Pools:
+    """
+    The accounts and ids the scenarios draw from.
+
+    Args:
+        buyers (list[str]): Buyer usernames.
+        vendors (dict): Vendor username -> list of their store ids.
+        products (list[int]): Product ids, most popular first.
+        stores (list[int]): Store ids.
+        password (str): The password of every account.
+    """
+    def __init__(self, buyers, vendors, products, stores, password):
+        self.buyers = buyers
+        self.vendors = vendors
+        self.products = products
+        self.stores = stores
+        self.password = password
+        # Popularity falls off as 1 / rank, as in a real catalog.
+        self._weights = list(
+            accumulate(1 / (rank + 1) for rank in range(len(products)))
+        )
+        self._counter = 0
+
+    def product(self, rng):
+        return rng.choices(self.products, cum_weights=self._weights)[0]
+
+    def unique(self):
+        self._counter += 1
+        return self._counter
+
+
+class Visit(dict):
+    """
+    The placeholder values of one visit, drawn the first time they are
+    used.
+    """
+    def __init__(self, pools, rng, own_stores=()):
+        super().__init__()
+        self.pools = pools
+        self.rng = rng
+        self.own_stores = own_stores
+
+    def __missing__(self, key):
+        if key == "product":
+            value = self.pools.product(self.rng)
+        elif key == "products":
+            value = ",".join(
+                str(self.pools.product(self.rng)) for _ in range(5)
+            )
+        elif key == "store":
+            value = self.rng.choice(self.pools.stores)
+        elif key == "own_store":
+            value = self.rng.choice(self.own_stores)
+        elif key == "unique":
+            value = self.pools.unique()
+        else:
+            raise LoadTestError(f"Unknown placeholder {{{key}}}.")
+        self[key] = value
+        return value
+
+    def fill(self, values):
+        return {
+            key: str(value).format_map(self) for key, value in values.items()
+        }
+
+
+class LoadTest:
+    """
+    Replay weighted scenarios against a running server with concurrent
+    virtual users.
+
+    Every virtual user repeatedly picks a scenario by weight and runs it
+    as a new visit: a fresh cookie jar, a login for buyer and vendor
+    scenarios, then the steps in order.
+
+    Args:
+        base_url (str): The server, e.g. "http://127.0.0.1:8000".
+        scenarios (list): Scenarios validated by ``load_scenarios``.
+        pools (Pools): The accounts and ids to use.
+        users (int): Concurrent virtual users.
+        duration (float): Seconds to run.
+        ramp_up (float, optional): Seconds over which the users start.
+        seed (int, optional): Random seed of the choices made.
+        timeout (float, optional): Seconds allowed per request.
+    """
+    def __init__(
+        self,
+        base_url,
+        scenarios,
+        pools,
+        users,
+        duration,
+        ramp_up=0,
+        seed=0,
+        timeout=30,
+    ):
+        self.base_url = base_url
+        self.scenarios = scenarios
+        self.pools = pools
+        self.users = users
+        self.duration = duration
+        self.ramp_up = ramp_up
+        self.seed = seed
+        self.timeout = timeout
+        self.stats = {}
+        self.visits = {scenario["name"]: 0 for scenario in scenarios}
+        # Reversed paths are memoized: the generator must stay cheaper than
+        # the server it loads. Every URL is checked up front for typos.
+        self._paths = {}
+        for scenario in scenarios:
+            for step in scenario["steps"]:
+                self._check_url(step)
+
+    def _check_url(self, step):
+        kwargs = {key: 1 for key in step["kwargs"]}
+        try:
+            reverse(step["url"], kwargs=kwargs or None)
+        except Exception as exc:
+            raise LoadTestError(f"Cannot reverse {step['url']}: {exc}")
+        if step["redirect"]:
+            try:
+                self._paths[(step["redirect"], ())] = reverse(step["redirect"])
+            except Exception as exc:
+                raise LoadTestError(
+                    f"Cannot reverse {step['redirect']}: {exc}"
+                )
+
+    def _path(self, step, visit):
+        kwargs = visit.fill(step["kwargs"])
+        key = (step["url"], tuple(sorted(kwargs.items())))
+        path = self._paths.get(key)
+        if path is None:
+            path = self._paths[key] = reverse(
+                step["url"], kwargs=kwargs or None
+            )
+        if step["query"]:
+            path += "?" + urlencode(visit.fill(step["query"]))
+        return path
+
+    def _stats(self, name):
+        if name not in self.stats:
+            self.stats[name] = StepStats()
+        return self.stats[name]
+
+    async def _send(
+        self, client, name, method, path, data, expect, redirect=None
+    ):
+        started = time.perf_counter()
+        error = None
+        try:
+            response = await client.request(method, path, data)
+            if response.status not in expect:
+                error = str(response.status)
+            elif redirect is not None:
+                location = urlsplit(response.header("location") or "").path
+                if location != redirect:
+                    # e.g. "302 /orders/cart/": a redirect to a failure.
+                    error = f"{response.status} {location}"
+        except (OSError, asyncio.TimeoutError, LoadTestError) as exc:
+            error = type(exc).__name__
+        self._stats(name).record(time.perf_counter() - started, error)
+        return error is None
+
+    async def _login(self, client, username):
+        path = reverse("accounts:login")
+        form = await self._send(client, "login_form", "GET", path, None, [200])
+        if not form:
+            return False
+        return await self._send(
+            client,
+            "login",
+            "POST",
+            path,
+            {"username": username, "password": self.pools.password},
+            [302],
+        )
+
+    async def _visit(self, client, rng, scenario):
+        client.reset()
+        own_stores = ()
+        persona = scenario["persona"]
+        if persona == "buyer":
+            if not await self._login(client, rng.choice(self.pools.buyers)):
+                return
+        elif persona == "vendor":
+            username = rng.choice(list(self.pools.vendors))
+            own_stores = self.pools.vendors[username]
+            if not await self._login(client, username):
+                return
+        visit = Visit(self.pools, rng, own_stores)
+        for step in scenario["steps"]:
+            ok = await self._send(
+                client,
+                step["name"],
+                step["method"],
+                self._path(step, visit),
+                visit.fill(step["data"]) if step["data"] else None,
+                step["expect"],
+                self._paths.get((step["redirect"], ())),
+            )
+            if not ok:
+                # Later steps usually depend on this one.
+                return
+            low, high = step["think"]
+            if high:
+                await asyncio.sleep(rng.uniform(low, high))
+
+    async def _user(self, number, deadline):
+        rng = random.Random(f"{self.seed}:{number}")
+        if self.ramp_up:
+            await asyncio.sleep(self.ramp_up * number / self.users)
+        client = HttpClient(self.base_url, self.timeout)
+        weights = [scenario["weight"] for scenario in self.scenarios]
+        try:
+            while time.monotonic() < deadline:
+                scenario = rng.choices(self.scenarios, weights=weights)[0]
+                self.visits[scenario["name"]] += 1
+                await self._visit(client, rng, scenario)
+        finally:
+            await client.close()
+
+    async def run(self):
+        """
+        Run the load test.
+
+        Returns:
+            dict: The totals ("requests", "throughput", "error_rate"),
+            "visits" per scenario and a report per step, each with
+            "requests", "throughput" (requests per second), "errors",
+            "error_rate", "latency_ms" (p50, p95, p99, max) and the error
+            "reasons" (status codes or exception names).
+        """
+        started = time.monotonic()
+        deadline = started + self.ramp_up + self.duration
+        await asyncio.gather(
+            *(self._user(number, deadline) for number in range(self.users))
+        )
+        elapsed = time.monotonic() - started
+        steps = {
+            name: stats.report(elapsed) for name, stats in self.stats.items()
+        }
+        requests = sum(step["requests"] for step in steps.values())
+        errors = sum(step["errors"] for step in steps.values())
+        return {
+            "users": self.users,
+            "seconds": round(elapsed, 2),
+            "requests": requests,
+            "throughput": round(requests / elapsed, 2) if elapsed else 0,
+            "error_rate": round(errors / requests, 4) if requests else 0,
+            "visits": self.visits,
+            "steps": steps,
+        }
@@ -0,0 +1,137 @@
+import logging
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from .conf import setting
+from .models import OutboxEmail
+from .outbox import (
+    DELIVERY_SECONDS,
+    claim_due,
+    count_results,
+    record_failure,
+    record_success,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def queue_email(subject, body, to, from_email="", html=False):
+    """
+    Queue an email for background delivery.
+
+    The row is written on the caller's database connection, so when the
+    caller is inside ``transaction.atomic()`` the email is only queued if the
+    surrounding transaction commits (and is discarded if it rolls back).
+
+    Args:
+        subject (str): The subject line of the email.
+        body (str): The rendered body of the email.
+        to (list[str]): The recipient addresses.
+        from_email (str, optional): The sender address. Defaults to
+            settings.DEFAULT_FROM_EMAIL at send time.
+        html (bool, optional): Send the body as text/html. Defaults to False.
+
+    Returns:
+        OutboxEmail: The queued outbox row.
+    """
+    return OutboxEmail.objects.create(
+        subject=subject,
+        body=body,
+        to=list(to),
+        from_email=from_email or "",
+        content_subtype="html" if html else "plain",
+        next_attempt_at=timezone.now(),
+    )
+
+
+def _build_message(email, connection):
+    """
+    Build the EmailMessage for an outbox row, bound to a shared connection.
+    """
+    message = EmailMessage(
+        email.subject,
+        email.body,
+        email.from_email or None,
+        email.to,
+        connection=connection,
+    )
+    message.content_subtype = email.content_subtype
+    return message
+
+
+def _open(connection):
+    """
+    Open a mail connection, logging (rather than raising) a failure so the
+    affected emails are rescheduled one by one.
+    """
+    try:
+        connection.open()
+    except Exception as e:
+        logger.warning("Could not open mail connection: %s", e)
+
+
+def send_pending(batch_size=None, connection=None):
+    """
+    Deliver one batch of due emails over a single mail connection.
+
+    The SMTP connection is opened once and reused for every email in the
+    batch. A failed email is rescheduled with exponential back-off; after
+    settings.EMAIL_OUTBOX_MAX_ATTEMPTS failures it is marked "dead" and left
+    in the table for inspection.
+
+    Args:
+        batch_size (int, optional): The maximum number of emails to send.
+            Defaults to settings.EMAIL_OUTBOX_BATCH_SIZE.
+        connection (optional): An email backend instance to send through.
+            Defaults to a new connection from ``get_connection()``.
+
+    Returns:
+        dict: Counts of "sent", "retried" and "dead" emails in this batch.
+    """
+    batch_size = batch_size or setting("EMAIL_OUTBOX_BATCH_SIZE")
+    max_attempts = setting("EMAIL_OUTBOX_MAX_ATTEMPTS")
+    result = {"sent": 0, "retried": 0, "dead": 0}
+
+    emails = claim_due(
+        OutboxEmail, batch_size, setting("EMAIL_OUTBOX_LEASE")
+    )
+    if not emails:
+        return result
+
+    connection = connection or get_connection()
+    _open(connection)
+    try:
+        for email in emails:
+            try:
+                with DELIVERY_SECONDS.time(channel="email"):
+                    sent = _build_message(email, connection).send()
+                if not sent:
+                    raise RuntimeError("The mail backend rejected the email.")
+            except Exception as e:
+                dead = record_failure(
+                    email,
+                    e,
+                    max_attempts,
+                    setting("EMAIL_OUTBOX_RETRY_DELAY"),
+                    setting("EMAIL_OUTBOX_MAX_RETRY_DELAY"),
+                )
+                if dead:
+                    result["dead"] += 1
+                    logger.error(
+                        "Giving up on outbox email #%s: %s",
+                        email.pk,
+                        email.last_error,
+                    )
+                else:
+                    result["retried"] += 1
+                # The connection may be unusable after a failure; start a
+                # fresh one for the rest of the batch.
+                connection.close()
+                _open(connection)
+                continue
+            record_success(email)
+            result["sent"] += 1
+    finally:
+        connection.close()
+    count_results("email", result)
+    return result
@@ -0,0 +1,275 @@
+import json
+import os
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connections, migrations, transaction
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.writer import MigrationWriter
+
+from functions.datagen import STAGES, Plan, run_stage
+from functions.indexadvisor import advise, benchmark
+from functions.models import CapturedQuery
+
+# Migrations adding an index to a table of a third-party app (e.g.
+# auth_user) live in one of the project's apps instead.
+EXTERNAL_TEMPLATE = '''from django.db import migrations, models
+
+# {table} belongs to {app_label}, so the index is created here rather
+# than declared on the model.
+INDEX = {index}
+
+
+def add_index(apps, schema_editor):
+    schema_editor.add_index(apps.get_model("{label}"), INDEX)
+
+
+def remove_index(apps, schema_editor):
+    schema_editor.remove_index(apps.get_model("{label}"), INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+{dependencies}
+    ]
+
+    operations = [
+        migrations.RunPython(add_index, remove_index),
+    ]
+'''
+
+
+class Command(BaseCommand):
+    """
+    Propose indexes for the captured slow queries, write their migrations
+    and measure what they gain.
+
+    The queries come from the CapturedQuery rows stored by the SQL
+    instrumentation middleware (see functions.queryplans). Each is
+    explained again; when its plan scans a table in full or sorts it, an
+    index is proposed on the columns it filters on, then the ones it
+    sorts on (see functions.indexadvisor.advise).
+
+    ``--write-migrations`` writes an AddIndex migration per proposal and
+    prints the Meta.indexes entry to add to the model, so the next
+    makemigrations stays empty. Indexes on third-party tables (e.g.
+    auth_user) get a migration in ``--external-app`` instead.
+
+    ``--benchmark`` times the affected queries before and after creating
+    each index, inside a transaction that is rolled back; it needs a
+    database that can roll back DDL (SQLite or PostgreSQL). With
+    ``--seed-products`` a synthetic dataset of that size is generated in
+    the same transaction first, so the timings mean something on an
+    empty development database.
+
+    Usage:
+        python manage.py advise_indexes --min-ms 50
+        python manage.py advise_indexes --benchmark --seed-products 50000
+        python manage.py advise_indexes --write-migrations
+    """
+    help = "Propose indexes for captured slow queries."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-ms",
+            type=float,
+            default=0,
+            help="Only statements that once took at least this long.",
+        )
+        parser.add_argument(
+            "--benchmark",
+            action="store_true",
+            help="Time the affected queries without and with each index.",
+        )
+        parser.add_argument(
+            "--seed-products",
+            type=int,
+            default=0,
+            help="Generate a dataset this large before benchmarking.",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=20,
+            help="Runs per query when benchmarking; the median is kept.",
+        )
+        parser.add_argument(
+            "--write-migrations",
+            action="store_true",
+            help="Write a migration adding each proposed index.",
+        )
+        parser.add_argument(
+            "--output-dir",
+            help="Write the migrations here instead of into the apps.",
+        )
+        parser.add_argument(
+            "--external-app",
+            default="accounts",
+            help="The app receiving indexes on third-party tables.",
+        )
+        parser.add_argument(
+            "--json",
+            action="store_true",
+            help="Print the results as JSON.",
+        )
+
+    def handle(self, *args, **options):
+        queries = CapturedQuery.objects.filter(
+            max_ms__gte=options["min_ms"]
+        ).order_by("-max_ms")
+        try:
+            proposals = advise(queries)
+        except DatabaseError as exc:
+            raise CommandError(f"Cannot explain the captured queries: {exc}")
+        results = [proposal.as_dict() for proposal in proposals]
+
+        if options["benchmark"] and proposals:
+            timings = self.benchmark(proposals, options)
+            for result, timing in zip(results, timings):
+                result["benchmark"] = timing
+        if options["write_migrations"]:
+            # app label -> the last migration written for it.
+            self.written = {}
+            for result, proposal in zip(results, proposals):
+                result["migration"], result["meta"] = self.write_migration(
+                    proposal, options
+                )
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.report(results)
+
+    def benchmark(self, proposals, options):
+        """
+        Time each proposal's queries without and with its index, then
+        roll everything back.
+        """
+        aliases = {query.database for p in proposals for query in p.queries}
+        for alias in aliases:
+            if not connections[alias].features.can_rollback_ddl:
+                raise CommandError(
+                    f"Benchmarking creates indexes in a transaction, which "
+                    f"{connections[alias].vendor} cannot roll back."
+                )
+        timings = []
+        for proposal in proposals:
+            alias = proposal.queries[0].database
+            # One transaction per proposal, so each is timed alone.
+            with transaction.atomic(using=alias):
+                if options["seed_products"]:
+                    self.seed(options["seed_products"])
+                timings.append(benchmark(proposal, alias, options["repeat"]))
+                transaction.set_rollback(True, using=alias)
+        return timings
+
+    def seed(self, products):
+        """
+        Generate a synthetic dataset scaled on its number of products.
+        """
+        plan = Plan(
+            vendors=max(1, products // 1000),
+            buyers=max(1, products // 10),
+            stores=max(1, products // 300),
+            products=products,
+            orders=products // 2,
+            reviews=products,
+        )
+        plan.prepare()
+        for stage in STAGES:
+            run_stage(plan, stage)
+
+    def write_migration(self, proposal, options):
+        """
+        Write the migration adding a proposal's index.
+
+        Returns:
+            tuple: The path of the migration, and the Meta.indexes entry
+            to add to the model (None for a third-party model).
+        """
+        index = proposal.index()
+        model = proposal.model
+        app_label = model._meta.app_label
+        external = not Path(
+            apps.get_app_config(app_label).path
+        ).is_relative_to(settings.BASE_DIR)
+        target = options["external_app"] if external else app_label
+
+        loader = MigrationLoader(None, ignore_no_migrations=True)
+        dependencies = loader.graph.leaf_nodes(target)
+        if target in self.written:
+            # Chain the migrations written for one app in this run.
+            dependencies = [(target, self.written[target])]
+        number = max(
+            (int(name.split("_", 1)[0]) for _, name in dependencies),
+            default=0,
+        )
+        name = f"{number + 1:04d}_{index.name}"
+        self.written[target] = name
+        meta = None
+
+        if external:
+            dependencies += loader.graph.leaf_nodes(app_label)
+            content = EXTERNAL_TEMPLATE.format(
+                table=proposal.table,
+                app_label=app_label,
+                label=model._meta.label,
+                index=MigrationWriter.serialize(index)[0],
+                dependencies="\n".join(
+                    f"        {dependency!r},".replace("'", '"')
+                    for dependency in dependencies
+                ),
+            )
+            path = os.path.join(
+                os.path.dirname(
+                    MigrationWriter(
+                        migrations.Migration(name, target)
+                    ).path
+                ),
+                f"{name}.py",
+            )
+        else:
+            migration = migrations.Migration(name, target)
+            migration.dependencies = dependencies
+            migration.operations = [
+                migrations.AddIndex(model._meta.model_name, index)
+            ]
+            writer = MigrationWriter(migration)
+            content = writer.as_string()
+            path = writer.path
+            meta = MigrationWriter.serialize(index)[0]
+
+        if options["output_dir"]:
+            path = os.path.join(options["output_dir"], f"{name}.py")
+        with open(path, "w") as output:
+            output.write(content)
+        return path, meta
+
+    def report(self, results):
+        if not results:
+            self.stdout.write("No index to propose.")
+            return
+        for result in results:
+            covering = " (covering)" if result["covering"] else ""
+            self.stdout.write(
+                f"{result['table']}: {result['name']} on "
+                f"({', '.join(result['fields'])}){covering}, for "
+                f"{', '.join(result['reasons'])} in "
+                f"{len(result['queries'])} queries"
+            )
+            for fingerprint in result["queries"]:
+                self.stdout.write(f"  {fingerprint[:200]}")
+            for timing in result.get("benchmark", []):
+                self.stdout.write(
+                    f"  {timing['before_ms']} ms -> {timing['after_ms']} ms: "
+                    f"{timing['fingerprint'][:100]}"
+                )
+                for line in timing["plan"]:
+                    self.stdout.write(f"    {line}")
+            if "migration" in result:
+                self.stdout.write(f"  wrote {result['migration']}")
+            if result.get("meta"):
+                self.stdout.write(f"  add to Meta.indexes: {result['meta']}")
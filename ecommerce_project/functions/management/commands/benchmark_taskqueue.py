@@ -0,0 +1,89 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from functions.models import Task
+
+from .runworkers import run_pool
+
+
+class Command(BaseCommand):
+    """
+    Measure task queue throughput for different worker pool sizes.
+
+    For every pool size, queues ``--tasks`` no-op tasks, drains them with
+    ``runworkers --once`` semantics and reports tasks per second. The
+    benchmark rows are deleted afterwards. Run it against a development
+    database, never production.
+
+    Usage:
+        python manage.py benchmark_taskqueue --tasks 5000 --processes 1 2 4
+    """
+    help = "Benchmark task queue throughput with N worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--tasks",
+            type=int,
+            default=2000,
+            help="Tasks queued for each run.",
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            nargs="+",
+            default=[1, 2, 4],
+            help="Pool sizes to benchmark.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=50,
+            help="Tasks claimed by a worker at a time.",
+        )
+        parser.add_argument(
+            "--json",
+            action="store_true",
+            help="Print the results as JSON.",
+        )
+
+    def handle(self, *args, **options):
+        results = []
+        for processes in options["processes"]:
+            now = timezone.now()
+            Task.objects.bulk_create(
+                [
+                    Task(
+                        name="functions.noop",
+                        key=f"benchmark:{i}",
+                        next_attempt_at=now,
+                    )
+                    for i in range(options["tasks"])
+                ],
+                batch_size=1000,
+            )
+            started = time.perf_counter()
+            totals = run_pool(
+                processes, batch_size=options["batch_size"], once=True
+            )
+            elapsed = time.perf_counter() - started
+            Task.objects.filter(key__startswith="benchmark:").delete()
+            results.append(
+                {
+                    "processes": processes,
+                    "tasks": totals["sent"],
+                    "seconds": round(elapsed, 3),
+                    "tasks_per_second": round(totals["sent"] / elapsed, 1),
+                }
+            )
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for row in results:
+            self.stdout.write(
+                "{processes:>3} processes: {tasks} tasks in {seconds}s "
+                "({tasks_per_second} tasks/s)".format(**row)
+            )
@@ -0,0 +1,173 @@
+import json
+import logging
+import platform
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import override_settings
+from django.utils import timezone
+
+from functions.benchmark import discover_urls, measure, seed
+from functions.versions import bump
+
+
+class Command(BaseCommand):
+    """
+    Measure every view and API endpoint in-process.
+
+    Seeds a synthetic shop (see functions.benchmark.seed), then drives
+    every named URL of the project through the Django test client as a
+    buyer, a vendor or an anonymous visitor, and reports per URL the
+    latency percentiles, queries, SQL time and peak allocated memory.
+
+    Everything runs inside one transaction that is rolled back at the
+    end, so the seeded rows and anything the views write never persist.
+    Read replicas are disabled for the run, since they could not see the
+    uncommitted rows, and the seeded rows' cache namespaces are bumped at
+    the end, so no page cached during the run outlives it. Run it against
+    a development database.
+
+    Usage:
+        python manage.py benchmark_views --products 2000 --json > run.json
+        python manage.py benchmark_views --only products: --iterations 200
+    """
+    help = "Benchmark every view and API endpoint with a seeded dataset."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--vendors", type=int, default=5)
+        parser.add_argument("--stores-per-vendor", type=int, default=2)
+        parser.add_argument("--products", type=int, default=200)
+        parser.add_argument("--buyers", type=int, default=20)
+        parser.add_argument("--orders", type=int, default=200)
+        parser.add_argument("--reviews", type=int, default=500)
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Random seed of the dataset.",
+        )
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=50,
+            help="Measured requests per URL.",
+        )
+        parser.add_argument(
+            "--warmup",
+            type=int,
+            default=3,
+            help="Unmeasured requests per URL first.",
+        )
+        parser.add_argument(
+            "--memory-iterations",
+            type=int,
+            default=3,
+            help="Extra requests per URL traced for memory (0 to skip).",
+        )
+        parser.add_argument(
+            "--only",
+            nargs="+",
+            default=[],
+            help="Only URLs whose name contains one of these strings.",
+        )
+        parser.add_argument(
+            "--cold",
+            action="store_true",
+            help="Clear the caches before every request.",
+        )
+        parser.add_argument(
+            "--json",
+            action="store_true",
+            help="Print the results as JSON.",
+        )
+        parser.add_argument(
+            "--output",
+            help="Also write the JSON results to this file.",
+        )
+
+    def handle(self, *args, **options):
+        hosts = [*settings.ALLOWED_HOSTS, "testserver"]
+        # GETs of POST-only endpoints log a warning on every request.
+        request_logger = logging.getLogger("django.request")
+        level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        try:
+            with override_settings(ALLOWED_HOSTS=hosts, DATABASE_REPLICAS=[]):
+                with transaction.atomic():
+                    report, namespaces = self.run(options)
+                    transaction.set_rollback(True)
+        finally:
+            request_logger.setLevel(level)
+        bump(*namespaces)
+
+        data = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                output.write(data + "\n")
+        if options["json"]:
+            self.stdout.write(data)
+            return
+        self.stdout.write(
+            f"{'URL':<40} {'status':>6} {'p50 ms':>9} {'p99 ms':>9} "
+            f"{'queries':>8} {'SQL ms':>8} {'alloc KB':>9}"
+        )
+        for row in report["results"]:
+            self.stdout.write(
+                f"{row['name']:<40} {row['status']:>6} "
+                f"{row['latency_ms']['p50']:>9} "
+                f"{row['latency_ms']['p99']:>9} "
+                f"{row['queries']:>8} {row['sql_ms']:>8} "
+                f"{row['allocated_kb'] or '-':>9}"
+            )
+
+    def run(self, options):
+        """
+        Seed the dataset and measure every selected URL.
+
+        Returns:
+            tuple: The report, and the cache namespaces of the seeded rows.
+        """
+        dataset = seed(
+            vendors=options["vendors"],
+            stores_per_vendor=options["stores_per_vendor"],
+            products=options["products"],
+            buyers=options["buyers"],
+            orders=options["orders"],
+            reviews=options["reviews"],
+            seed_value=options["seed"],
+        )
+        results = []
+        for name, params in discover_urls():
+            if options["only"] and not any(
+                part in name for part in options["only"]
+            ):
+                continue
+            results.append(
+                measure(
+                    dataset,
+                    name,
+                    params,
+                    iterations=options["iterations"],
+                    warmup=options["warmup"],
+                    memory_iterations=options["memory_iterations"],
+                    clear_cache=options["cold"],
+                )
+            )
+        report = {
+            "started_at": timezone.now().isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "dataset": dataset.counts,
+            "options": {
+                "iterations": options["iterations"],
+                "warmup": options["warmup"],
+                "memory_iterations": options["memory_iterations"],
+                "cold": options["cold"],
+                "seed": options["seed"],
+            },
+            "results": results,
+        }
+        return report, dataset.namespaces
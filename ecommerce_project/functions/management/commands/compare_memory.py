@@ -0,0 +1,174 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from functions.conf import setting
+from functions.memprofile import summarize
+
+
+class Command(BaseCommand):
+    """
+    Compare the memory requests allocate, per view, across deploys.
+
+    The memory profiling middleware stores a sample of requests' peak and
+    retained memory with the release they ran under (see
+    functions.memprofile). This command summarizes a release's samples
+    per view and compares each view's median peak with a baseline: the
+    file given with ``--baseline``, or the samples of the release given
+    with ``--against``. A view whose median peak grew by more than
+    ``--threshold`` percent is a regression, typically a list endpoint
+    that now materializes a whole queryset; its top allocation sites say
+    where.
+
+    Save a baseline before a deploy and compare after it; ``--check``
+    fails when a view regressed, e.g. in CI after a load test.
+
+    Usage:
+        python manage.py compare_memory --save-baseline memory.json
+        python manage.py compare_memory --baseline memory.json --check
+        python manage.py compare_memory --release abc123 --against 9f8e7d
+    """
+    help = "Compare the memory requests allocate per view across releases."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--release",
+            help="The release to summarize (default: settings.RELEASE).",
+        )
+        parser.add_argument(
+            "--baseline",
+            help="A file written by --save-baseline to compare with.",
+        )
+        parser.add_argument(
+            "--against",
+            help="Another release whose samples to compare with.",
+        )
+        parser.add_argument(
+            "--save-baseline",
+            help="Write the release's summary to this file.",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=20,
+            help="Growth of the median peak, in percent, that regresses.",
+        )
+        parser.add_argument(
+            "--min-samples",
+            type=int,
+            default=1,
+            help="Ignore views with fewer samples than this.",
+        )
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Fail if a view's median peak grew beyond the threshold.",
+        )
+        parser.add_argument(
+            "--json",
+            action="store_true",
+            help="Print the results as JSON.",
+        )
+
+    def handle(self, *args, **options):
+        if options["baseline"] and options["against"]:
+            raise CommandError("Give --baseline or --against, not both.")
+        release = options["release"]
+        if release is None:
+            release = setting("RELEASE")
+        summary = {
+            view_name: stats
+            for view_name, stats in summarize(release).items()
+            if stats["samples"] >= options["min_samples"]
+        }
+
+        baseline = None
+        if options["baseline"]:
+            with open(options["baseline"]) as source:
+                baseline = json.load(source)["views"]
+        elif options["against"] is not None:
+            baseline = summarize(options["against"])
+
+        if options["save_baseline"]:
+            with open(options["save_baseline"], "w") as output:
+                json.dump(
+                    {"release": release, "views": summary}, output, indent=2
+                )
+                output.write("\n")
+
+        results = [
+            self.compare(view_name, stats, baseline, options["threshold"])
+            for view_name, stats in summary.items()
+        ]
+        results.sort(key=lambda result: -(result["change"] or 0))
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.report(release, results)
+
+        regressions = [
+            result for result in results if result["status"] == "grew"
+        ]
+        if options["check"] and regressions:
+            raise CommandError(
+                f"{len(regressions)} view(s) allocate more than "
+                f"{options['threshold']:g}% more memory than the baseline."
+            )
+
+    def compare(self, view_name, stats, baseline, threshold):
+        """
+        Compare one view's summary with its baseline.
+
+        Returns:
+            dict: The summary (see functions.memprofile.summarize) with
+            "view_name", "baseline_peak_kb", "change" (the growth of the
+            median peak, in percent) and "status" ("same", "grew",
+            "shrank", "new" when the baseline lacks the view, or
+            "unknown" without a baseline).
+        """
+        result = {"view_name": view_name, **stats}
+        expected = None if baseline is None else baseline.get(view_name)
+        result["baseline_peak_kb"] = expected and expected["peak_kb"]
+        result["change"] = None
+        if baseline is None:
+            result["status"] = "unknown"
+        elif expected is None:
+            result["status"] = "new"
+        else:
+            before = max(expected["peak_kb"], 1)
+            change = (stats["peak_kb"] - before) / before * 100
+            result["change"] = round(change, 1)
+            if change > threshold:
+                result["status"] = "grew"
+            elif change < -threshold:
+                result["status"] = "shrank"
+            else:
+                result["status"] = "same"
+        return result
+
+    def report(self, release, results):
+        if not results:
+            self.stdout.write(f"No memory samples for release {release!r}.")
+            return
+        for result in results:
+            line = (
+                f"{result['view_name']}: median peak {result['peak_kb']} KiB"
+                f", p95 {result['p95_peak_kb']} KiB, retained "
+                f"{result['retained_kb']} KiB over {result['samples']} "
+                f"samples"
+            )
+            if result["change"] is not None:
+                line += (
+                    f" ({result['change']:+g}% from "
+                    f"{result['baseline_peak_kb']} KiB, {result['status']})"
+                )
+            elif result["status"] == "new":
+                line += " (new)"
+            self.stdout.write(line)
+            if result["status"] == "grew":
+                for site in result["top_sites"][:5]:
+                    self.stdout.write(
+                        f"  {site['site']}: {site['kb']} KiB in "
+                        f"{site['blocks']} blocks"
+                    )
@@ -0,0 +1,185 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from functions.datagen import (
+    STAGES,
+    Plan,
+    reset_sequences,
+    run_stage,
+)
+from functions.versions import bump
+from orders.purchases import backfill_purchases, purchased
+from orders.rollups import rebuild_daily_sales
+from reviews.models import Review
+from reviews.ratings import rebuild_rating_summaries
+
+
+class Command(BaseCommand):
+    """
+    Fill the database with a large, realistic synthetic shop.
+
+    Generates vendors and buyers with profiles, stores with a skewed
+    number of products, products, orders with their items and reviews.
+    Product popularity is Zipfian: a few products get most of the orders
+    and reviews, as in a real shop. Ratings follow RATING_WEIGHTS in
+    functions.datagen. Orders and reviews are spread over ``--days``. A
+    buyer reviews a product at most once, so ``--reviews`` is capped at
+    products times buyers.
+
+    Rows are inserted with bulk_create in chunks of ``--chunk-size``,
+    one transaction per chunk, by a pool of ``--processes`` processes.
+    The output depends only on ``--seed`` and the counts, never on the
+    number of processes. Generated rows are added to the existing ones;
+    every generated user's password is "password". Afterwards the daily
+    sales rollup, the purchase index and the rating summaries are rebuilt,
+    and reviews are verified against the purchase index (skip with
+    ``--skip-derived``, which leaves every review unverified).
+
+    SQLite allows one writer at a time, so it defaults to one process.
+
+    Usage:
+        python manage.py generate_data --products 1000000 --orders 500000
+        python manage.py generate_data --products 20000 --json
+    """
+    help = "Generate a large synthetic dataset of stores, orders, reviews."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--vendors", type=int, default=100)
+        parser.add_argument("--buyers", type=int, default=10000)
+        parser.add_argument("--stores", type=int, default=300)
+        parser.add_argument("--products", type=int, default=100000)
+        parser.add_argument("--orders", type=int, default=50000)
+        parser.add_argument("--reviews", type=int, default=100000)
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=365,
+            help="Spread orders and reviews over this many past days.",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Random seed; the same seed gives the same data.",
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            help="Worker processes (default: 1 on SQLite, else CPU count).",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=20000,
+            help="Rows generated per transaction.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Rows inserted per statement.",
+        )
+        parser.add_argument(
+            "--skip-derived",
+            action="store_true",
+            help="Do not rebuild the rollup and summary tables.",
+        )
+        parser.add_argument(
+            "--json",
+            action="store_true",
+            help="Print the results as JSON.",
+        )
+
+    def handle(self, *args, **options):
+        if options["vendors"] < 1 or options["buyers"] < 1:
+            raise CommandError("Need at least one vendor and one buyer.")
+        if options["stores"] < 1 and options["products"]:
+            raise CommandError("Products need at least one store.")
+        processes = options["processes"]
+        if processes is None:
+            processes = 1 if connection.vendor == "sqlite" else os.cpu_count()
+
+        plan = Plan(
+            vendors=options["vendors"],
+            buyers=options["buyers"],
+            stores=options["stores"],
+            products=options["products"],
+            orders=options["orders"],
+            reviews=options["reviews"],
+            seed=options["seed"],
+            days=options["days"],
+            batch_size=options["batch_size"],
+        )
+        plan.prepare()
+        started = time.perf_counter()
+        results = [
+            self.timed(
+                stage,
+                lambda stage=stage: run_stage(
+                    plan, stage, processes, options["chunk_size"]
+                ),
+            )
+            for stage in STAGES
+        ]
+        reset_sequences()
+        if not options["skip_derived"]:
+            results.append(self.timed("derived", self.rebuild_derived))
+        bump("catalog")
+        elapsed = time.perf_counter() - started
+
+        if options["json"]:
+            self.stdout.write(
+                json.dumps(
+                    {
+                        "database": connection.vendor,
+                        "processes": processes,
+                        "seed": options["seed"],
+                        "seconds": round(elapsed, 2),
+                        "stages": results,
+                    },
+                    indent=2,
+                )
+            )
+            return
+        for result in results:
+            self.stdout.write(
+                f"{result['stage']:<10} {result['rows']:>10} rows "
+                f"{result['seconds']:>8.2f} s "
+                f"{result['rows_per_second']:>10.0f} rows/s"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated the dataset in {elapsed:.1f} s "
+                f"with {processes} process(es)."
+            )
+        )
+
+    def rebuild_derived(self):
+        """
+        Rebuild the tables derived from orders and reviews, which
+        bulk_create bypassed, and mark the reviews whose reviewer ordered
+        the product as verified. Returns the number of rows written.
+        """
+        return (
+            rebuild_daily_sales()
+            + backfill_purchases()
+            + Review.objects.update(verified=purchased())
+            + rebuild_rating_summaries()
+        )
+
+    def timed(self, stage, func):
+        started = time.perf_counter()
+        rows = func()
+        return self.result(stage, rows, time.perf_counter() - started)
+
+    def result(self, stage, rows, seconds):
+        return {
+            "stage": stage,
+            "rows": rows,
+            "seconds": round(seconds, 2),
+            "rows_per_second": round(rows / seconds) if seconds else 0,
+        }
@@ -0,0 +1,187 @@
+import asyncio
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from functions.datagen import PASSWORD
+from functions.loadtest import (
+    DEFAULT_SCENARIOS,
+    LoadTest,
+    LoadTestError,
+    Pools,
+    load_scenarios,
+)
+from orders.models import OrderItem
+from products.models import Product
+from store.models import Store
+
+
+class Command(BaseCommand):
+    """
+    Load-test a running server with concurrent simulated buyers, vendors
+    and visitors.
+
+    Start the server first (e.g. 'python manage.py runserver' or the
+    production WSGI server) against the same database: the accounts and
+    product ids are read from it. The default scenarios browse the
+    catalog, buy (product list, product detail, add to cart, checkout),
+    call the read APIs and create products as a vendor; pass
+    ``--scenarios file.json`` to replay others (the format is described in
+    functions.loadtest.load_scenarios).
+
+    Buyers and vendors log in through accounts:login with ``--password``,
+    by default the password of the accounts made by generate_data. The
+    scenarios write orders and products, so only run it against a
+    development or staging database.
+
+    Usage:
+        python manage.py loadtest --url http://127.0.0.1:8000 --users 50
+        python manage.py loadtest --scenarios sale.json --duration 300 --json
+    """
+    help = "Replay weighted buyer and vendor scenarios against a server."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url",
+            default="http://127.0.0.1:8000",
+            help="The server to load.",
+        )
+        parser.add_argument(
+            "--users",
+            type=int,
+            default=20,
+            help="Concurrent virtual users.",
+        )
+        parser.add_argument(
+            "--duration",
+            type=float,
+            default=60,
+            help="Seconds to run after the ramp-up.",
+        )
+        parser.add_argument(
+            "--ramp-up",
+            type=float,
+            default=0,
+            help="Seconds over which the virtual users start.",
+        )
+        parser.add_argument(
+            "--scenarios",
+            help="A JSON file with the scenarios to replay.",
+        )
+        parser.add_argument(
+            "--password",
+            default=PASSWORD,
+            help="The password of the buyer and vendor accounts.",
+        )
+        parser.add_argument(
+            "--user-prefix",
+            default="gen_",
+            help="Only log in as users whose username starts with this.",
+        )
+        parser.add_argument(
+            "--products",
+            type=int,
+            default=10000,
+            help="How many of the best-selling products to draw from.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=30,
+            help="Seconds allowed per request.",
+        )
+        parser.add_argument(
+            "--json",
+            action="store_true",
+            help="Print the results as JSON.",
+        )
+
+    def handle(self, *args, **options):
+        scenarios = DEFAULT_SCENARIOS
+        if options["scenarios"]:
+            with open(options["scenarios"]) as source:
+                scenarios = json.load(source)
+        try:
+            scenarios = load_scenarios(scenarios)
+            pools = self.pools(options, scenarios)
+            test = LoadTest(
+                options["url"],
+                scenarios,
+                pools,
+                users=options["users"],
+                duration=options["duration"],
+                ramp_up=options["ramp_up"],
+                seed=options["seed"],
+                timeout=options["timeout"],
+            )
+        except LoadTestError as exc:
+            raise CommandError(exc)
+        report = asyncio.run(test.run())
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write(
+            f"{report['requests']} requests in {report['seconds']} s: "
+            f"{report['throughput']} req/s, "
+            f"{report['error_rate']:.2%} errors"
+        )
+        self.stdout.write(
+            f"{'step':<24} {'requests':>9} {'req/s':>8} {'errors':>7} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+        )
+        for name, step in report["steps"].items():
+            latency = step["latency_ms"]
+            self.stdout.write(
+                f"{name:<24} {step['requests']:>9} {step['throughput']:>8} "
+                f"{step['error_rate']:>7.2%} {latency['p50']:>8} "
+                f"{latency['p95']:>8} {latency['p99']:>8}"
+            )
+
+    def pools(self, options, scenarios):
+        """
+        Read the accounts and ids the scenarios need from the database.
+        """
+        personas = {scenario["persona"] for scenario in scenarios}
+        users = User.objects.filter(
+            username__startswith=options["user_prefix"]
+        )
+        buyers = list(
+            users.filter(profile__account_type="buyer").values_list(
+                "username", flat=True
+            )[:10000]
+        )
+        vendors = {}
+        for username, store_id in (
+            Store.objects.filter(vendor__in=users)
+            .values_list("vendor__username", "id")[:10000]
+        ):
+            vendors.setdefault(username, []).append(store_id)
+        # The best sellers first; products that never sold fill the rest.
+        products = list(
+            OrderItem.objects.values("product_id")
+            .annotate(sold=Count("id"))
+            .order_by("-sold")
+            .values_list("product_id", flat=True)[: options["products"]]
+        )
+        if len(products) < options["products"]:
+            sold = set(products)
+            products += [
+                pk
+                for pk in Product.objects.values_list("pk", flat=True)[
+                    : options["products"]
+                ]
+                if pk not in sold
+            ][: options["products"] - len(products)]
+        stores = list(Store.objects.values_list("pk", flat=True)[:10000])
+
+        if "buyer" in personas and not buyers:
+            raise LoadTestError("No buyer accounts; run generate_data.")
+        if "vendor" in personas and not vendors:
+            raise LoadTestError("No vendor with a store; run generate_data.")
+        if not products or not stores:
+            raise LoadTestError("No products; run generate_data.")
+        return Pools(buyers, vendors, products, stores, options["password"])
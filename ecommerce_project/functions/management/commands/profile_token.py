@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from functions.profiling import MODES, make_token
+
+
+class Command(BaseCommand):
+    """
+    Print a signed X-Profile header value, to profile requests made
+    without a staff session (e.g. API calls from a script).
+
+    Requests carrying the header are profiled by ProfilingMiddleware until
+    the token expires (settings.PROFILE_TOKEN_MAX_AGE). Limit it to one
+    endpoint with ``--path``.
+
+    Usage:
+        python manage.py profile_token --path /api/products/list/
+        curl -H "X-Profile: <token>" https://shop/api/products/list/
+    """
+    help = "Print a signed header value that profiles requests."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--mode", choices=MODES, default="cprofile")
+        parser.add_argument(
+            "--path",
+            help="Only profile requests whose path starts with this.",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(make_token(options["mode"], options["path"]))
@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from functions.tweet import publish_pending
+
+
+class Command(BaseCommand):
+    """
+    Publish queued social posts from the tweet outbox.
+
+    Runs forever by default, posting due tweets in batches over one pooled
+    HTTP session and sleeping while the outbox is empty or the rate limit
+    (settings.TWEET_RATE_LIMIT per settings.TWEET_RATE_WINDOW) is used up.
+
+    Usage:
+        python manage.py publish_tweets
+        python manage.py publish_tweets --once
+    """
+    help = "Publish queued tweets from the outbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Publish until nothing is due, then exit.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Maximum number of tweets posted per batch.",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=15.0,
+            help="Seconds to wait when nothing is due.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            result = publish_pending(batch_size=options["batch_size"])
+            if any(result.values()):
+                self.stdout.write(
+                    "sent={sent} retried={retried} dead={dead}".format(
+                        **result
+                    )
+                )
+                if result["sent"]:
+                    continue
+            if options["once"]:
+                return
+            time.sleep(options["sleep"])
@@ -0,0 +1,185 @@
+import difflib
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, transaction
+
+from functions.models import CapturedQuery
+from functions.queryplans import explain, full_scans
+
+
+class Command(BaseCommand):
+    """
+    Re-explain the captured slow statements against the current schema.
+
+    The SQL instrumentation middleware stores the plan of every slow
+    SELECT (see functions.queryplans). This command explains each of them
+    again, flags full scans of the watched tables
+    (settings.QUERY_PLAN_WATCHED_TABLES: products, order items and
+    reviews by default), and compares each plan with a baseline: the file
+    given with ``--baseline``, or else the plan captured when it was slow.
+
+    Save a baseline before a schema or query change and compare after
+    it; ``--check`` fails when a plan changed or a new full scan appeared,
+    e.g. in CI.
+
+    Usage:
+        python manage.py query_plans --save-baseline plans.json
+        python manage.py query_plans --baseline plans.json --check
+    """
+    help = "Explain captured slow queries again and diff their plans."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--baseline",
+            help="A file written by --save-baseline to compare with.",
+        )
+        parser.add_argument(
+            "--save-baseline",
+            help="Write the current plans to this file.",
+        )
+        parser.add_argument(
+            "--min-ms",
+            type=float,
+            default=0,
+            help="Only statements that once took at least this long.",
+        )
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Fail if a plan changed or a new full scan appeared.",
+        )
+        parser.add_argument(
+            "--json",
+            action="store_true",
+            help="Print the results as JSON.",
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options["baseline"]:
+            with open(options["baseline"]) as source:
+                baseline = json.load(source)
+
+        results = []
+        for query in CapturedQuery.objects.filter(
+            max_ms__gte=options["min_ms"]
+        ).order_by("-max_ms"):
+            results.append(self.compare(query, baseline))
+
+        if options["save_baseline"]:
+            with open(options["save_baseline"], "w") as output:
+                json.dump(
+                    {
+                        result["digest"]: {
+                            "fingerprint": result["fingerprint"],
+                            "database": result["database"],
+                            "plan": result["plan"],
+                        }
+                        for result in results
+                        if result["error"] is None
+                    },
+                    output,
+                    indent=2,
+                )
+                output.write("\n")
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.report(results)
+
+        regressions = [
+            result
+            for result in results
+            if result["status"] == "changed" or result["new_scans"]
+        ]
+        if options["check"] and regressions:
+            raise CommandError(
+                f"{len(regressions)} query plan(s) changed or scan a "
+                f"watched table in full."
+            )
+
+    def compare(self, query, baseline):
+        """
+        Explain one captured statement and compare it with its baseline.
+
+        Returns:
+            dict: "digest", "fingerprint", "database", "view_name",
+            "max_ms", "count", "plan", "full_scans", "new_scans" (full
+            scans the baseline did not have), "status" ("same",
+            "changed", "new" when the baseline lacks it, or "error"),
+            "diff" (unified diff lines) and "error".
+        """
+        if baseline is None:
+            expected = query.plan
+        else:
+            expected = baseline.get(query.digest, {}).get("plan")
+        result = {
+            "digest": query.digest,
+            "fingerprint": query.fingerprint,
+            "database": query.database,
+            "view_name": query.view_name,
+            "max_ms": round(query.max_ms, 2),
+            "count": query.count,
+            "plan": [],
+            "full_scans": [],
+            "new_scans": [],
+            "status": "error",
+            "diff": [],
+            "error": None,
+        }
+        try:
+            with transaction.atomic(using=query.database):
+                plan = explain(query.database, query.sql, query.params)
+        except DatabaseError as exc:
+            # E.g. a column the statement uses was dropped.
+            result["error"] = str(exc)
+            return result
+
+        result["plan"] = plan
+        result["full_scans"] = full_scans(plan)
+        if expected is None:
+            result["status"] = "new"
+            result["new_scans"] = result["full_scans"]
+            return result
+        known = set(full_scans(expected))
+        result["new_scans"] = [
+            table for table in result["full_scans"] if table not in known
+        ]
+        if plan == expected:
+            result["status"] = "same"
+        else:
+            result["status"] = "changed"
+            result["diff"] = list(
+                difflib.unified_diff(
+                    expected, plan, "baseline", "current", lineterm=""
+                )
+            )
+        return result
+
+    def report(self, results):
+        if not results:
+            self.stdout.write("No slow queries captured yet.")
+            return
+        for result in results:
+            self.stdout.write(
+                f"[{result['status']}] {result['max_ms']} ms x "
+                f"{result['count']} in {result['view_name']} "
+                f"({result['database']})"
+            )
+            self.stdout.write(f"  {result['fingerprint'][:200]}")
+            if result["error"]:
+                self.stdout.write(
+                    self.style.ERROR(f"  cannot explain: {result['error']}")
+                )
+                continue
+            if result["full_scans"]:
+                self.stdout.write(
+                    self.style.WARNING(
+                        "  full scan of " + ", ".join(result["full_scans"])
+                    )
+                )
+            lines = result["diff"] or result["plan"]
+            for line in lines:
+                self.stdout.write(f"    {line}")
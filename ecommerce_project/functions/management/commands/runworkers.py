@@ -0,0 +1,120 @@
+import multiprocessing
+import queue
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from functions.taskqueue import autodiscover, worker_process
+
+
+def run_pool(processes, batch_size=None, sleep=1.0, once=False):
+    """
+    Run ``processes`` task queue workers and wait for them to finish.
+
+    SIGINT and SIGTERM ask every worker to stop after its current batch.
+
+    Args:
+        processes (int): Number of worker processes to start.
+        batch_size (int, optional): Tasks claimed per batch.
+        sleep (float, optional): Seconds a worker waits when nothing is due.
+        once (bool, optional): Workers exit as soon as nothing is due.
+
+    Returns:
+        dict: Totals of "sent", "retried" and "dead" tasks over all workers.
+    """
+    # Children must not share the parent's database sockets.
+    connections.close_all()
+    stop_event = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(
+            target=worker_process,
+            args=(stop_event, batch_size, sleep, once, results),
+            name=f"taskworker-{i}",
+        )
+        for i in range(processes)
+    ]
+
+    def stop(signum, frame):
+        stop_event.set()
+
+    previous = {
+        signum: signal.signal(signum, stop)
+        for signum in (signal.SIGINT, signal.SIGTERM)
+    }
+    try:
+        for worker in workers:
+            worker.start()
+        totals = {"sent": 0, "retried": 0, "dead": 0}
+        # Collect before joining so a full queue never blocks a child. A
+        # child that died without reporting is simply not counted.
+        reported = 0
+        while reported < len(workers):
+            try:
+                pid, worker_totals = results.get(timeout=1)
+            except queue.Empty:
+                if not any(worker.is_alive() for worker in workers):
+                    break
+                continue
+            reported += 1
+            for outcome, count in worker_totals.items():
+                totals[outcome] += count
+        for worker in workers:
+            worker.join()
+    finally:
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+    return totals
+
+
+class Command(BaseCommand):
+    """
+    Start a pool of background task workers.
+
+    Each process claims due tasks from the database task queue (see
+    functions.taskqueue), highest priority first. Periodic tasks listed in
+    settings.TASK_QUEUE_PERIODIC are scheduled on start-up.
+
+    Usage:
+        python manage.py runworkers --processes 4
+        python manage.py runworkers --once
+    """
+    help = "Run N background task queue worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=2,
+            help="Number of worker processes.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Tasks claimed by a worker at a time.",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=1.0,
+            help="Seconds a worker waits when nothing is due.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Run until nothing is due, then exit.",
+        )
+
+    def handle(self, *args, **options):
+        autodiscover()
+        totals = run_pool(
+            options["processes"],
+            batch_size=options["batch_size"],
+            sleep=options["sleep"],
+            once=options["once"],
+        )
+        self.stdout.write(
+            "sent={sent} retried={retried} dead={dead}".format(**totals)
+        )
@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from functions.mail import send_pending
+
+
+class Command(BaseCommand):
+    """
+    Drain the outbound email outbox.
+
+    Runs forever by default, sending due emails in batches (one mail server
+    connection per batch) and sleeping while the outbox is empty. Several
+    copies can run side by side; each claims its own rows.
+
+    Usage:
+        python manage.py send_outbox_emails
+        python manage.py send_outbox_emails --once --batch-size 200
+    """
+    help = "Send queued emails from the outbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Send until the outbox has nothing due, then exit.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Maximum number of emails sent per connection.",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=5.0,
+            help="Seconds to wait when the outbox is empty.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            result = send_pending(batch_size=options["batch_size"])
+            if any(result.values()):
+                self.stdout.write(
+                    "sent={sent} retried={retried} dead={dead}".format(
+                        **result
+                    )
+                )
+                continue
+            if options["once"]:
+                return
+            time.sleep(options["sleep"])
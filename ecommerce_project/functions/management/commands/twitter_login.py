@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from functions.tweet import Tweet
+
+
+class Command(BaseCommand):
+    """
+    Obtain Twitter access tokens with the interactive OAuth PIN flow.
+
+    Run this once from a terminal and copy the printed tokens into
+    settings.TWITTER_ACCESS_TOKEN and settings.TWITTER_ACCESS_TOKEN_SECRET.
+    The web app and the publish_tweets worker then use the stored tokens
+    and never prompt for a PIN.
+
+    Usage:
+        python manage.py twitter_login
+    """
+    help = "Authorize the Twitter app and print the access tokens."
+
+    def handle(self, *args, **options):
+        try:
+            tokens = Tweet().authenticate()
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(
+            'TWITTER_ACCESS_TOKEN = "{oauth_token}"\n'
+            'TWITTER_ACCESS_TOKEN_SECRET = "{oauth_token_secret}"'.format(
+                **tokens
+            )
+        )
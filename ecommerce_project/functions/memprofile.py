@@ -0,0 +1,210 @@
+import logging
+import os
+import random
+import statistics
+import threading
+import tracemalloc
+
+from django.conf import settings
+from django.db import DatabaseError
+
+from .conf import setting
+from .instrumentation import resolve_view_name
+from .models import MemorySample
+from .routers import routing
+
+logger = logging.getLogger(__name__)
+
+# tracemalloc is process-wide, so requests are traced one at a time.
+_slot = threading.Lock()
+
+# Allocations made by tracemalloc itself and by the import system are
+# not the request's.
+_IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def _site(frame):
+    """
+    Return "path:line" with the path relative to the project or, for
+    libraries, to their site-packages directory.
+    """
+    filename = frame.filename
+    for root in (str(settings.BASE_DIR), "site-packages"):
+        index = filename.find(root)
+        if index >= 0:
+            filename = filename[index + len(root):].lstrip(os.sep)
+            break
+    return f"{filename}:{frame.lineno}"
+
+
+def top_sites(after, before=None, limit=10):
+    """
+    Return the lines that allocated the most memory still held in
+    ``after``, minus what ``before`` already held.
+
+    Returns:
+        list[dict]: "site" ("path:line"), "kb" and "blocks", largest
+        first.
+    """
+    after = after.filter_traces(_IGNORED)
+    if before is None:
+        stats = after.statistics("lineno")
+        sites = [(stat.traceback[0], stat.size, stat.count) for stat in stats]
+    else:
+        stats = after.compare_to(before.filter_traces(_IGNORED), "lineno")
+        sites = [
+            (stat.traceback[0], stat.size_diff, stat.count_diff)
+            for stat in stats
+            if stat.size_diff > 0
+        ]
+    sites.sort(key=lambda site: -site[1])
+    return [
+        {"site": _site(frame), "kb": round(size / 1024, 1), "blocks": count}
+        for frame, size, count in sites[:limit]
+    ]
+
+
+def _percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def summarize(release):
+    """
+    Summarize a release's memory samples per view.
+
+    Args:
+        release (str): The settings.RELEASE the samples were taken under.
+
+    Returns:
+        dict: View name -> "samples", "peak_kb" (the median peak),
+        "p95_peak_kb", "max_peak_kb", "retained_kb" (the median) and
+        "top_sites" (of the sample with the highest peak).
+    """
+    samples = {}
+    rows = MemorySample.objects.filter(release=release).values_list(
+        "view_name", "peak_kb", "retained_kb", "top_sites"
+    )
+    for view_name, peak_kb, retained_kb, sites in rows.iterator():
+        samples.setdefault(view_name, []).append((peak_kb, retained_kb, sites))
+    summary = {}
+    for view_name, rows in sorted(samples.items()):
+        peaks = [peak_kb for peak_kb, _, _ in rows]
+        summary[view_name] = {
+            "samples": len(rows),
+            "peak_kb": round(statistics.median(peaks), 1),
+            "p95_peak_kb": round(_percentile(peaks, 0.95), 1),
+            "max_peak_kb": round(max(peaks), 1),
+            "retained_kb": round(
+                statistics.median(retained for _, retained, _ in rows), 1
+            ),
+            "top_sites": max(rows, key=lambda row: row[0])[2],
+        }
+    return summary
+
+
+class MemoryProfilingMiddleware:
+    """
+    Record the memory a sample of requests allocate, per view.
+
+    A share of requests (settings.MEMORY_PROFILE_SAMPLE_RATE, between 0
+    and 1) and any request a staff user makes with "?memprofile=1" run
+    with tracemalloc on. The peak traced memory, the memory still held
+    when the response comes back, and the lines that allocated most of it
+    are stored as a MemorySample for the view, with settings.RELEASE. They
+    are listed at ops/memory/, and the compare_memory command compares
+    releases.
+
+    Tracing slows every thread of the process while it is on, so it is
+    only on for one sampled request at a time per process; requests
+    arriving meanwhile are not sampled. Memory other threads allocate
+    during a sampled request is counted too, so a sample is exact under
+    one thread per process (e.g. gunicorn's sync workers), and a
+    process's first requests also count the modules they import. List it
+    after AuthenticationMiddleware, which sets the user it checks.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self.sampled(request) or not _slot.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            return self.trace(request)
+        finally:
+            _slot.release()
+
+    def sampled(self, request):
+        user = getattr(request, "user", None)
+        if request.GET.get("memprofile") and user is not None:
+            if user.is_staff:
+                return True
+        rate = setting("MEMORY_PROFILE_SAMPLE_RATE")
+        return rate > 0 and (rate >= 1 or random.random() < rate)
+
+    def trace(self, request):
+        # Left on when started by PYTHONTRACEMALLOC or someone else.
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start(setting("MEMORY_PROFILE_FRAMES"))
+            before = None
+        else:
+            before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        try:
+            response = self.get_response(request)
+            current, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot()
+        finally:
+            if started:
+                tracemalloc.stop()
+
+        sites = top_sites(
+            after, before, setting("MEMORY_PROFILE_TOP_SITES")
+        )
+        self.save(
+            request,
+            response,
+            peak_kb=(peak - baseline) / 1024,
+            retained_kb=(current - baseline) / 1024,
+            top_sites=sites,
+        )
+        return response
+
+    def save(self, request, response, **values):
+        """
+        Store a sample, then drop the oldest samples of its view and
+        release beyond settings.MEMORY_PROFILE_KEEP.
+        """
+        release = setting("RELEASE")
+        view = getattr(request, "view_name", "unresolved")
+        try:
+            # Outside the request's routing state, like the query plans.
+            with routing():
+                MemorySample.objects.create(
+                    release=release,
+                    view_name=view,
+                    method=request.method,
+                    path=request.get_full_path()[:2000],
+                    status=response.status_code,
+                    **values,
+                )
+                samples = MemorySample.objects.filter(
+                    release=release, view_name=view
+                )
+                oldest = samples.order_by("-id").values_list(
+                    "id", flat=True
+                )[setting("MEMORY_PROFILE_KEEP"):][:1]
+                if oldest:
+                    samples.filter(id__lte=oldest[0]).delete()
+        except DatabaseError as exc:
+            logger.warning("Could not store a memory sample: %s", exc)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        resolve_view_name(request, view_func)
@@ -0,0 +1,507 @@
+import atexit
+import hmac
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from .conf import setting
+from .instrumentation import resolve_view_name
+
+try:
+    import fcntl
+except ImportError:  # Windows: dead workers' files are never merged.
+    fcntl = None
+
+# Latency buckets in seconds, as in the Prometheus client libraries.
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Request methods used as labels; any other is counted as "other", so
+# clients cannot create series at will.
+METHODS = frozenset(
+    ("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS", "TRACE")
+)
+
+# Totals of the processes that exited, merged out of their own files.
+_ARCHIVE = "archive.json"
+
+
+def _key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class _Metric:
+    def __init__(self, registry, name, documentation, labels):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+
+    def _labels(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(
+                f"{self.name} takes the labels {', '.join(self.labels)}."
+            )
+        return _key({name: str(value) for name, value in labels.items()})
+
+
+class Counter(_Metric):
+    """
+    A running total, e.g. of requests or checkouts.
+    """
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        self.registry._add(self.name, self._labels(labels), amount)
+
+
+class Histogram(_Metric):
+    """
+    Counts of observations (e.g. latencies) per bucket, plus their sum.
+    """
+    type = "histogram"
+
+    def __init__(self, registry, name, documentation, labels, buckets):
+        super().__init__(registry, name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        self.registry._observe(self, self._labels(labels), value)
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observe the seconds spent in a ``with`` block.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+
+class Gauge(_Metric):
+    """
+    A value read when the metrics are collected, e.g. connections in use.
+    Summed across processes.
+    """
+    type = "gauge"
+
+
+class Registry:
+    """
+    The metrics of this process, shared with the other worker processes
+    through files.
+
+    Counters and histograms are updated in memory. When
+    settings.METRICS_DIR is set, every process writes its values to
+    "<pid>-<random>.json" in that directory at most every
+    settings.METRICS_FLUSH_INTERVAL seconds (and when it exits), and
+    ``exposition`` sums every process's file. The totals of processes
+    that exited are merged into one archive file, so counters never go
+    backwards when gunicorn replaces a worker. The directory must be local
+    to the host and emptied when the service is (re)deployed.
+
+    Without METRICS_DIR each process only reports its own values, which
+    is right for a single-process server.
+
+    Collectors (see ``collector``) report values other modules already
+    count, such as the connection pool's, when the values are flushed or
+    exposed.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._values = {}
+        self._collectors = []
+        self._pid = None
+        self._check_fork()
+        atexit.register(self.flush)
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labels=()):
+        return self._register(Counter(self, name, documentation, labels))
+
+    def histogram(
+        self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS
+    ):
+        return self._register(
+            Histogram(self, name, documentation, labels, buckets)
+        )
+
+    def gauge(self, name, documentation, labels=()):
+        return self._register(Gauge(self, name, documentation, labels))
+
+    def collector(self, func):
+        """
+        Register a function returning (metric, labels, value) tuples.
+
+        Counter values are the totals counted elsewhere in this process;
+        gauge values are the current readings. Usable as a decorator.
+        """
+        self._collectors.append(func)
+        return func
+
+    def _check_fork(self):
+        # Values inherited from a parent (gunicorn --preload) are the
+        # parent's to report.
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._values = {}
+            self._flushed = 0.0
+            # Names this process's file; a recycled pid gets a new one.
+            self._file = f"{self._pid}-{uuid.uuid4().hex[:8]}.json"
+
+    def _add(self, name, labels, amount):
+        with self._lock:
+            self._check_fork()
+            key = (name, labels)
+            self._values[key] = self._values.get(key, 0) + amount
+        self._maybe_flush()
+
+    def _observe(self, histogram, labels, value):
+        with self._lock:
+            self._check_fork()
+            key = (histogram.name, labels)
+            counts = self._values.get(key)
+            if counts is None:
+                # Per-bucket counts, then the "+Inf" bucket, sum and count.
+                counts = self._values[key] = [0] * (
+                    len(histogram.buckets) + 3
+                )
+            for index, bound in enumerate(histogram.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            else:
+                counts[-3] += 1
+            counts[-2] += value
+            counts[-1] += 1
+        self._maybe_flush()
+
+    def snapshot(self):
+        """
+        Return this process's values, collectors included, as a list of
+        [name, labels, value] entries; histogram values are lists.
+        """
+        with self._lock:
+            self._check_fork()
+            values = {
+                key: list(value) if isinstance(value, list) else value
+                for key, value in self._values.items()
+            }
+        for collector in self._collectors:
+            for metric, labels, value in collector():
+                values[(metric.name, metric._labels(labels))] = value
+        return [
+            [name, dict(labels), value]
+            for (name, labels), value in values.items()
+        ]
+
+    def _maybe_flush(self):
+        interval = setting("METRICS_FLUSH_INTERVAL")
+        if time.monotonic() - self._flushed >= interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Write this process's values to its file in settings.METRICS_DIR.
+        """
+        directory = setting("METRICS_DIR")
+        self._flushed = time.monotonic()
+        if not directory:
+            return
+        values = self.snapshot()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(str(directory), self._file)
+        temporary = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary, "w") as output:
+            json.dump(values, output)
+        os.replace(temporary, path)
+
+    def collect(self):
+        """
+        Return the values of every process, summed by metric and labels.
+        """
+        self.flush()
+        directory = setting("METRICS_DIR")
+        if directory:
+            snapshots = _read_all(str(directory), self)
+        else:
+            snapshots = [self.snapshot()]
+        totals = {}
+        for values in snapshots:
+            for name, labels, value in values:
+                if name in self._metrics:
+                    _accumulate(totals, (name, _key(labels)), value)
+        return totals
+
+    def exposition(self):
+        """
+        Return every metric in the Prometheus text format.
+        """
+        totals = self.collect()
+        lines = []
+        for name, metric in sorted(self._metrics.items()):
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            for (_, labels), value in sorted(
+                (key, value) for key, value in totals.items()
+                if key[0] == name
+            ):
+                if metric.type != "histogram":
+                    lines.append(f"{name}{_format(labels)} {value}")
+                    continue
+                cumulative = 0
+                bounds = [str(bound) for bound in metric.buckets] + ["+Inf"]
+                for bound, count in zip(bounds, value[:-2]):
+                    cumulative += count
+                    lines.append(
+                        f"{name}_bucket"
+                        f"{_format(labels + (('le', bound),))} {cumulative}"
+                    )
+                lines.append(f"{name}_sum{_format(labels)} {value[-2]}")
+                lines.append(f"{name}_count{_format(labels)} {value[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+def _format(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape(value)}"' for name, value in labels
+    )
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return (
+        value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    )
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read(path):
+    try:
+        with open(path) as source:
+            return json.load(source)
+    except (OSError, ValueError):
+        return None
+
+
+def _accumulate(totals, key, value):
+    if isinstance(value, list):
+        current = totals.setdefault(key, [0] * len(value))
+        for index, count in enumerate(value):
+            current[index] += count
+    else:
+        totals[key] = totals.get(key, 0) + value
+
+
+def _read_all(directory, registry):
+    """
+    Return the values in every process's file and the archive.
+
+    The files of processes that exited are first merged into the
+    archive, under a lock so concurrent scrapes never count them twice.
+    """
+    if fcntl is None:
+        return _read_files(directory)
+    with open(os.path.join(directory, ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        _merge_exited(directory, registry)
+        return _read_files(directory)
+
+
+def _read_files(directory):
+    snapshots = []
+    for name in os.listdir(directory):
+        if name.endswith(".json"):
+            values = _read(os.path.join(directory, name))
+            if values is not None:
+                snapshots.append(values)
+    return snapshots
+
+
+def _merge_exited(directory, registry):
+    """
+    Add the counters and histograms of processes that exited to the
+    archive file and delete their files; their gauges are dropped.
+    """
+    archive_path = os.path.join(directory, _ARCHIVE)
+    merged = {
+        (name, _key(labels)): value
+        for name, labels, value in _read(archive_path) or []
+    }
+    exited = []
+    for name in os.listdir(directory):
+        pid = name.split("-", 1)[0]
+        if not name.endswith(".json") or not pid.isdigit():
+            continue
+        # A file with this process's pid but not its name was left by an
+        # exited process whose pid was recycled.
+        if name == registry._file or (
+            int(pid) != os.getpid() and _alive(int(pid))
+        ):
+            continue
+        path = os.path.join(directory, name)
+        values = _read(path)
+        if values is None:
+            continue
+        exited.append(path)
+        for metric_name, labels, value in values:
+            metric = registry._metrics.get(metric_name)
+            if metric is not None and metric.type != "gauge":
+                _accumulate(merged, (metric_name, _key(labels)), value)
+    if not exited:
+        return
+    temporary = f"{archive_path}.tmp"
+    with open(temporary, "w") as output:
+        json.dump(
+            [
+                [name, dict(labels), value]
+                for (name, labels), value in merged.items()
+            ],
+            output,
+        )
+    os.replace(temporary, archive_path)
+    for path in exited:
+        os.remove(path)
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds",
+    "Time to serve a request, by view.",
+    ["view", "method"],
+)
+REQUESTS = registry.counter(
+    "http_requests_total",
+    "Requests served, by view and status code.",
+    ["view", "method", "status"],
+)
+DB_QUERIES = registry.histogram(
+    "db_queries_per_request",
+    "Database statements per instrumented request, by view.",
+    ["view"],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+POOL_CONNECTIONS = registry.gauge(
+    "db_pool_connections",
+    "Pooled database connections, by state.",
+    ["alias", "state"],
+)
+POOL_EVENTS = registry.counter(
+    "db_pool_events_total",
+    "Connection pool events: created, reused, discarded, waits, timeouts.",
+    ["alias", "event"],
+)
+POOL_WAIT_SECONDS = registry.counter(
+    "db_pool_wait_seconds_total",
+    "Seconds spent waiting for a pooled database connection.",
+    ["alias"],
+)
+PRODUCT_CACHE = registry.counter(
+    "product_cache_lookups_total",
+    "Product cache lookups, by the tier that answered.",
+    ["result"],
+)
+PAGE_CACHE = registry.counter(
+    "page_cache_requests_total",
+    "Shared page cache lookups: hit, miss, or bypassed when not eligible.",
+    ["result"],
+)
+
+
+@registry.collector
+def _pool_metrics():
+    from .pool import all_stats
+
+    for alias, stats in all_stats().items():
+        for state in ("in_use", "idle"):
+            yield POOL_CONNECTIONS, {"alias": alias, "state": state}, (
+                stats[state]
+            )
+        for event in ("created", "reused", "discarded", "waits", "timeouts"):
+            yield POOL_EVENTS, {"alias": alias, "event": event}, stats[event]
+        yield POOL_WAIT_SECONDS, {"alias": alias}, stats["wait_time"]
+
+
+@registry.collector
+def _cache_metrics():
+    # Imported here: the product cache needs the app registry.
+    from products.cache import product_cache
+
+    from . import pagecache
+
+    stats = product_cache.stats()
+    for result in ("local_hits", "shared_hits", "stale_hits", "misses"):
+        yield PRODUCT_CACHE, {"result": result}, stats[result]
+    stats = pagecache.stats()
+    for result in ("hits", "misses", "bypassed"):
+        yield PAGE_CACHE, {"result": result}, stats[result]
+
+
+def allowed(request):
+    """
+    Return whether a request may read the metrics: staff users, the
+    addresses in settings.METRICS_ALLOWED_IPS, and scrapers sending
+    "Authorization: Bearer <settings.METRICS_TOKEN>".
+    """
+    token = setting("METRICS_TOKEN")
+    header = request.headers.get("Authorization", "")
+    if token and hmac.compare_digest(header, f"Bearer {token}"):
+        return True
+    # REMOTE_ADDR is the proxy's address behind a reverse proxy, so the
+    # allowlist is empty unless the project sets it.
+    if request.META.get("REMOTE_ADDR") in setting("METRICS_ALLOWED_IPS"):
+        return True
+    user = getattr(request, "user", None)
+    return user is not None and user.is_staff
+
+
+class MetricsMiddleware:
+    """
+    Count requests and their latency by resolved view (e.g.
+    "orders.views.checkout"), and the database statements of the requests
+    SQLInstrumentationMiddleware instruments. List it just above that
+    middleware. Unresolved URLs are counted as the "unresolved" view.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+        view = getattr(request, "view_name", "unresolved")
+        method = request.method if request.method in METHODS else "other"
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - started, view=view, method=method
+        )
+        REQUESTS.inc(view=view, method=method, status=response.status_code)
+        metrics = getattr(request, "metrics", None)
+        if metrics is not None:
+            DB_QUERIES.observe(metrics.queries, view=view)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        resolve_view_name(request, view_func)
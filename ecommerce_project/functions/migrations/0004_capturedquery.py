@@ -0,0 +1,38 @@
+# Generated by Django 5.1.7 on 2026-10-19 04:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("functions", "0003_task"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CapturedQuery",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("digest", models.CharField(max_length=64, unique=True)),
+                ("fingerprint", models.TextField()),
+                ("sql", models.TextField()),
+                ("params", models.JSONField(blank=True, default=list)),
+                ("database", models.CharField(default="default", max_length=100)),
+                ("view_name", models.CharField(blank=True, max_length=255)),
+                ("plan", models.JSONField(blank=True, default=list)),
+                ("count", models.PositiveIntegerField(default=0)),
+                ("max_ms", models.FloatField(default=0)),
+                ("first_seen", models.DateTimeField(auto_now_add=True)),
+                ("last_seen", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.7 on 2026-10-19 05:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("functions", "0004_capturedquery"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MemorySample",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("release", models.CharField(blank=True, max_length=100)),
+                ("view_name", models.CharField(max_length=255)),
+                ("method", models.CharField(max_length=10)),
+                ("path", models.CharField(max_length=2000)),
+                ("status", models.PositiveSmallIntegerField()),
+                ("peak_kb", models.FloatField()),
+                ("retained_kb", models.FloatField()),
+                ("top_sites", models.JSONField(blank=True, default=list)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["release", "view_name"],
+                        name="memorysample_release_view_idx",
+                    )
+                ],
+            },
+        ),
+    ]
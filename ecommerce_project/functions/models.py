@@ -0,0 +1,226 @@
+from django.db import models
+
+
+class OutboxEntry(models.Model):
+    """
+    Abstract base for rows waiting to be delivered by a background worker.
+
+    Views write an outbox row inside their own database transaction instead
+    of calling an external service, so a slow or unavailable service can
+    never hold up a request. A worker claims due rows (see
+    ``functions.outbox.claim_due``), delivers them, and reschedules failures
+    with exponential back-off.
+
+    Attributes:
+        status (CharField): "pending", "sent" or "dead" (gave up after the
+            maximum number of failed attempts).
+        attempts (PositiveIntegerField): Number of delivery attempts so far.
+        next_attempt_at (DateTimeField): Earliest time a worker may try to
+            deliver the row again.
+        last_error (TextField): The error raised by the last failed attempt.
+        created_at (DateTimeField): When the row was queued.
+        sent_at (DateTimeField): When the row was delivered.
+    """
+    PENDING = "pending"
+    SENT = "sent"
+    DEAD = "dead"
+    STATUS_CHOICES = (
+        (PENDING, "Pending"),
+        (SENT, "Sent"),
+        (DEAD, "Dead"),
+    )
+
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=PENDING
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField()
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        abstract = True
+
+
+class OutboxEmail(OutboxEntry):
+    """
+    An outbound email waiting to be delivered by the outbox worker.
+
+    The ``send_outbox_emails`` management command drains the table.
+
+    Attributes:
+        subject (CharField): The subject line of the email.
+        body (TextField): The rendered body of the email.
+        content_subtype (CharField): "plain" or "html"; passed to
+            EmailMessage.content_subtype when the email is sent.
+        from_email (CharField): The sender address. Blank means
+            settings.DEFAULT_FROM_EMAIL.
+        to (JSONField): The list of recipient addresses.
+    """
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    content_subtype = models.CharField(max_length=10, default="plain")
+    from_email = models.CharField(max_length=255, blank=True)
+    to = models.JSONField(default=list)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["status", "next_attempt_at"],
+                name="outbox_email_due_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)} ({self.status})"
+
+
+class OutboxTweet(OutboxEntry):
+    """
+    A social post waiting to be published by the tweet worker.
+
+    The ``publish_tweets`` management command drains the table, so creating
+    a store or product never waits on the Twitter API.
+
+    Attributes:
+        text (TextField): The text of the post.
+        tweet_id (CharField): The id Twitter assigned to the published post.
+    """
+    text = models.TextField()
+    tweet_id = models.CharField(max_length=64, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["status", "next_attempt_at"],
+                name="outbox_tweet_due_idx",
+            ),
+            # Used by the rate limiter to count recent posts.
+            models.Index(fields=["sent_at"], name="outbox_tweet_sent_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.text[:40]} ({self.status})"
+
+
+class Task(OutboxEntry):
+    """
+    A unit of background work for the task queue (see functions.taskqueue).
+
+    Tasks are claimed highest priority first, then oldest due first, by the
+    workers started with ``python manage.py runworkers``. A periodic task
+    (``repeat_seconds`` set) goes back to "pending" after each run instead
+    of being marked "sent".
+
+    Attributes:
+        name (CharField): The registered name of the task function.
+        args (JSONField): Positional arguments for the task function.
+        kwargs (JSONField): Keyword arguments for the task function.
+        priority (SmallIntegerField): Higher values run first. Defaults to 0.
+        repeat_seconds (PositiveIntegerField): Interval for periodic tasks;
+            None for one-off tasks.
+        key (CharField): Optional unique key, used to keep a single row per
+            periodic schedule.
+    """
+    name = models.CharField(max_length=255)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    priority = models.SmallIntegerField(default=0)
+    repeat_seconds = models.PositiveIntegerField(blank=True, null=True)
+    key = models.CharField(max_length=255, blank=True, null=True, unique=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["status", "-priority", "next_attempt_at"],
+                name="task_due_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+class CapturedQuery(models.Model):
+    """
+    A slow statement and its query plan, captured by the SQL
+    instrumentation middleware (see functions.queryplans).
+
+    One row per statement fingerprint and database. The
+    ``query_plans`` management command re-explains the rows against the
+    current schema and compares the plans with a saved baseline.
+
+    Attributes:
+        digest (CharField): SHA-256 of the database alias and fingerprint.
+        fingerprint (TextField): The normalized statement.
+        sql (TextField): One slow execution's statement, with placeholders.
+        params (JSONField): Its parameters, to explain it again; strings
+            are redacted on settings.QUERY_PLAN_REDACTED_TABLES.
+        database (CharField): The database alias it ran on.
+        view_name (CharField): The view that last ran it slowly.
+        plan (JSONField): The plan, as a list of lines.
+        count (PositiveIntegerField): Slow executions seen.
+        max_ms (FloatField): The slowest execution, in milliseconds.
+        first_seen (DateTimeField): When it was first captured.
+        last_seen (DateTimeField): When it was last slow.
+    """
+    digest = models.CharField(max_length=64, unique=True)
+    fingerprint = models.TextField()
+    sql = models.TextField()
+    params = models.JSONField(default=list, blank=True)
+    database = models.CharField(max_length=100, default="default")
+    view_name = models.CharField(max_length=255, blank=True)
+    plan = models.JSONField(default=list, blank=True)
+    count = models.PositiveIntegerField(default=0)
+    max_ms = models.FloatField(default=0)
+    first_seen = models.DateTimeField(auto_now_add=True)
+    last_seen = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.fingerprint[:60]} ({self.max_ms:.0f} ms)"
+
+
+class MemorySample(models.Model):
+    """
+    The memory one sampled request allocated, recorded by the memory
+    profiling middleware (see functions.memprofile).
+
+    The ``compare_memory`` management command summarizes the samples per
+    view and release, and compares releases.
+
+    Attributes:
+        release (CharField): settings.RELEASE when it was taken, e.g. the
+            deployed commit.
+        view_name (CharField): The view, e.g. "products.api_views.list".
+        method (CharField): The HTTP method.
+        path (CharField): The path and query string.
+        status (PositiveSmallIntegerField): The response status code.
+        peak_kb (FloatField): The most memory traced during the request.
+        retained_kb (FloatField): Memory allocated during the request and
+            still held when the response left the view (including the
+            response itself).
+        top_sites (JSONField): The lines that allocated most of it, as
+            {"site", "kb", "blocks"} dicts.
+        created_at (DateTimeField): When it was taken.
+    """
+    release = models.CharField(max_length=100, blank=True)
+    view_name = models.CharField(max_length=255)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=2000)
+    status = models.PositiveSmallIntegerField()
+    peak_kb = models.FloatField()
+    retained_kb = models.FloatField()
+    top_sites = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["release", "view_name"],
+                name="memorysample_release_view_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.view_name} ({self.peak_kb:.0f} KiB peak)"
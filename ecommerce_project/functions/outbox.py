@@ -0,0 +1,138 @@
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .metrics import registry
+
+DELIVERY_SECONDS = registry.histogram(
+    "outbox_delivery_seconds",
+    "Time to send one outbound message, by channel (email or tweet).",
+    ["channel"],
+)
+DELIVERIES = registry.counter(
+    "outbox_deliveries_total",
+    "Outbound messages by channel and result: sent, retried or dead.",
+    ["channel", "result"],
+)
+
+
+def retry_delay(attempts, base, cap):
+    """
+    Return the exponential back-off delay to wait after a failed attempt.
+
+    Args:
+        attempts (int): The number of attempts made so far (1 or more).
+        base (int): The delay in seconds after the first failure.
+        cap (int): The maximum delay in seconds.
+
+    Returns:
+        timedelta: ``base`` doubled for every earlier attempt, capped at
+        ``cap``.
+    """
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), cap))
+
+
+def claim_due(model, batch_size, lease, order_by=("next_attempt_at", "id")):
+    """
+    Lease a batch of due outbox rows to the calling worker.
+
+    Claimed rows get their attempt counter bumped and ``next_attempt_at``
+    pushed forward by ``lease`` seconds, so other workers skip them while
+    they are being delivered. If the worker dies mid-batch the lease simply
+    expires and the rows are picked up again.
+
+    On databases that support it (MySQL 8, PostgreSQL) the rows are selected
+    with ``SELECT ... FOR UPDATE SKIP LOCKED`` so concurrent workers never
+    wait on each other. SQLite has no row locks, so each row is claimed with
+    a conditional UPDATE and rows another worker got to first are dropped.
+
+    Args:
+        model (type[OutboxEntry]): The outbox model to claim rows from.
+        batch_size (int): The maximum number of rows to claim.
+        lease (int): Seconds the worker may hold the claimed rows.
+        order_by (tuple[str], optional): The claim order. Defaults to
+            oldest due first.
+
+    Returns:
+        list[OutboxEntry]: The claimed rows, in ``order_by`` order.
+    """
+    now = timezone.now()
+    lease_until = now + timedelta(seconds=lease)
+    due = model.objects.filter(
+        status=model.PENDING, next_attempt_at__lte=now
+    ).order_by(*order_by)
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            rows = list(due.select_for_update(skip_locked=True)[:batch_size])
+            for row in rows:
+                row.attempts += 1
+                row.next_attempt_at = lease_until
+            model.objects.bulk_update(rows, ["attempts", "next_attempt_at"])
+        return rows
+
+    rows = []
+    for row in due[:batch_size]:
+        claimed = model.objects.filter(
+            pk=row.pk,
+            status=model.PENDING,
+            next_attempt_at=row.next_attempt_at,
+        ).update(attempts=row.attempts + 1, next_attempt_at=lease_until)
+        if claimed:
+            row.attempts += 1
+            row.next_attempt_at = lease_until
+            rows.append(row)
+    return rows
+
+
+def record_failure(row, error, max_attempts, base, cap):
+    """
+    Reschedule a row after a failed delivery, or dead-letter it.
+
+    Args:
+        row (OutboxEntry): The row that failed to deliver.
+        error (Exception | str): The failure, stored in ``last_error``.
+        max_attempts (int): Attempts allowed before the row is marked dead.
+        base (int): Back-off delay in seconds after the first failure.
+        cap (int): Maximum back-off delay in seconds.
+
+    Returns:
+        bool: True if the row was marked dead, False if it will be retried.
+    """
+    if isinstance(error, Exception):
+        error = f"{type(error).__name__}: {error}"
+    row.last_error = error
+    dead = row.attempts >= max_attempts
+    if dead:
+        row.status = row.DEAD
+    else:
+        row.next_attempt_at = timezone.now() + retry_delay(
+            row.attempts, base, cap
+        )
+    row.save(update_fields=["status", "next_attempt_at", "last_error"])
+    return dead
+
+
+def record_success(row, *fields):
+    """
+    Mark a row as delivered.
+
+    Args:
+        row (OutboxEntry): The delivered row.
+        *fields (str): Extra fields set by the caller that should be saved
+            along with the status.
+    """
+    row.status = row.SENT
+    row.sent_at = timezone.now()
+    row.last_error = ""
+    row.save(update_fields=["status", "sent_at", "last_error", *fields])
+
+
+def count_results(channel, result):
+    """
+    Add a batch's "sent", "retried" and "dead" counts to the metrics.
+    """
+    for outcome, count in result.items():
+        if count:
+            DELIVERIES.inc(count, channel=channel, result=outcome)
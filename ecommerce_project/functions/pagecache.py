@@ -0,0 +1,173 @@
+import hashlib
+import threading
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+from .conf import setting
+from .versions import get_versions
+
+# Set for logged-in users; tells base.html to load the per-user fragments
+# into shared pages. Read by JavaScript, so not HttpOnly.
+SIGNED_IN_COOKIE = "signed_in"
+
+_lock = threading.Lock()
+_counters = {"hits": 0, "misses": 0, "stored": 0, "bypassed": 0}
+
+
+def _count(name):
+    with _lock:
+        _counters[name] += 1
+
+
+def tag_page(request, *namespaces):
+    """
+    Record the version namespaces (see functions.versions) the page being
+    rendered depends on, e.g. "product:42" or "store:3".
+
+    Bumping any of them purges the cached page, and they are sent to an
+    upstream proxy in the Surrogate-Key header. Their versions are read
+    now, so call this before reading the data they cover: a change made
+    while the page renders then purges it too. Does nothing when the page
+    will not be cached.
+
+    Args:
+        request (HttpRequest): The request being served.
+        *namespaces (str): The namespaces.
+    """
+    versions = getattr(request, "_page_versions", None)
+    if versions is None:
+        return
+    new = [name for name in namespaces if name not in versions]
+    if new:
+        versions.update(get_versions(new))
+
+
+def _cacheable_request(request):
+    """
+    Only GET and HEAD requests with no pending flash messages share pages.
+    """
+    if request.method not in ("GET", "HEAD"):
+        return False
+    return not len(get_messages(request))
+
+
+def _cacheable_response(response):
+    """
+    Only plain 200 responses that set no cookies are shared.
+    """
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and "private" not in response.get("Cache-Control", "")
+    )
+
+
+def _page_key(request):
+    url = request.build_absolute_uri()
+    return "page:" + hashlib.sha256(url.encode()).hexdigest()
+
+
+def _mark_public(response, tags):
+    """
+    Let browsers and shared proxies reuse a shared page briefly, keyed by
+    cookie so they never mix up pages rendered for different users.
+    """
+    patch_cache_control(
+        response, public=True, max_age=setting("PAGE_CACHE_MAX_AGE")
+    )
+    patch_vary_headers(response, ["Cookie"])
+    if tags:
+        response["Surrogate-Key"] = " ".join(tags)
+
+
+def cache_shared_page(view_func):
+    """
+    Serve GETs of a view from the shared Django cache, to every user.
+
+    Shared pages are rendered as for a visitor who is not logged in: the
+    per-user parts of the templates (the ``data-fragment`` elements) come
+    out empty, and base.html loads them for logged-in users from
+    accounts:fragments. So logged-in browsing hits the same cache entries
+    as anonymous traffic. The view must not depend on ``request.user``.
+
+    The view calls ``tag_page`` with the namespaces the page depends on.
+    A cached page is served only while all their versions are unchanged,
+    so bumping one namespace purges exactly the pages tagged with it.
+
+    Requests with pending messages, and a logged-in user's requests until
+    the SIGNED_IN_COOKIE is set, are rendered in full. Responses that set
+    cookies are never stored.
+    """
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        if not _cacheable_request(request):
+            _count("bypassed")
+            return view_func(request, *args, **kwargs)
+        user = request.user
+        if user.is_authenticated and SIGNED_IN_COOKIE not in request.COOKIES:
+            # Without the cookie base.html would not load the fragments.
+            _count("bypassed")
+            response = view_func(request, *args, **kwargs)
+            response.set_cookie(
+                SIGNED_IN_COOKIE,
+                "1",
+                max_age=settings.SESSION_COOKIE_AGE,
+                samesite="Lax",
+            )
+            return response
+
+        key = _page_key(request)
+        entry = cache.get(key)
+        if entry is not None:
+            if get_versions(entry["versions"]) == entry["versions"]:
+                _count("hits")
+                response = HttpResponse(
+                    entry["content"], content_type=entry["content_type"]
+                )
+                response["X-Page-Cache"] = "hit"
+                _mark_public(response, list(entry["versions"]))
+                return response
+
+        _count("misses")
+        versions = request._page_versions = {}
+        request.user = AnonymousUser()
+        try:
+            response = view_func(request, *args, **kwargs)
+        finally:
+            request.user = user
+        if not _cacheable_response(response):
+            return response
+        cache.set(
+            key,
+            {
+                "content": response.content,
+                "content_type": response["Content-Type"],
+                "versions": versions,
+            },
+            setting("PAGE_CACHE_TIMEOUT"),
+        )
+        _count("stored")
+        response["X-Page-Cache"] = "miss"
+        _mark_public(response, list(versions))
+        return response
+
+    return _wrapped_view
+
+
+def stats():
+    """
+    Return this process's page cache counters: "hits", "misses", "stored"
+    and "bypassed" (requests that were not eligible), plus "hit_ratio".
+    """
+    with _lock:
+        result = dict(_counters)
+    lookups = result["hits"] + result["misses"]
+    result["hit_ratio"] = result["hits"] / lookups if lookups else 0
+    return result
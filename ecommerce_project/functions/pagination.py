@@ -0,0 +1,97 @@
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class KeysetPage:
+    """
+    One page of a keyset-paginated queryset.
+
+    Attributes:
+        items (list): The objects on this page.
+        next_cursor (str | None): Opaque cursor for the following page, or
+            None on the last page.
+    """
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def encode_cursor(created_at, pk):
+    """
+    Encode the sort key of the last row on a page as an opaque cursor.
+    """
+    raw = json.dumps([created_at.isoformat(), pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor made by encode_cursor.
+
+    Returns:
+        tuple[datetime, int] | None: The sort key, or None when the cursor is
+        missing or malformed (which restarts from the first page).
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, pk = json.loads(raw)
+        created_at = parse_datetime(created_at)
+        pk = int(pk)
+    except (ValueError, TypeError):
+        return None
+    if created_at is None:
+        return None
+    return created_at, pk
+
+
+def keyset_page(queryset, cursor=None, page_size=20, field="created_at"):
+    """
+    Return one page of ``queryset``, newest first, using keyset pagination.
+
+    Instead of OFFSET (which reads and discards every earlier row, so deep
+    pages get slower and slower) each page continues strictly after the
+    (``field``, id) of the previous page's last row. With an index ending
+    in (``field``, id) every page is a short index range scan, however far
+    back the buyer or vendor pages.
+
+    Args:
+        queryset (QuerySet): The rows to paginate, already filtered.
+        cursor (str, optional): The ``next_cursor`` of the previous page.
+        page_size (int, optional): Rows per page. Defaults to 20.
+        field (str, optional): The datetime field to sort on. Defaults to
+            "created_at".
+
+    Returns:
+        KeysetPage: The page of rows and the cursor for the next one.
+    """
+    queryset = queryset.order_by(f"-{field}", "-id")
+    position = decode_cursor(cursor)
+    if position is not None:
+        created_at, pk = position
+        queryset = queryset.filter(
+            Q(**{f"{field}__lt": created_at})
+            | Q(**{field: created_at, "id__lt": pk})
+        )
+    # One extra row tells us whether a next page exists.
+    items = list(queryset[: page_size + 1])
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, field), last.pk)
+    return KeysetPage(items, next_cursor)
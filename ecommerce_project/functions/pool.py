@@ -0,0 +1,276 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Process-wide pools, one per database alias (see get_pool).
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PoolTimeout(Exception):
+    """
+    Raised when no pooled connection became free within the pool's timeout.
+    """
+
+
+class ConnectionPool:
+    """
+    A bounded, thread-safe pool of DB-API connections.
+
+    At most ``max_size`` connections are open at once. A caller that finds
+    them all in use waits up to ``timeout`` seconds for one to be released
+    and then gets PoolTimeout, so a traffic spike queues briefly instead of
+    opening more connections than the database allows.
+
+    Idle connections are health-checked with ``ping`` before being handed
+    out ("pre-ping"), and replaced when older than ``max_lifetime``, so a
+    connection dropped by the server or a proxy never reaches a request.
+
+    The pool only uses a lock and a condition variable, so it is safe under
+    WSGI worker threads and under ASGI, where Django runs database calls in
+    its sync worker threads. Connections inherited through fork() are
+    forgotten, never closed, so a forked worker can not close its parent's
+    sockets.
+
+    Args:
+        connect (callable): Opens and returns a new connection.
+        max_size (int, optional): The most connections open at once.
+            Defaults to 10.
+        timeout (float, optional): Seconds to wait for a free connection.
+            Defaults to 5.
+        ping (callable, optional): Raises if the connection it is given is
+            dead. Defaults to calling ``conn.ping()``.
+        reset (callable, optional): Called on every released connection,
+            e.g. to roll back an unfinished transaction; if it raises the
+            connection is discarded.
+        max_lifetime (float, optional): Seconds after which an idle
+            connection is replaced. None (the default) keeps connections
+            forever.
+    """
+    def __init__(
+        self,
+        connect,
+        max_size=10,
+        timeout=5.0,
+        ping=None,
+        reset=None,
+        max_lifetime=None,
+    ):
+        self.connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.ping = ping or (lambda conn: conn.ping())
+        self.reset = reset
+        self.max_lifetime = max_lifetime
+        self._lock = threading.Condition()
+        self._idle = deque()
+        self._in_use = {}
+        self._connecting = 0
+        self._pid = os.getpid()
+        self._counters = {
+            "created": 0,
+            "reused": 0,
+            "discarded": 0,
+            "waits": 0,
+            "wait_time": 0.0,
+            "timeouts": 0,
+        }
+
+    def _check_fork(self):
+        """
+        Forget connections inherited from a parent process.
+        """
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._idle.clear()
+            self._in_use.clear()
+            self._connecting = 0
+
+    def _discard(self, conn):
+        """
+        Close a connection that will not be reused.
+        """
+        self._counters["discarded"] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def acquire(self):
+        """
+        Return a healthy connection, opening one if the pool has room.
+
+        Raises:
+            PoolTimeout: If every connection stayed in use for ``timeout``
+                seconds.
+        """
+        started = None
+        with self._lock:
+            self._check_fork()
+            while True:
+                conn = self._take_idle()
+                if conn is not None:
+                    self._record_wait(started)
+                    return conn
+                if len(self._in_use) + self._connecting < self.max_size:
+                    break
+                now = time.monotonic()
+                if started is None:
+                    started = now
+                    self._counters["waits"] += 1
+                remaining = started + self.timeout - now
+                if remaining <= 0:
+                    self._record_wait(started)
+                    self._counters["timeouts"] += 1
+                    logger.warning(
+                        "Database pool exhausted: %s", self._summary()
+                    )
+                    raise PoolTimeout(
+                        f"No database connection free after {self.timeout}s "
+                        f"(pool size {self.max_size})."
+                    )
+                self._lock.wait(remaining)
+            self._record_wait(started)
+            # Hold the slot while connecting outside the lock.
+            self._connecting += 1
+        try:
+            conn = self.connect()
+        finally:
+            with self._lock:
+                self._connecting -= 1
+                self._lock.notify()
+        with self._lock:
+            self._in_use[id(conn)] = time.monotonic()
+            self._counters["created"] += 1
+        return conn
+
+    def _take_idle(self):
+        """
+        Pop the most recently used idle connection that passes the health
+        checks, discarding any that fail. Called with the lock held.
+        """
+        while self._idle:
+            conn, opened_at = self._idle.pop()
+            if (
+                self.max_lifetime is not None
+                and time.monotonic() - opened_at > self.max_lifetime
+            ):
+                self._discard(conn)
+                continue
+            try:
+                self.ping(conn)
+            except Exception:
+                logger.info("Discarding a dead pooled connection.")
+                self._discard(conn)
+                continue
+            self._counters["reused"] += 1
+            self._in_use[id(conn)] = opened_at
+            return conn
+        return None
+
+    def _record_wait(self, started):
+        """
+        Add the time since ``started`` (if the caller waited) to the wait
+        time counter. Called with the lock held.
+        """
+        if started is not None:
+            self._counters["wait_time"] += time.monotonic() - started
+
+    def release(self, conn, discard=False):
+        """
+        Return a connection to the pool.
+
+        Args:
+            conn: A connection obtained from ``acquire``.
+            discard (bool, optional): Close it instead of keeping it, e.g.
+                after an error that left it unusable.
+        """
+        if not discard and self.reset is not None:
+            try:
+                self.reset(conn)
+            except Exception:
+                discard = True
+        with self._lock:
+            self._check_fork()
+            opened_at = self._in_use.pop(id(conn), None)
+            if opened_at is None:
+                # Already released, or inherited through fork(): closing it
+                # would break a connection someone else owns.
+                return
+            if discard:
+                self._discard(conn)
+            else:
+                self._idle.append((conn, opened_at))
+            self._lock.notify()
+
+    def close_all(self):
+        """
+        Close every idle connection. Connections in use are closed when
+        they are released.
+        """
+        with self._lock:
+            self._check_fork()
+            while self._idle:
+                self._discard(self._idle.pop()[0])
+
+    def _summary(self):
+        """
+        Describe the pool's gauges for log messages. Called with the lock
+        held.
+        """
+        return (
+            f"{len(self._in_use) + self._connecting}/{self.max_size} in use, "
+            f"{self._counters['waits']} waits, "
+            f"{self._counters['timeouts']} timeouts"
+        )
+
+    def stats(self):
+        """
+        Return the pool's gauges and counters.
+
+        Returns:
+            dict: "max_size", "in_use", "idle", and the running totals
+            "created", "reused", "discarded" (dead, expired or broken
+            connections), "waits" (acquires that had to wait), "wait_time"
+            (seconds spent waiting) and "timeouts".
+        """
+        with self._lock:
+            self._check_fork()
+            return {
+                "max_size": self.max_size,
+                "in_use": len(self._in_use) + self._connecting,
+                "idle": len(self._idle),
+                **self._counters,
+            }
+
+
+def get_pool(alias, connect, **options):
+    """
+    Return the process-wide pool of a database alias, creating it on first
+    use. ``connect`` and ``options`` are ignored once the pool exists.
+
+    Args:
+        alias (str): The database alias.
+        connect (callable): Opens a new connection for the pool.
+        **options: Keyword arguments for ConnectionPool.
+
+    Returns:
+        ConnectionPool: The alias's pool.
+    """
+    with _pools_lock:
+        if alias not in _pools:
+            _pools[alias] = ConnectionPool(connect, **options)
+        return _pools[alias]
+
+
+def all_stats():
+    """
+    Return {alias: stats} for every pool in this process.
+    """
+    with _pools_lock:
+        pools = dict(_pools)
+    return {alias: pool.stats() for alias, pool in pools.items()}
@@ -0,0 +1,274 @@
+import cProfile
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core import signing
+
+from .conf import setting
+from .instrumentation import resolve_view_name
+
+# Signed tokens carry this salt, so no other signed value can be replayed
+# as one.
+SALT = "functions.profiling"
+
+MODES = ("cprofile", "sample")
+
+_ID = re.compile(r"^\d{8}-\d{6}-[0-9a-f]{8}$")
+
+# cProfile allows one active profiler per process (Python 3.12+), and a
+# profiled request is slower, so requests are profiled one at a time.
+_slot = threading.Lock()
+
+
+def profile_dir():
+    directory = setting("PROFILE_DIR")
+    if directory is None:
+        directory = os.path.join(settings.BASE_DIR, "profiles")
+    return str(directory)
+
+
+def make_token(mode="cprofile", path=None):
+    """
+    Return a signed value for the X-Profile header.
+
+    Args:
+        mode (str, optional): "cprofile" for a deterministic profile, or
+            "sample" for the sampling profiler.
+        path (str, optional): Only profile requests whose path starts with
+            this.
+
+    Returns:
+        str: The token; it expires after settings.PROFILE_TOKEN_MAX_AGE
+        seconds.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown profiling mode {mode!r}.")
+    return signing.dumps({"mode": mode, "path": path}, salt=SALT)
+
+
+def requested_mode(request):
+    """
+    Return the profiling mode a request asks for, or None.
+
+    Staff users ask with "?profile=1" (or "?profile=sample"); anyone else,
+    e.g. a script calling the API, needs a valid X-Profile header made by
+    ``make_token``. Anything else is ignored, and the request is served
+    normally.
+    """
+    token = request.headers.get("X-Profile")
+    if token:
+        try:
+            data = signing.loads(
+                token,
+                salt=SALT,
+                max_age=setting("PROFILE_TOKEN_MAX_AGE"),
+            )
+        except signing.BadSignature:
+            return None
+        if data.get("path") and not request.path.startswith(data["path"]):
+            return None
+        return data.get("mode") if data.get("mode") in MODES else None
+
+    value = request.GET.get("profile")
+    user = getattr(request, "user", None)
+    if value is None or user is None or not user.is_staff:
+        return None
+    return "sample" if value == "sample" else "cprofile"
+
+
+class StackSampler:
+    """
+    A sampling profiler for one thread.
+
+    A background thread reads the profiled thread's stack every
+    ``interval`` seconds and counts each distinct stack. The profiled code
+    runs at full speed; only the sampling thread costs anything, so it is
+    safe on a live worker.
+
+    The result is in the "collapsed stacks" format read by flamegraph.pl
+    and speedscope: one "outer;...;inner count" line per stack.
+    """
+    def __init__(self, thread_id=None, interval=0.005):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                module = frame.f_globals.get("__name__", "?")
+                names.append(f"{module}:{code.co_name}")
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+
+    def collapsed(self):
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self.stacks.most_common()
+        )
+
+
+def _save(meta, write):
+    """
+    Store a profile and its metadata, then drop the oldest profiles
+    beyond settings.PROFILE_KEEP.
+    """
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, meta["file"])
+    write(path)
+    with open(os.path.join(directory, f"{meta['id']}.json"), "w") as output:
+        json.dump(meta, output)
+    for old in list_profiles()[setting("PROFILE_KEEP"):]:
+        for name in (old["file"], f"{old['id']}.json"):
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles():
+    """
+    Return the metadata of the stored profiles, newest first.
+
+    Returns:
+        list[dict]: "id", "mode", "file", "method", "path", "view_name",
+        "user", "status", "ms" and "created" (a Unix timestamp).
+    """
+    directory = profile_dir()
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for name in names:
+        profile_id, extension = os.path.splitext(name)
+        if extension != ".json" or not _ID.match(profile_id):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as source:
+                profiles.append(json.load(source))
+        except (OSError, ValueError):
+            # Being pruned or written by another worker.
+            continue
+    return sorted(profiles, key=lambda meta: meta["id"], reverse=True)
+
+
+def get_profile(profile_id):
+    """
+    Return the metadata and the file path of a stored profile, or None.
+    """
+    if not _ID.match(profile_id):
+        return None
+    directory = profile_dir()
+    try:
+        with open(os.path.join(directory, f"{profile_id}.json")) as source:
+            meta = json.load(source)
+    except (OSError, ValueError):
+        return None
+    return meta, os.path.join(directory, meta["file"])
+
+
+class ProfilingMiddleware:
+    """
+    Profile individual requests on demand.
+
+    A request is profiled when a staff user adds "?profile=1" (cProfile)
+    or "?profile=sample" (the sampling profiler) to its URL, or when it
+    carries an X-Profile header signed with ``make_token`` (see the
+    profile_token command), e.g. to profile an API call. The profile is
+    stored under settings.PROFILE_DIR, as a pstats file or as collapsed
+    stacks, and listed at ops/profiles/ for staff. The response's
+    X-Profile-Id header names it.
+
+    Other requests only pay for the header and query string checks. One
+    request is profiled at a time per process; others asking meanwhile
+    are served normally, with "X-Profile-Id: busy". List it after
+    AuthenticationMiddleware, which sets the user it checks.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not setting("PROFILING_ENABLED"):
+            return self.get_response(request)
+        mode = requested_mode(request)
+        if mode is None:
+            return self.get_response(request)
+        if not _slot.acquire(blocking=False):
+            response = self.get_response(request)
+            response["X-Profile-Id"] = "busy"
+            return response
+        try:
+            return self.profile(request, mode)
+        finally:
+            _slot.release()
+
+    def profile(self, request, mode):
+        profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        started = time.perf_counter()
+        if mode == "cprofile":
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler (e.g. a debugger or coverage) is active.
+                return self.get_response(request)
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            extension, write = ".prof", profiler.dump_stats
+        else:
+            with StackSampler(
+                interval=setting("PROFILE_SAMPLE_INTERVAL")
+            ) as sampler:
+                response = self.get_response(request)
+
+            def write(path):
+                with open(path, "w") as output:
+                    output.write(sampler.collapsed())
+
+            extension = ".collapsed"
+        ms = (time.perf_counter() - started) * 1000
+
+        user = getattr(request, "user", None)
+        meta = {
+            "id": profile_id,
+            "mode": mode,
+            "file": profile_id + extension,
+            "method": request.method,
+            "path": request.get_full_path(),
+            "view_name": getattr(request, "view_name", None),
+            "user": user.get_username() if user is not None else "",
+            "status": response.status_code,
+            "ms": round(ms, 1),
+            "created": time.time(),
+        }
+        _save(meta, write)
+        response["X-Profile-Id"] = profile_id
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        resolve_view_name(request, view_func)
@@ -0,0 +1,223 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+
+from django.db import (
+    DatabaseError,
+    IntegrityError,
+    connections,
+    transaction,
+)
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .conf import setting
+from .instrumentation import fingerprint
+from .models import CapturedQuery
+from .routers import routing
+
+logger = logging.getLogger(__name__)
+
+# Replaces string parameters of statements on the tables in
+# settings.QUERY_PLAN_REDACTED_TABLES (emails, password hashes, session
+# keys), which are never stored.
+REDACTED = "<redacted>"
+
+# digest -> when this process last explained the statement.
+_explained = {}
+_lock = threading.Lock()
+
+_SQLITE_SCAN = re.compile(r"^\s*SCAN (\w+)(?!.*\bUSING\b)")
+_MYSQL_SCAN = re.compile(r"\btable=(\w+) type=ALL\b")
+_POSTGRES_SCAN = re.compile(r"\bSeq Scan on (\w+)")
+_POSTGRES_COSTS = re.compile(r"\s*\((?:cost|actual)=[^)]*\)")
+
+
+def digest(alias, sql_fingerprint):
+    """
+    Return the key of a fingerprint on one database.
+    """
+    return hashlib.sha256(f"{alias}\n{sql_fingerprint}".encode()).hexdigest()
+
+
+def explain(alias, sql, params):
+    """
+    Return the query plan of a statement, as a list of lines.
+
+    Uses EXPLAIN QUERY PLAN on SQLite and EXPLAIN elsewhere. Row estimates
+    and costs are left out, so the plan only changes when the database
+    picks a different access path, not when the data grows.
+
+    Args:
+        alias (str): The database alias.
+        sql (str): The statement, with placeholders.
+        params (list): Its parameters.
+
+    Returns:
+        list[str]: The plan.
+    """
+    connection = connections[alias]
+    vendor = connection.vendor
+    prefix = "EXPLAIN QUERY PLAN " if vendor == "sqlite" else "EXPLAIN "
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql, params)
+        columns = [column[0] for column in cursor.description]
+        rows = cursor.fetchall()
+
+    if vendor == "sqlite":
+        # (id, parent, notused, detail): indent each step under its parent.
+        depth = {0: -1}
+        lines = []
+        for node, parent, _, detail in rows:
+            depth[node] = depth.get(parent, -1) + 1
+            lines.append("  " * depth[node] + detail)
+        return lines
+    if vendor == "mysql":
+        keep = ("select_type", "table", "type", "key", "Extra")
+        return [
+            " ".join(
+                f"{name}={value}"
+                for name, value in zip(columns, row)
+                if name in keep
+            )
+            for row in rows
+        ]
+    return [_POSTGRES_COSTS.sub("", str(row[0])) for row in rows]
+
+
+def full_scans(plan, tables=None):
+    """
+    Return the watched tables that a plan reads in full.
+
+    Args:
+        plan (list[str]): A plan from ``explain``.
+        tables (Iterable[str], optional): The tables to look for. Defaults
+            to settings.QUERY_PLAN_WATCHED_TABLES.
+
+    Returns:
+        list[str]: The fully scanned tables, sorted.
+    """
+    if tables is None:
+        tables = setting("QUERY_PLAN_WATCHED_TABLES")
+    scanned = set()
+    for line in plan:
+        for pattern in (_SQLITE_SCAN, _MYSQL_SCAN, _POSTGRES_SCAN):
+            match = pattern.search(line)
+            if match:
+                scanned.add(match.group(1))
+    return sorted(scanned & set(tables))
+
+
+def _json_params(params):
+    """
+    Return the parameters as JSON-safe values, or None when they cannot
+    be stored.
+    """
+    if params is None:
+        return []
+    if not isinstance(params, (list, tuple)):
+        return None
+    return [
+        value
+        if value is None or isinstance(value, (bool, int, float, str))
+        else str(value)
+        for value in params
+    ]
+
+
+def _redact(sql, params):
+    """
+    Return the parameters to store for a statement: with every string
+    replaced by REDACTED when it reads or writes one of
+    settings.QUERY_PLAN_REDACTED_TABLES.
+
+    Plans depend on the columns compared, not on the values, so a
+    redacted statement can still be explained again.
+    """
+    tables = setting("QUERY_PLAN_REDACTED_TABLES")
+    if not isinstance(params, (list, tuple)) or not any(
+        f'"{table}"' in sql or f"`{table}`" in sql for table in tables
+    ):
+        return params
+    return [REDACTED if isinstance(value, str) else value for value in params]
+
+
+def _explainable(sql):
+    return sql.lstrip().split(None, 1)[0].upper() in ("SELECT", "WITH")
+
+
+def capture(metrics):
+    """
+    Store the plans of a request's slow statements (see
+    ``RequestMetrics.slow``) as CapturedQuery rows.
+
+    A statement is explained at most once per
+    settings.QUERY_PLAN_REFRESH seconds in each process; other slow runs
+    only update its counters. Only SELECT statements are explained.
+    Called by the instrumentation middleware after the response is built,
+    outside the request's routing state, so these writes never pin the
+    user to the primary database.
+
+    Args:
+        metrics (RequestMetrics): The request's metrics.
+    """
+    refresh = setting("QUERY_PLAN_REFRESH")
+    with routing():
+        for alias, sql, params, seconds, many in metrics.slow:
+            if many or not _explainable(sql):
+                continue
+            params = _json_params(_redact(sql, params))
+            if params is None:
+                continue
+            sql_fingerprint = fingerprint(sql)
+            key = digest(alias, sql_fingerprint)
+            ms = seconds * 1000
+            with _lock:
+                recent = time.monotonic() - _explained.get(key, -refresh)
+            if recent < refresh and _record(key, ms, metrics.view_name):
+                continue
+            try:
+                with transaction.atomic(using=alias):
+                    plan = explain(alias, sql, params)
+            except DatabaseError as exc:
+                logger.info("Could not explain %s: %s", sql_fingerprint, exc)
+                continue
+            with _lock:
+                _explained[key] = time.monotonic()
+            updates = {"sql": sql, "params": params, "plan": plan}
+            if _record(key, ms, metrics.view_name, **updates):
+                continue
+            try:
+                with transaction.atomic():
+                    CapturedQuery.objects.create(
+                        digest=key,
+                        fingerprint=sql_fingerprint,
+                        database=alias,
+                        view_name=metrics.view_name,
+                        count=1,
+                        max_ms=ms,
+                        **updates,
+                    )
+            except IntegrityError:
+                # Another process captured it first.
+                _record(key, ms, metrics.view_name, **updates)
+
+
+def _record(key, ms, view_name, **updates):
+    """
+    Count one more slow run of a captured statement; False if it has no
+    row yet.
+    """
+    return bool(
+        CapturedQuery.objects.filter(digest=key).update(
+            count=F("count") + 1,
+            max_ms=Greatest(F("max_ms"), ms),
+            view_name=view_name,
+            # update() bypasses auto_now.
+            last_seen=timezone.now(),
+            **updates,
+        )
+    )
@@ -0,0 +1,194 @@
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.db import connections
+
+from .conf import setting
+
+# Routing state of the current request (None outside requests).
+_state = ContextVar("db_routing_state", default=None)
+
+
+def primary_alias():
+    """
+    Return the alias of the primary (read-write) database.
+    """
+    return setting("DATABASE_PRIMARY")
+
+
+def replica_aliases():
+    """
+    Return the aliases of the read replicas (settings.DATABASE_REPLICAS).
+    """
+    return list(setting("DATABASE_REPLICAS"))
+
+
+class RoutingState:
+    """
+    Per-request routing decisions, held in a context variable.
+
+    Attributes:
+        pinned (bool): Reads go to the primary, because this user wrote
+            recently (the stickiness cookie) or earlier in this request.
+        wrote (bool): This request has written to the primary.
+        mode (str | None): A per-view override, "primary" or "replica".
+    """
+    def __init__(self, pinned=False, mode=None):
+        self.pinned = pinned
+        self.wrote = False
+        self.mode = mode
+
+
+@contextmanager
+def routing(pinned=False, mode=None):
+    """
+    Route the reads made inside the block between primary and replicas.
+
+    The stickiness middleware wraps every request in this. Outside it (in
+    management commands and background workers) every query goes to the
+    primary, so code that was written for a single database keeps seeing
+    its own writes.
+
+    Args:
+        pinned (bool, optional): Start pinned to the primary.
+        mode (str, optional): "primary" or "replica" to override the
+            routing of every read in the block.
+
+    Yields:
+        RoutingState: The state of the block.
+    """
+    state = RoutingState(pinned, mode)
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+def _read_alias():
+    """
+    Pick the database for a read in the current context.
+    """
+    primary = primary_alias()
+    replicas = replica_aliases()
+    state = _state.get()
+    if state is None or not replicas or state.mode == "primary":
+        return primary
+    # Reads inside a transaction on the primary must see its writes.
+    if connections[primary].in_atomic_block:
+        return primary
+    if state.pinned and state.mode != "replica":
+        return primary
+    return random.choice(replicas)
+
+
+class PrimaryReplicaRouter:
+    """
+    Send writes to the primary database and reads to the read replicas.
+
+    Reads stay on the primary when:
+    - there are no replicas (settings.DATABASE_REPLICAS is empty),
+    - the code runs outside a request (see ``routing``),
+    - the primary is inside a transaction,
+    - the user wrote within the last settings.DATABASE_STICKY_SECONDS
+      (read-your-writes; see PrimaryStickinessMiddleware), or
+    - the view is decorated with ``use_primary``.
+
+    Views decorated with ``use_replica`` read from a replica even right
+    after a write, for pages where slightly stale data is fine.
+    """
+    def db_for_read(self, model, **hints):
+        return _read_alias()
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        ignored = setting("DATABASE_STICKY_IGNORE_APPS")
+        if state is not None and model._meta.app_label not in ignored:
+            state.wrote = True
+            state.pinned = True
+        return primary_alias()
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {primary_alias(), *replica_aliases()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive the schema through replication.
+        if db in replica_aliases():
+            return False
+        return None
+
+
+class PrimaryStickinessMiddleware:
+    """
+    Give each request its routing state and keep recent writers on the
+    primary.
+
+    When a request writes to the primary, the response sets a short-lived
+    cookie (settings.DATABASE_STICKY_COOKIE, lasting
+    settings.DATABASE_STICKY_SECONDS). While it is present the user's reads
+    go to the primary too, so they never see a replica that has not caught
+    up with their own order, review or store yet. Session writes are
+    ignored (settings.DATABASE_STICKY_IGNORE_APPS) so browsing with a cart
+    still reads from the replicas.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        cookie = setting("DATABASE_STICKY_COOKIE")
+        pinned = _pinned_until(request.COOKIES.get(cookie)) > time.time()
+        with routing(pinned=pinned) as state:
+            response = self.get_response(request)
+        if state.wrote:
+            seconds = setting("DATABASE_STICKY_SECONDS")
+            response.set_cookie(
+                cookie,
+                str(int(time.time() + seconds)),
+                max_age=seconds,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+
+def _pinned_until(value):
+    """
+    Parse the stickiness cookie (a UNIX time); 0 when missing or invalid.
+    """
+    try:
+        return int(value or 0)
+    except ValueError:
+        return 0
+
+
+def _route_view(mode):
+    """
+    Build a decorator that routes every read of a view as ``mode``.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            state = _state.get()
+            if state is None:
+                return view_func(request, *args, **kwargs)
+            previous, state.mode = state.mode, mode
+            try:
+                return view_func(request, *args, **kwargs)
+            finally:
+                state.mode = previous
+
+        return _wrapped_view
+
+    return decorator
+
+
+# Read everything from the primary, e.g. to check stock before writing.
+use_primary = _route_view("primary")
+# Read from a replica even right after the user wrote something.
+use_replica = _route_view("replica")
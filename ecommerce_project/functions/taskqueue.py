@@ -0,0 +1,258 @@
+import logging
+import os
+import signal
+import time
+from datetime import timedelta
+
+from django.db import close_old_connections, connections
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from .conf import setting
+from .models import Task
+from .outbox import claim_due, record_failure
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+def task(name=None, max_attempts=None):
+    """
+    Register a function as a background task.
+
+    The decorated function is returned unchanged, with an ``enqueue``
+    attribute added so callers can write ``my_task.enqueue(order.id)``.
+    Arguments must be JSON serialisable, so pass ids rather than model
+    instances.
+
+    Args:
+        name (str, optional): The registered name. Defaults to
+            "<app module>.<function name>", e.g. "orders.send_invoice".
+        max_attempts (int, optional): Failed runs before the task is marked
+            dead. Defaults to settings.TASK_MAX_ATTEMPTS.
+
+    Returns:
+        function: The decorator.
+    """
+    def decorator(func):
+        task_name = name or (
+            f"{func.__module__.split('.')[0]}.{func.__name__}"
+        )
+        func.task_name = task_name
+        func.max_attempts = max_attempts
+        func.enqueue = lambda *args, **kwargs: enqueue(
+            task_name, *args, **kwargs
+        )
+        _registry[task_name] = func
+        return func
+
+    return decorator
+
+
+def enqueue(
+    name, *args, priority=0, delay=None, run_at=None, **kwargs
+):
+    """
+    Queue a registered task.
+
+    The row is written on the caller's database connection, so inside
+    ``transaction.atomic()`` the task only exists if the transaction
+    commits.
+
+    Args:
+        name (str | function): The task name or the decorated function.
+        *args: Positional arguments for the task.
+        priority (int, optional): Higher values run first. Defaults to 0.
+        delay (int | timedelta, optional): Run no earlier than this long
+            from now.
+        run_at (datetime, optional): Run no earlier than this time.
+        **kwargs: Keyword arguments for the task.
+
+    Returns:
+        Task: The queued task row.
+    """
+    name = getattr(name, "task_name", name)
+    if run_at is None:
+        run_at = timezone.now()
+        if delay:
+            if not isinstance(delay, timedelta):
+                delay = timedelta(seconds=delay)
+            run_at += delay
+    return Task.objects.create(
+        name=name,
+        args=list(args),
+        kwargs=kwargs,
+        priority=priority,
+        next_attempt_at=run_at,
+    )
+
+
+def schedule_periodic(name, every, priority=0):
+    """
+    Make sure a periodic task is scheduled, without duplicating it.
+
+    Periodic tasks are ordinary task rows that go back to "pending" after
+    each run; a unique key keeps one row per task name however many
+    workers call this at start-up.
+
+    Args:
+        name (str | function): The task name or the decorated function.
+        every (int): Seconds between runs.
+        priority (int, optional): Higher values run first. Defaults to 0.
+
+    Returns:
+        Task: The schedule row.
+    """
+    name = getattr(name, "task_name", name)
+    key = f"periodic:{name}"
+    defaults = {
+        "name": name,
+        "priority": priority,
+        "repeat_seconds": every,
+        "next_attempt_at": timezone.now(),
+    }
+    # get_or_create() recovers from the race where another worker creates
+    # the row first.
+    row, created = Task.objects.get_or_create(key=key, defaults=defaults)
+    if not created and (
+        row.repeat_seconds != every or row.status != Task.PENDING
+    ):
+        row.repeat_seconds = every
+        row.status = Task.PENDING
+        row.save(update_fields=["repeat_seconds", "status"])
+    return row
+
+
+def autodiscover():
+    """
+    Import the ``tasks`` module of every installed app so their tasks are
+    registered, then schedule settings.TASK_QUEUE_PERIODIC.
+    """
+    autodiscover_modules("tasks")
+    for name, every in setting("TASK_QUEUE_PERIODIC").items():
+        schedule_periodic(name, every)
+
+
+def _finish(row):
+    """
+    Mark a successful run: periodic tasks are rescheduled, one-off tasks
+    are marked "sent".
+    """
+    now = timezone.now()
+    row.sent_at = now
+    row.last_error = ""
+    if row.repeat_seconds:
+        row.attempts = 0
+        row.next_attempt_at = now + timedelta(seconds=row.repeat_seconds)
+    else:
+        row.status = Task.SENT
+    row.save(
+        update_fields=[
+            "status", "sent_at", "last_error", "attempts", "next_attempt_at"
+        ]
+    )
+
+
+def run_due(batch_size=None):
+    """
+    Claim and run one batch of due tasks in the current process.
+
+    Args:
+        batch_size (int, optional): The maximum number of tasks to claim.
+            Defaults to settings.TASK_BATCH_SIZE.
+
+    Returns:
+        dict: Counts of "sent", "retried" and "dead" tasks in this batch.
+    """
+    result = {"sent": 0, "retried": 0, "dead": 0}
+    rows = claim_due(
+        Task,
+        batch_size or setting("TASK_BATCH_SIZE"),
+        setting("TASK_LEASE"),
+        order_by=("-priority", "next_attempt_at", "id"),
+    )
+    for row in rows:
+        func = _registry.get(row.name)
+        try:
+            if func is None:
+                raise LookupError(f"No task registered as {row.name!r}.")
+            func(*row.args, **row.kwargs)
+        except Exception as e:
+            max_attempts = (
+                getattr(func, "max_attempts", None)
+                or setting("TASK_MAX_ATTEMPTS")
+            )
+            if record_failure(
+                row,
+                e,
+                max_attempts,
+                setting("TASK_RETRY_DELAY"),
+                setting("TASK_MAX_RETRY_DELAY"),
+            ):
+                logger.error(
+                    "Giving up on task %s: %s", row, row.last_error
+                )
+                result["dead"] += 1
+            else:
+                result["retried"] += 1
+            continue
+        _finish(row)
+        result["sent"] += 1
+    return result
+
+
+def work(stop_event=None, batch_size=None, sleep=1.0, once=False):
+    """
+    Run tasks until stopped.
+
+    This is the loop each ``runworkers`` process runs. It can also be
+    called directly to run a single in-process worker.
+
+    Args:
+        stop_event (multiprocessing.Event, optional): Set to ask the worker
+            to exit after its current batch.
+        batch_size (int, optional): Tasks claimed per batch.
+        sleep (float, optional): Seconds to wait when nothing is due.
+        once (bool, optional): Exit as soon as nothing is due.
+
+    Returns:
+        dict: Totals of "sent", "retried" and "dead" tasks.
+    """
+    totals = {"sent": 0, "retried": 0, "dead": 0}
+    while stop_event is None or not stop_event.is_set():
+        close_old_connections()
+        result = run_due(batch_size)
+        for outcome, count in result.items():
+            totals[outcome] += count
+        if any(result.values()):
+            continue
+        if once:
+            break
+        if stop_event is None:
+            time.sleep(sleep)
+        else:
+            stop_event.wait(sleep)
+    return totals
+
+
+def worker_process(stop_event, batch_size, sleep, once, results):
+    """
+    Entry point of a ``runworkers`` child process.
+
+    Works with both the "fork" and "spawn" start methods: Django is set up
+    if needed and tasks are registered. The parent closes its database
+    connections before starting children, so each child opens its own.
+    """
+    import django
+
+    django.setup()
+    # SIGINT goes to the whole process group; let the parent decide when
+    # to stop so batches are never cut off half way.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    autodiscover_modules("tasks")
+    try:
+        totals = work(stop_event, batch_size, sleep, once)
+        results.put((os.getpid(), totals))
+    finally:
+        connections.close_all()
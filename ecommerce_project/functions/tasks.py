@@ -0,0 +1,31 @@
+from .mail import send_pending
+from .taskqueue import task
+from .tweet import publish_pending
+
+
+@task(name="functions.send_outbox_emails")
+def send_outbox_emails():
+    """
+    Drain the email outbox; scheduled periodically through
+    settings.TASK_QUEUE_PERIODIC.
+    """
+    while any(send_pending().values()):
+        pass
+
+
+@task(name="functions.publish_tweets")
+def publish_tweets():
+    """
+    Publish due tweets; scheduled periodically through
+    settings.TASK_QUEUE_PERIODIC.
+    """
+    while publish_pending()["sent"]:
+        pass
+
+
+@task(name="functions.noop")
+def noop(*args, **kwargs):
+    """
+    Do nothing. Used by ``benchmark_taskqueue`` to measure the queue's own
+    overhead.
+    """
@@ -0,0 +1,247 @@
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+from django.template.base import Node, TextNode, TokenType
+from django.template.defaulttags import ForNode
+
+from .conf import setting
+from .instrumentation import fingerprint
+
+logger = logging.getLogger(__name__)
+
+# The recording in progress, and the template nodes being rendered,
+# outermost first.
+_recording = ContextVar("template_query_recording", default=None)
+_nodes = ContextVar("template_query_nodes", default=())
+
+_render_annotated = Node.render_annotated
+
+
+class Site:
+    """
+    One variable or tag of a template, and what rendering it cost.
+
+    Attributes:
+        template (str): The template's name, e.g. "products/product_list.html".
+        line (int): The line of the variable or tag.
+        source (str): The variable or tag, e.g.
+            "{{ product.store.vendor.username }}".
+        renders (int): How many times it was rendered.
+        seconds (float): Time spent rendering it, including what it
+            contains (the body of a loop, an included template).
+        queries (int): Statements it executed itself.
+        loop_queries (int): The ones executed inside a {% for %} loop:
+            one per iteration, an N+1.
+        statements (list[str]): The first few statements' fingerprints.
+    """
+    def __init__(self, template, line, source):
+        self.template = template
+        self.line = line
+        self.source = source
+        self.renders = 0
+        self.seconds = 0.0
+        self.queries = 0
+        self.loop_queries = 0
+        self.statements = []
+
+    @property
+    def location(self):
+        return f"{self.template}:{self.line}"
+
+    def as_dict(self):
+        return {
+            "template": self.template,
+            "line": self.line,
+            "source": self.source,
+            "renders": self.renders,
+            "ms": round(self.seconds * 1000, 2),
+            "queries": self.queries,
+            "loop_queries": self.loop_queries,
+            "statements": self.statements,
+        }
+
+
+class Recording:
+    """
+    The template sites rendered, and the statements they executed, while
+    recording (see ``record_template_queries``).
+    """
+    def __init__(self):
+        self.sites = {}
+
+    def site(self, node):
+        origin = getattr(node, "origin", None)
+        token = getattr(node, "token", None)
+        template = getattr(origin, "template_name", None) or getattr(
+            origin, "name", "<unknown>"
+        )
+        key = (template, getattr(token, "lineno", 0) or 0, _source(token))
+        site = self.sites.get(key)
+        if site is None:
+            site = self.sites[key] = Site(*key)
+        return site
+
+    def loop_sites(self):
+        """
+        Return the sites that executed statements inside a loop, except
+        the "template:line" locations in settings.TEMPLATE_LOOP_QUERY_ALLOW.
+        """
+        allowed = set(setting("TEMPLATE_LOOP_QUERY_ALLOW"))
+        return sorted(
+            (
+                site
+                for site in self.sites.values()
+                if site.loop_queries and site.location not in allowed
+            ),
+            key=lambda site: -site.loop_queries,
+        )
+
+    def report(self, limit=10):
+        """
+        Return the sites that executed statements, and the slowest ones,
+        as text.
+        """
+        lines = []
+        querying = sorted(
+            (site for site in self.sites.values() if site.queries),
+            key=lambda site: -site.queries,
+        )
+        for site in querying:
+            loop = " in a loop" if site.loop_queries else ""
+            lines.append(
+                f"{site.location} {site.source}: {site.queries} queries"
+                f"{loop}, e.g. {site.statements[0][:120]}"
+            )
+        slowest = sorted(self.sites.values(), key=lambda site: -site.seconds)
+        for site in slowest[:limit]:
+            lines.append(
+                f"{site.location} {site.source}: "
+                f"{site.seconds * 1000:.1f} ms over {site.renders} renders"
+            )
+        return "\n".join(lines)
+
+
+def _source(token):
+    if token is None:
+        return "?"
+    contents = " ".join(token.contents.split())[:80]
+    if token.token_type == TokenType.VAR:
+        return f"{{{{ {contents} }}}}"
+    if token.token_type == TokenType.BLOCK:
+        return f"{{% {contents} %}}"
+    return contents
+
+
+def _recorded_render_annotated(self, context):
+    recording = _recording.get()
+    if recording is None or isinstance(self, TextNode):
+        return _render_annotated(self, context)
+    reset = _nodes.set(_nodes.get() + (self,))
+    started = time.perf_counter()
+    try:
+        return _render_annotated(self, context)
+    finally:
+        seconds = time.perf_counter() - started
+        _nodes.reset(reset)
+        site = recording.site(self)
+        site.renders += 1
+        site.seconds += seconds
+
+
+class _QueryAttributor:
+    """
+    A database execute wrapper charging each statement to the template
+    node being rendered.
+    """
+    def __init__(self, recording):
+        self.recording = recording
+
+    def __call__(self, execute, sql, params, many, context):
+        nodes = _nodes.get()
+        if not nodes or _recording.get() is not self.recording:
+            return execute(sql, params, many, context)
+        site = self.recording.site(nodes[-1])
+        site.queries += 1
+        # A loop's own {% for %} runs its query once; the nodes inside
+        # it run theirs once per item.
+        if any(isinstance(node, ForNode) for node in nodes[:-1]):
+            site.loop_queries += 1
+        if len(site.statements) < 3:
+            site.statements.append(fingerprint(sql))
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def record_template_queries():
+    """
+    Attribute the statements and render time of every template rendered
+    in a ``with`` block, in this thread, to the template line and variable
+    or tag that caused them.
+
+    Rendering each node is timed and statements go through one more
+    execute wrapper, so this is for development and tests only.
+
+    Yields:
+        Recording: Filled in as templates render.
+    """
+    # Patched once; the patch does nothing when no recording is active.
+    Node.render_annotated = _recorded_render_annotated
+    recording = Recording()
+    reset = _recording.set(recording)
+    try:
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(
+                        _QueryAttributor(recording)
+                    )
+                )
+            yield recording
+    finally:
+        _recording.reset(reset)
+
+
+class TemplateQueryMiddleware:
+    """
+    In development, log the statements templates execute inside loops.
+
+    When settings.TEMPLATE_QUERY_DEBUG is on, each request is recorded
+    with ``record_template_queries``: statements executed inside a
+    {% for %} loop are logged as warnings with the template, line and
+    variable that ran them, and the full attribution (statements and
+    render time per template line) is logged at debug level and left on
+    ``request.template_queries``.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # Under TemplateQueryRunner the whole test run is recorded.
+        if (
+            not setting("TEMPLATE_QUERY_DEBUG")
+            or _recording.get() is not None
+        ):
+            return self.get_response(request)
+        with record_template_queries() as recording:
+            response = self.get_response(request)
+            # Templates of lazy responses render here.
+            if hasattr(response, "render") and not response.is_rendered:
+                response.render()
+        request.template_queries = recording
+        for site in recording.loop_sites():
+            logger.warning(
+                "%s queries in a template loop at %s %s on %s: %s",
+                site.loop_queries,
+                site.location,
+                site.source,
+                request.path,
+                site.statements[0],
+            )
+        if recording.sites:
+            logger.debug(
+                "Templates of %s:\n%s", request.path, recording.report()
+            )
+        return response
@@ -0,0 +1,56 @@
+import sys
+
+from django.test.runner import DiscoverRunner
+
+from .templatequeries import record_template_queries
+
+
+class TemplateQueryRunner(DiscoverRunner):
+    """
+    The default test runner, failing the run when a template executes
+    statements inside a {% for %} loop (an N+1 query) in any test.
+
+    Every template the tests render is recorded with
+    functions.templatequeries.record_template_queries. After the tests,
+    the loop queries are listed with the template, line and variable that
+    ran them, and the run fails. Fix them with select_related or
+    prefetch_related in the view, or list an unavoidable one as
+    "template:line" in settings.TEMPLATE_LOOP_QUERY_ALLOW.
+    ``--allow-template-loop-queries`` reports them without failing.
+
+    Only tests run in this process are recorded, so not with
+    ``--parallel``.
+    """
+    def __init__(self, allow_template_loop_queries=False, **kwargs):
+        super().__init__(**kwargs)
+        self.allow_loop_queries = allow_template_loop_queries
+        self.loop_sites = []
+
+    @classmethod
+    def add_arguments(cls, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            "--allow-template-loop-queries",
+            action="store_true",
+            help="Report queries run inside template loops without failing.",
+        )
+
+    def run_suite(self, suite, **kwargs):
+        with record_template_queries() as recording:
+            result = super().run_suite(suite, **kwargs)
+        self.loop_sites = recording.loop_sites()
+        return result
+
+    def suite_result(self, suite, result, **kwargs):
+        failures = super().suite_result(suite, result, **kwargs)
+        if not self.loop_sites:
+            return failures
+        sys.stderr.write("\nQueries run inside template loops:\n")
+        for site in self.loop_sites:
+            sys.stderr.write(
+                f"  {site.location} {site.source}: {site.loop_queries} "
+                f"queries, e.g. {site.statements[0][:120]}\n"
+            )
+        if self.allow_loop_queries:
+            return failures
+        return failures + len(self.loop_sites)
@@ -0,0 +1,1387 @@
+import asyncio
+import json
+import os
+import shutil
+import socketserver
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.mail import get_connection
+from django.core.management import CommandError, call_command
+from django.db import connections, router, transaction
+from django.db.models import Count, F
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import (
+    LiveServerTestCase,
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+from django.urls import reverse
+from django.utils import timezone
+from accounts.models import Profile
+from orders.models import Order, OrderItem
+from orders.purchases import purchased
+from products.models import Product
+from reviews.models import ProductRating, Review
+from store.models import Store
+
+from .benchmark import discover_urls
+from .indexadvisor import advise
+from .instrumentation import fingerprint, resolve_view_name
+from .loadtest import HttpClient, LoadTest
+from .mail import queue_email, send_pending
+from .metrics import Registry, registry
+from .models import (
+    CapturedQuery,
+    MemorySample,
+    OutboxEmail,
+    OutboxTweet,
+    Task,
+)
+from .pool import ConnectionPool, PoolTimeout, _pools, get_pool
+from .profiling import list_profiles, make_token
+from .queryplans import digest, full_scans
+from .routers import PrimaryStickinessMiddleware, routing, use_replica
+from .taskqueue import enqueue, run_due, schedule_periodic, task
+from .templatequeries import record_template_queries
+from .tweet import Tweet, publish_pending, queue_tweet
+from .versions import VersionedLRU, bump, get_versions, sync_all
+
+
+class LocalSMTPServer(socketserver.ThreadingTCPServer):
+    """
+    A minimal SMTP server used as a local stand-in for the real mail server.
+
+    It understands just enough of the protocol for smtplib to deliver
+    messages, and records how many connections were opened and how many
+    messages were accepted.
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), LocalSMTPHandler)
+        self.connections = 0
+        self.messages = []
+        self.lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+class LocalSMTPHandler(socketserver.StreamRequestHandler):
+    """
+    Handle one SMTP session for LocalSMTPServer.
+    """
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        with self.server.lock:
+            self.server.connections += 1
+        self.reply("220 localhost ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip().split(" ", 1)[0].upper()
+            if command in ("EHLO", "HELO"):
+                self.reply("250 localhost")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                for data_line in self.rfile:
+                    if data_line == b".\r\n":
+                        break
+                    data.append(data_line)
+                with self.server.lock:
+                    self.server.messages.append(b"".join(data))
+                self.reply("250 OK")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+class FailingBackend:
+    """
+    An email backend whose every send fails, for exercising retries.
+    """
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        raise ConnectionError("mail server unavailable")
+
+
+class EmailOutboxTestCase(TestCase):
+    """
+    Tests for the transactional email outbox and its background sender.
+
+    Methods:
+        test_batch_uses_one_smtp_connection():
+            Queues a batch of emails, drains it through a local SMTP server,
+            and checks every email was delivered over a single connection.
+            The measured throughput is reported in the assertion message.
+
+        test_failed_email_backs_off_then_dies():
+            Verifies that a failing email is rescheduled with exponential
+            back-off and marked "dead" after the last allowed attempt.
+
+        test_rolled_back_transaction_discards_email():
+            Verifies that an email queued inside a transaction that rolls
+            back is never sent.
+    """
+    def test_batch_uses_one_smtp_connection(self):
+        """
+        Drain 200 queued emails through the local SMTP server.
+        """
+        for i in range(200):
+            queue_email(f"Invoice #{i}", "Thanks!", [f"buyer{i}@example.com"])
+
+        with LocalSMTPServer() as server:
+            connection = get_connection(
+                "django.core.mail.backends.smtp.EmailBackend",
+                host="127.0.0.1",
+                port=server.port,
+                username="",
+                password="",
+                use_tls=False,
+            )
+            started = time.perf_counter()
+            result = send_pending(batch_size=200, connection=connection)
+            elapsed = time.perf_counter() - started
+
+        self.assertEqual(result, {"sent": 200, "retried": 0, "dead": 0})
+        self.assertEqual(len(server.messages), 200)
+        self.assertEqual(
+            server.connections,
+            1,
+            f"{200 / elapsed:.0f} emails/s over {server.connections} "
+            "connection(s)",
+        )
+        self.assertFalse(
+            OutboxEmail.objects.exclude(status=OutboxEmail.SENT).exists()
+        )
+
+    @override_settings(
+        EMAIL_OUTBOX_MAX_ATTEMPTS=3, EMAIL_OUTBOX_RETRY_DELAY=10
+    )
+    def test_failed_email_backs_off_then_dies(self):
+        """
+        A failing email is retried after 10s, then 20s, then given up on.
+        """
+        email = queue_email("Reset", "Link", ["buyer@example.com"])
+
+        for attempt, delay in ((1, 10), (2, 20)):
+            before = time.time()
+            result = send_pending(connection=FailingBackend())
+            self.assertEqual(result["retried"], 1)
+            email.refresh_from_db()
+            self.assertEqual(email.attempts, attempt)
+            self.assertAlmostEqual(
+                email.next_attempt_at.timestamp() - before, delay, delta=2
+            )
+            self.assertIn("mail server unavailable", email.last_error)
+            # Make the email due again without waiting for the back-off.
+            OutboxEmail.objects.filter(pk=email.pk).update(
+                next_attempt_at=email.created_at
+            )
+
+        result = send_pending(connection=FailingBackend())
+        self.assertEqual(result["dead"], 1)
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboxEmail.DEAD)
+        # Dead emails are never picked up again.
+        self.assertEqual(
+            send_pending(connection=FailingBackend()),
+            {"sent": 0, "retried": 0, "dead": 0},
+        )
+
+    def test_rolled_back_transaction_discards_email(self):
+        """
+        An email queued in a rolled-back transaction is discarded.
+        """
+        try:
+            with transaction.atomic():
+                queue_email("Invoice", "Thanks!", ["buyer@example.com"])
+                raise ValueError("checkout failed")
+        except ValueError:
+            pass
+        self.assertFalse(OutboxEmail.objects.exists())
+
+
+class FakeTweetAPI(ThreadingHTTPServer):
+    """
+    A local fake of the Twitter "create tweet" endpoint.
+
+    Replies with the queued ``responses`` (status code, headers) in order,
+    then with 201 Created, and records the posted texts and the client
+    ports it saw so tests can check that connections were reused.
+    """
+    daemon_threads = True
+
+    def __init__(self, responses=()):
+        super().__init__(("127.0.0.1", 0), FakeTweetHandler)
+        self.responses = list(responses)
+        self.posts = []
+        self.client_ports = set()
+        self.authorized = True
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/2/tweets"
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+class FakeTweetHandler(BaseHTTPRequestHandler):
+    """
+    Handle one request for FakeTweetAPI.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        server.client_ports.add(self.client_address[1])
+        server.authorized &= self.headers.get(
+            "Authorization", ""
+        ).startswith("OAuth ")
+        status, headers = (
+            server.responses.pop(0) if server.responses else (201, {})
+        )
+        if status == 201:
+            server.posts.append(json.loads(body)["text"])
+            payload = json.dumps({"data": {"id": str(len(server.posts))}})
+        else:
+            payload = json.dumps({"title": "error"})
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload.encode())
+
+
+@override_settings(
+    TWITTER_ACCESS_TOKEN="token", TWITTER_ACCESS_TOKEN_SECRET="secret"
+)
+class TweetOutboxTestCase(TestCase):
+    """
+    Tests for the tweet outbox and its background publisher, run against a
+    local fake of the Twitter API.
+
+    Methods:
+        test_publish_reuses_one_connection():
+            Publishes a batch and checks every post was signed with OAuth
+            and sent over a single pooled connection.
+
+        test_rate_limit_caps_each_window():
+            Verifies the publisher never posts more than TWEET_RATE_LIMIT
+            tweets per window.
+
+        test_server_errors_retry_and_client_errors_die():
+            Verifies 5xx and 429 responses are retried while other 4xx
+            responses dead-letter the tweet.
+
+        test_creating_a_product_only_queues_a_tweet():
+            Verifies the create_product view queues the tweet instead of
+            calling the API.
+    """
+    def setUp(self):
+        Tweet.reset()
+
+    def tearDown(self):
+        Tweet.reset()
+
+    def test_publish_reuses_one_connection(self):
+        for i in range(5):
+            queue_tweet(f"New product #{i}")
+        with FakeTweetAPI() as api:
+            with self.settings(TWEET_API_URL=api.url):
+                result = publish_pending()
+        self.assertEqual(result, {"sent": 5, "retried": 0, "dead": 0})
+        self.assertEqual(len(api.posts), 5)
+        self.assertTrue(api.posts[0].startswith("New product #0"))
+        self.assertTrue(api.authorized)
+        self.assertEqual(len(api.client_ports), 1)
+        self.assertEqual(
+            set(OutboxTweet.objects.values_list("tweet_id", flat=True)),
+            {"1", "2", "3", "4", "5"},
+        )
+
+    @override_settings(TWEET_RATE_LIMIT=3)
+    def test_rate_limit_caps_each_window(self):
+        for i in range(5):
+            queue_tweet(f"New product #{i}")
+        with FakeTweetAPI() as api:
+            with self.settings(TWEET_API_URL=api.url):
+                self.assertEqual(publish_pending()["sent"], 3)
+                self.assertEqual(publish_pending()["sent"], 0)
+        self.assertEqual(len(api.posts), 3)
+
+    def test_server_errors_retry_and_client_errors_die(self):
+        flaky = queue_tweet("Flaky")
+        rejected = queue_tweet("Rejected")
+        limited = queue_tweet("Limited")
+        reset = int(time.time()) + 600
+        responses = [
+            (503, {}),
+            (403, {}),
+            (429, {"x-rate-limit-reset": str(reset)}),
+        ]
+        with FakeTweetAPI(responses) as api:
+            with self.settings(TWEET_API_URL=api.url):
+                result = publish_pending()
+        self.assertEqual(result, {"sent": 0, "retried": 2, "dead": 1})
+        flaky.refresh_from_db()
+        rejected.refresh_from_db()
+        limited.refresh_from_db()
+        self.assertEqual(flaky.status, OutboxTweet.PENDING)
+        self.assertEqual(flaky.attempts, 1)
+        self.assertEqual(rejected.status, OutboxTweet.DEAD)
+        # A rate-limited post waits for the reset and keeps its attempts.
+        self.assertEqual(limited.status, OutboxTweet.PENDING)
+        self.assertEqual(limited.attempts, 0)
+        self.assertEqual(int(limited.next_attempt_at.timestamp()), reset)
+
+    def test_creating_a_product_only_queues_a_tweet(self):
+        vendor = User.objects.create_user(username="v", password="pass123")
+        vendor.profile.account_type = "vendor"
+        vendor.profile.save()
+        store = Store.objects.create(vendor=vendor, name="S", description="D")
+        self.client.login(username="v", password="pass123")
+        with self.settings(TWEET_API_URL="http://127.0.0.1:9/unreachable"):
+            response = self.client.post(
+                reverse("products:create_product", args=[store.id]),
+                {
+                    "name": "Lamp",
+                    "description": "Bright",
+                    "price": "10.00",
+                    "stock": 3,
+                },
+            )
+        self.assertEqual(response.status_code, 302)
+        tweet = OutboxTweet.objects.get()
+        self.assertIn("Lamp", tweet.text)
+        self.assertEqual(tweet.status, OutboxTweet.PENDING)
+
+
+ran = []
+
+
+@task(name="tests.record")
+def record(value):
+    ran.append(value)
+
+
+@task(name="tests.explode", max_attempts=2)
+def explode():
+    raise RuntimeError("boom")
+
+
+class TaskQueueTestCase(TestCase):
+    """
+    Tests for the database-backed task queue.
+
+    Methods:
+        test_priority_then_age_order():
+            Verifies higher priority tasks run first and delayed tasks wait
+            until they are due.
+
+        test_failures_retry_then_die():
+            Verifies a failing task is retried with back-off and marked dead
+            after its max_attempts.
+
+        test_periodic_task_reschedules_itself():
+            Verifies a periodic task runs, goes back to pending for its next
+            interval, and is never scheduled twice.
+    """
+    def setUp(self):
+        ran.clear()
+
+    def test_priority_then_age_order(self):
+        enqueue("tests.record", "low")
+        record.enqueue("high", priority=10)
+        enqueue(record, "later", delay=3600)
+        self.assertEqual(run_due()["sent"], 2)
+        self.assertEqual(ran, ["high", "low"])
+        Task.objects.filter(status=Task.PENDING).update(
+            next_attempt_at=timezone.now()
+        )
+        run_due()
+        self.assertEqual(ran, ["high", "low", "later"])
+
+    def test_failures_retry_then_die(self):
+        row = explode.enqueue()
+        self.assertEqual(run_due(), {"sent": 0, "retried": 1, "dead": 0})
+        row.refresh_from_db()
+        self.assertGreater(row.next_attempt_at, timezone.now())
+        self.assertIn("boom", row.last_error)
+        Task.objects.filter(pk=row.pk).update(next_attempt_at=row.created_at)
+        self.assertEqual(run_due(), {"sent": 0, "retried": 0, "dead": 1})
+
+    def test_periodic_task_reschedules_itself(self):
+        schedule_periodic("tests.record", 60)
+        Task.objects.filter(key="periodic:tests.record").update(
+            args=["tick"]
+        )
+        self.assertEqual(run_due()["sent"], 1)
+        schedule_periodic("tests.record", 60)
+        row = Task.objects.get()
+        self.assertEqual(row.status, Task.PENDING)
+        self.assertGreater(
+            row.next_attempt_at, timezone.now() + timedelta(seconds=50)
+        )
+        self.assertEqual(run_due()["sent"], 0)
+        self.assertEqual(ran, ["tick"])
+
+
+@override_settings(
+    DATABASE_PRIMARY="router_primary", DATABASE_REPLICAS=["router_replica"]
+)
+class DatabaseRouterTestCase(SimpleTestCase):
+    """
+    Tests for the primary/replica router, run against two throwaway SQLite
+    databases standing in for the primary and a replica. The replica is
+    deliberately out of date so every test can tell which one was read.
+    """
+    aliases = ("router_primary", "router_replica")
+
+    @classmethod
+    def setUpClass(cls):
+        # The aliases only exist while the class runs, so they are allowed
+        # here rather than in a class-level ``databases``, which the test
+        # runner checks before any test starts.
+        cls.tmpdir = tempfile.mkdtemp()
+        for alias in cls.aliases:
+            connections.settings[alias] = connections.configure_settings(
+                {
+                    "default": {
+                        "ENGINE": "django.db.backends.sqlite3",
+                        "NAME": f"{cls.tmpdir}/{alias}.sqlite3",
+                    }
+                }
+            )["default"]
+            with connections[alias].schema_editor() as editor:
+                editor.create_model(Task)
+        cls.databases = set(cls.aliases)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        for alias in cls.aliases:
+            connections[alias].close()
+            del connections[alias]
+            del connections.settings[alias]
+        shutil.rmtree(cls.tmpdir)
+
+    def setUp(self):
+        for alias in self.aliases:
+            Task.objects.using(alias).all().delete()
+        Task.objects.using("router_replica").create(
+            name="stale", next_attempt_at=timezone.now()
+        )
+
+    def test_reads_use_replica_until_a_write(self):
+        """
+        Reads in a request go to the replica; after a write they stick to
+        the primary. Outside requests everything uses the primary.
+        """
+        self.assertFalse(Task.objects.filter(name="stale").exists())
+        with routing() as state:
+            self.assertTrue(Task.objects.filter(name="stale").exists())
+            enqueue("fresh")
+            self.assertTrue(state.wrote)
+            self.assertEqual(
+                list(Task.objects.values_list("name", flat=True)), ["fresh"]
+            )
+        self.assertEqual(
+            Task.objects.using("router_primary").get().name, "fresh"
+        )
+        self.assertEqual(
+            Task.objects.using("router_replica").get().name, "stale"
+        )
+
+    def test_sticky_cookie_and_view_overrides(self):
+        """
+        A request that writes sets the stickiness cookie; the next request
+        carrying it reads from the primary unless the view opts out with
+        use_replica.
+        """
+        factory = RequestFactory()
+
+        def write_view(request):
+            enqueue("fresh")
+            return HttpResponse()
+
+        def read_view(request):
+            return HttpResponse(router.db_for_read(Task))
+
+        response = PrimaryStickinessMiddleware(write_view)(
+            factory.post("/")
+        )
+        cookie = response.cookies["db_primary"]
+        self.assertEqual(cookie["max-age"], 10)
+
+        fresh = factory.get("/")
+        self.assertEqual(
+            PrimaryStickinessMiddleware(read_view)(fresh).content,
+            b"router_replica",
+        )
+        sticky = factory.get("/", HTTP_COOKIE=f"db_primary={cookie.value}")
+        self.assertEqual(
+            PrimaryStickinessMiddleware(read_view)(sticky).content,
+            b"router_primary",
+        )
+        self.assertEqual(
+            PrimaryStickinessMiddleware(use_replica(read_view))(
+                sticky
+            ).content,
+            b"router_replica",
+        )
+        # Reads inside a transaction on the primary stay on the primary.
+        with routing(), transaction.atomic(using="router_primary"):
+            self.assertEqual(router.db_for_read(Task), "router_primary")
+
+
+class FakeConnection:
+    """
+    Stands in for a DB-API connection in the pool tests.
+    """
+    def __init__(self):
+        self.alive = True
+        self.closed = False
+        self.rollbacks = 0
+
+    def ping(self):
+        if not self.alive:
+            raise ConnectionError("server has gone away")
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTestCase(SimpleTestCase):
+    """
+    Tests for the bounded connection pool behind the pooled MySQL backend.
+    """
+    def make_pool(self, **options):
+        return ConnectionPool(
+            FakeConnection, reset=lambda conn: conn.rollback(), **options
+        )
+
+    def test_bounded_pool_waits_then_times_out(self):
+        """
+        A full pool makes callers wait for a release, and raises
+        PoolTimeout when none comes in time.
+        """
+        pool = self.make_pool(max_size=2, timeout=0.2)
+        first, second = pool.acquire(), pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+
+        threading.Timer(0.05, pool.release, [first]).start()
+        self.assertIs(pool.acquire(), first)
+        self.assertEqual(first.rollbacks, 1)
+        stats = pool.stats()
+        self.assertEqual(stats["in_use"], 2)
+        self.assertEqual(stats["created"], 2)
+        self.assertEqual(stats["reused"], 1)
+        self.assertEqual(stats["waits"], 2)
+        self.assertEqual(stats["timeouts"], 1)
+        self.assertGreater(stats["wait_time"], 0.2)
+        pool.release(second)
+        pool.release(second)  # A second release is ignored.
+        self.assertEqual(pool.stats()["idle"], 1)
+
+    def test_pre_ping_replaces_dead_connections(self):
+        """
+        Idle connections that fail the ping or outlive max_lifetime are
+        closed and replaced.
+        """
+        pool = self.make_pool(max_lifetime=60)
+        conn = pool.acquire()
+        pool.release(conn)
+        conn.alive = False
+        fresh = pool.acquire()
+        self.assertIsNot(fresh, conn)
+        self.assertTrue(conn.closed)
+
+        pool.max_lifetime = 0
+        pool.release(fresh)
+        self.assertIsNot(pool.acquire(), fresh)
+        self.assertEqual(pool.stats()["discarded"], 2)
+
+    def test_threads_and_async_tasks_share_the_limit(self):
+        """
+        However many WSGI threads or ASGI tasks use the pool at once, no
+        more than max_size connections are ever open.
+        """
+        pool = self.make_pool(max_size=3, timeout=5)
+        lock = threading.Lock()
+        active = [0, 0]  # Current and peak connections in use.
+
+        def use_connection():
+            conn = pool.acquire()
+            with lock:
+                active[0] += 1
+                active[1] = max(active)
+            time.sleep(0.005)
+            with lock:
+                active[0] -= 1
+            pool.release(conn)
+
+        def worker():
+            for i in range(10):
+                use_connection()
+
+        threads = [threading.Thread(target=worker) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        async def serve():
+            await asyncio.gather(
+                *(
+                    sync_to_async(use_connection, thread_sensitive=False)()
+                    for i in range(40)
+                )
+            )
+
+        asyncio.run(serve())
+        stats = pool.stats()
+        self.assertLessEqual(active[1], 3)
+        self.assertLessEqual(stats["created"], 3)
+        self.assertEqual(stats["created"] + stats["reused"], 120)
+        self.assertEqual(stats["in_use"], 0)
+        self.assertGreater(stats["waits"], 0)
+
+
+class VersionedCacheTestCase(SimpleTestCase):
+    """
+    Tests for the namespace version counters that invalidate per-process
+    caches.
+    """
+    def setUp(self):
+        cache.clear()
+
+    def test_bump_drops_only_dependent_entries_everywhere(self):
+        """
+        Two LRUs stand in for two worker processes. Bumping one product's
+        namespace drops the entries built from it in both, and nothing
+        else.
+        """
+        workers = [VersionedLRU(10, 60), VersionedLRU(10, 60)]
+        for local in workers:
+            local.set("p1", "product 1", ["product:1", "store:1"])
+            local.set("p2", "product 2", ["product:2", "store:1"])
+            local.set("s2", "store 2", ["store:2"])
+
+        bump("product:1")
+        sync_all()
+        for local in workers:
+            self.assertIsNone(local.get("p1"))
+            self.assertEqual(local.get("p2"), "product 2")
+            self.assertEqual(local.get("s2"), "store 2")
+
+        bump("store:1")
+        sync_all()
+        self.assertEqual([len(local) for local in workers], [1, 1])
+
+    def test_change_while_building_is_not_missed(self):
+        """
+        A value stored with versions read before a concurrent bump is
+        dropped on the next sync.
+        """
+        local = VersionedLRU(10, 60)
+        local.sync()
+        versions = get_versions(["product:1", "generation"])
+        bump("product:1")
+        local.set("p1", "old product 1", ["product:1"], versions)
+        local.sync()
+        self.assertIsNone(local.get("p1"))
+
+
+class BenchmarkViewsTestCase(TestCase):
+    """
+    Tests for the benchmark_views command.
+    """
+    def test_every_url_is_measured_and_rolled_back(self):
+        """
+        Every named URL outside the admin gets a result without a server
+        error, and the seeded rows do not outlive the run.
+        """
+        out = StringIO()
+        call_command(
+            "benchmark_views",
+            "--products", "20",
+            "--orders", "10",
+            "--reviews", "20",
+            "--iterations", "2",
+            "--warmup", "0",
+            "--memory-iterations", "1",
+            "--json",
+            stdout=out,
+        )
+        report = json.loads(out.getvalue())
+        names = [row["name"] for row in report["results"]]
+        self.assertEqual(names, [name for name, _ in discover_urls()])
+        self.assertIn("api_review_summaries", names)
+        for row in report["results"]:
+            self.assertLess(row["status"], 500, row["name"])
+            self.assertIn("p99", row["latency_ms"])
+            self.assertGreater(row["allocated_kb"], 0)
+        self.assertEqual(report["dataset"]["products"], 20)
+        self.assertFalse(User.objects.filter(username__startswith="bench_"))
+
+
+class GenerateDataTestCase(TestCase):
+    """
+    Tests for the generate_data command.
+    """
+    def generate(self, seed, reviews=40, chunk_size=16):
+        call_command(
+            "generate_data",
+            "--vendors", "3",
+            "--buyers", "10",
+            "--stores", "4",
+            "--products", "50",
+            "--orders", "30",
+            "--reviews", str(reviews),
+            "--chunk-size", str(chunk_size),
+            "--seed", str(seed),
+            "--json",
+            stdout=StringIO(),
+        )
+
+    def test_generates_consistent_repeatable_data(self):
+        """
+        The rows reference each other correctly, order totals match their
+        items, derived tables are built, and a seed gives the same data.
+        """
+        self.generate(seed=7)
+        self.assertEqual(Store.objects.count(), 4)
+        self.assertEqual(Product.objects.count(), 50)
+        self.assertEqual(
+            Profile.objects.filter(account_type="buyer").count(), 10
+        )
+        for order in Order.objects.prefetch_related("items"):
+            items = list(order.items.all())
+            self.assertTrue(items)
+            self.assertEqual(
+                order.total, sum(i.price * i.quantity for i in items)
+            )
+            for item in items:
+                self.assertEqual(item.vendor_id, item.store.vendor_id)
+        self.assertTrue(ProductRating.objects.exists())
+        # Verified exactly when the reviewer ordered the product.
+        reviews = Review.objects.annotate(ordered=purchased())
+        self.assertTrue(reviews.filter(verified=True).exists())
+        self.assertFalse(reviews.exclude(verified=F("ordered")).exists())
+        self.assertTrue(
+            self.client.login(
+                username=User.objects.filter(
+                    username__startswith="gen_buyer_"
+                ).first().username,
+                password="password",
+            )
+        )
+        first = list(
+            OrderItem.objects.order_by("order_id", "product_id").values_list(
+                "order__user_id", "product_id", "quantity", "price"
+            )
+        )
+        offset = Order.objects.count()
+        products = Product.objects.count()
+        users = User.objects.count()
+        self.generate(seed=7)
+        second = list(
+            OrderItem.objects.filter(order_id__gt=offset)
+            .order_by("order_id", "product_id")
+            .values_list("order__user_id", "product_id", "quantity", "price")
+        )
+        # Same data, shifted past the first run's ids.
+        self.assertEqual(
+            [(u - users, p - products, q, c) for u, p, q, c in second], first
+        )
+
+    def test_reviews_are_unique_per_buyer_and_product(self):
+        """
+        No buyer reviews a product twice across chunks, and the reviewed
+        pairs do not depend on the chunk size.
+        """
+        self.generate(seed=7, reviews=300, chunk_size=16)
+        self.assertEqual(Review.objects.count(), 300)
+        duplicates = (
+            Review.objects.values("product", "reviewer")
+            .annotate(n=Count("id"))
+            .filter(n__gt=1)
+        )
+        self.assertFalse(duplicates.exists())
+
+        first = set(Review.objects.values_list("reviewer_id", "product_id"))
+        products = Product.objects.count()
+        users = User.objects.count()
+        self.generate(seed=7, reviews=300, chunk_size=100)
+        second = set(
+            Review.objects.filter(product_id__gt=products).values_list(
+                "reviewer_id", "product_id"
+            )
+        )
+        self.assertEqual(
+            {(u - users, p - products) for u, p in second}, first
+        )
+
+
+class LoadTestCommandTestCase(LiveServerTestCase):
+    """
+    Tests for the loadtest command, against a live server.
+    """
+    def test_default_scenarios_run_without_errors(self):
+        """
+        Every step of the default scenarios, including login, add to cart,
+        checkout and product creation, succeeds against the real views.
+        """
+        vendor = User.objects.create_user("gen_vendor", password="password")
+        buyer = User.objects.create_user("gen_buyer", password="password")
+        Profile.objects.filter(user=buyer).update(account_type="buyer")
+        store = Store.objects.create(vendor=vendor, name="S", description="D")
+        Product.objects.create(
+            store=store, name="Mug", description="D", price=5, stock=100
+        )
+        out = StringIO()
+        call_command(
+            "loadtest",
+            "--url", self.live_server_url,
+            "--users", "4",
+            "--duration", "1",
+            "--json",
+            stdout=out,
+        )
+        report = json.loads(out.getvalue())
+        self.assertGreater(report["requests"], 0)
+        self.assertEqual(report["error_rate"], 0, report["steps"])
+        for step in report["steps"].values():
+            self.assertIn("p99", step["latency_ms"])
+
+    def send(self, replies, *args):
+        """
+        Send one request per canned reply to a throwaway server with
+        ``LoadTest._send(client, "step", "GET", "/", None, *args)``. The
+        server closes the connection after each reply.
+
+        Returns:
+            tuple: The results of the sends, and the step's reasons.
+        """
+        pending = iter(replies)
+
+        async def serve(reader, writer):
+            await reader.readuntil(b"\r\n\r\n")
+            writer.write(next(pending))
+            await writer.drain()
+            writer.close()
+
+        async def run():
+            server = await asyncio.start_server(serve, "127.0.0.1", 0)
+            url = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+            test = LoadTest(url, [], None, 1, 0)
+            client = HttpClient(url, timeout=5)
+            results = []
+            for _ in replies:
+                results.append(
+                    await test._send(client, "step", "GET", "/", None, *args)
+                )
+            await client.close()
+            server.close()
+            return results, test.stats["step"].reasons
+
+        return asyncio.run(run())
+
+    def test_redirects_to_a_failure_are_errors(self):
+        found = (
+            b"HTTP/1.1 302 Found\r\nConnection: close\r\n"
+            b"Content-Length: 0\r\nLocation: "
+        )
+        results, reasons = self.send(
+            [found + b"/products/\r\n\r\n", found + b"/cart/\r\n\r\n"],
+            [302],
+            "/products/",
+        )
+        self.assertEqual(results, [True, False])
+        self.assertEqual(reasons, {"302 /cart/": 1})
+
+    def test_malformed_responses_are_errors(self):
+        """
+        A truncated body, a bad length or a bad chunk size fails the step
+        instead of aborting the whole run.
+        """
+        ok = b"HTTP/1.1 200 OK\r\n"
+        results, reasons = self.send(
+            [
+                ok + b"Content-Length: 100\r\n\r\nshort",
+                ok + b"Content-Length: many\r\n\r\n",
+                ok + b"Transfer-Encoding: chunked\r\n\r\nzz\r\n",
+                ok + b"Connection: close\r\nContent-Length: 2\r\n\r\nok",
+            ],
+            [200],
+        )
+        self.assertEqual(results, [False, False, False, True])
+        self.assertEqual(reasons, {"LoadTestError": 3})
+
+
+class SQLInstrumentationTestCase(TestCase):
+    """
+    Tests for the SQL instrumentation middleware.
+    """
+    def setUp(self):
+        vendor = User.objects.create_user("vendor", password="x")
+        store = Store.objects.create(vendor=vendor, name="S", description="D")
+        self.product = Product.objects.create(
+            store=store, name="Mug", description="D", price=5, stock=3
+        )
+        self.url = reverse("products:product_detail", args=[self.product.pk])
+
+    def test_fingerprint_normalizes_values(self):
+        self.assertEqual(
+            fingerprint(
+                "SELECT  a FROM t WHERE id IN (%s, %s, %s) AND "
+                "name = 'it''s' LIMIT 21"
+            ),
+            "SELECT a FROM t WHERE id IN (...) AND name = ? LIMIT ?",
+        )
+        self.assertEqual(
+            fingerprint("INSERT INTO t VALUES (%s, %s), (%s, %s)"),
+            "INSERT INTO t VALUES (...)",
+        )
+
+    @override_settings(SQL_SLOW_QUERY_MS=0, DEBUG=True)
+    def test_server_timing_and_slow_query_log(self):
+        """
+        Responses carry the SQL, template and view timings, and slow
+        statements are logged with the view that ran them.
+        """
+        with self.assertLogs("functions.instrumentation", "WARNING") as logs:
+            response = self.client.get(self.url)
+        timing = response["Server-Timing"]
+        metrics = response.wsgi_request.metrics
+        self.assertIn(f'desc="{metrics.queries} queries"', timing)
+        self.assertGreater(metrics.queries, 0)
+        self.assertGreater(metrics.template_seconds, 0)
+        for name in ("db;", "tpl;", "view;", "total;", "sql-1;"):
+            self.assertIn(name, timing)
+        self.assertEqual(metrics.view_name, "products.views.product_detail")
+        self.assertIn("products.views.product_detail", logs.output[-1])
+
+    def test_view_name_is_resolved_once(self):
+        """
+        The first middleware to see the view names it, and the others
+        reuse request.view_name.
+        """
+        request = self.client.get(self.url).wsgi_request
+        self.assertEqual(request.view_name, "products.views.product_detail")
+        self.assertEqual(request.metrics.view_name, request.view_name)
+        self.assertEqual(resolve_view_name(request, None), request.view_name)
+
+    @override_settings(SQL_TIMING_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_instrumented(self):
+        response = self.client.get(self.url)
+        self.assertNotIn("Server-Timing", response)
+        self.assertFalse(hasattr(response.wsgi_request, "metrics"))
+
+    @override_settings(SQL_SLOW_QUERY_MS=0)
+    def test_slow_query_plans_are_captured_and_compared(self):
+        """
+        Slow SELECTs get their plan stored, full product scans are
+        flagged, and a changed plan fails the --check against a baseline.
+        """
+        with self.assertLogs("functions.instrumentation", "WARNING"):
+            self.client.get(reverse("products:product_list"))
+        scan = CapturedQuery.objects.get(
+            fingerprint__contains='FROM "products_product"',
+            view_name="products.views.product_list",
+        )
+        self.assertTrue(scan.plan)
+        self.assertEqual(full_scans(scan.plan), ["products_product"])
+
+        # Session keys and user fields never reach the table.
+        User.objects.create_user("buyer", password="x")
+        self.client.login(username="buyer", password="x")
+        with self.assertLogs("functions.instrumentation", "WARNING"):
+            self.client.get(reverse("products:product_list"))
+        session = CapturedQuery.objects.get(
+            fingerprint__contains='FROM "django_session"'
+        )
+        self.assertIn("<redacted>", session.params)
+        self.assertNotIn(self.client.session.session_key, session.params)
+        self.assertTrue(session.plan)
+
+        path = tempfile.mktemp(suffix=".json")
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+        call_command(
+            "query_plans", "--save-baseline", path, "--json", stdout=StringIO()
+        )
+        out = StringIO()
+        call_command("query_plans", "--baseline", path, "--json", stdout=out)
+        results = {row["digest"]: row for row in json.loads(out.getvalue())}
+        self.assertEqual(results[scan.digest]["status"], "same")
+
+        with open(path) as source:
+            baseline = json.load(source)
+        baseline[scan.digest]["plan"] = ["SEARCH products_product"]
+        with open(path, "w") as output:
+            json.dump(baseline, output)
+        with self.assertRaises(CommandError):
+            call_command(
+                "query_plans", "--baseline", path, "--check", stdout=StringIO()
+            )
+
+
+class IndexAdvisorTestCase(TestCase):
+    """
+    Tests for the index advisor.
+    """
+    def capture(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        return CapturedQuery.objects.create(
+            digest=digest("default", fingerprint(sql)),
+            fingerprint=fingerprint(sql),
+            sql=sql,
+            params=list(params),
+            database="default",
+            plan=[],
+            max_ms=200,
+        )
+
+    def test_proposes_benchmarks_and_writes_indexes(self):
+        """
+        A filtered, sorted scan gets an index on its equality column then
+        its sort column; an existing index is not proposed again.
+        """
+        query = self.capture(
+            OrderItem.objects.filter(quantity=2).order_by("-price")[:20]
+        )
+        # Served by the (product, -created_at) index.
+        self.capture(
+            Review.objects.filter(product_id=1).order_by("-created_at")
+        )
+        [proposal] = advise(CapturedQuery.objects.all())
+        self.assertEqual(proposal.model, OrderItem)
+        self.assertEqual(proposal.fields, ["quantity", "-price"])
+        self.assertEqual(proposal.reasons, {"full scan", "sort"})
+        self.assertEqual(proposal.queries, [query])
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        out = StringIO()
+        call_command(
+            "advise_indexes",
+            "--benchmark",
+            "--seed-products", "60",
+            "--repeat", "2",
+            "--write-migrations",
+            "--output-dir", directory,
+            "--json",
+            stdout=out,
+        )
+        [result] = json.loads(out.getvalue())
+        [timing] = result["benchmark"]
+        self.assertIn(
+            "USING INDEX orderitem_quantity_price_idx", timing["plan"][0]
+        )
+        # The index and the generated rows were rolled back.
+        self.assertFalse(Product.objects.exists())
+        with open(result["migration"]) as source:
+            migration = source.read()
+        self.assertIn("migrations.AddIndex(", migration)
+        self.assertIn("fields=['quantity', '-price']", migration)
+
+
+class ProfilingTestCase(TestCase):
+    """
+    Tests for on-demand request profiling.
+    """
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings = override_settings(PROFILE_DIR=directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.url = reverse("products:product_list")
+
+    def test_staff_and_signed_requests_are_profiled(self):
+        """
+        Only staff query flags and valid signed headers profile a
+        request; the profiles are listed and downloadable by staff only.
+        """
+        User.objects.create_user("buyer", password="x")
+        self.client.login(username="buyer", password="x")
+        response = self.client.get(self.url, {"profile": "1"})
+        self.assertNotIn("X-Profile-Id", response)
+        response = self.client.get(reverse("ops:profile_list"))
+        self.assertEqual(response.status_code, 302)
+
+        response = self.client.get(
+            self.url, headers={"X-Profile": make_token("sample")}
+        )
+        sampled = response["X-Profile-Id"]
+        response = self.client.get(
+            self.url, headers={"X-Profile": make_token(path="/api/")}
+        )
+        self.assertNotIn("X-Profile-Id", response)
+        response = self.client.get(self.url, headers={"X-Profile": "forged"})
+        self.assertNotIn("X-Profile-Id", response)
+
+        User.objects.create_user("admin", password="x", is_staff=True)
+        self.client.login(username="admin", password="x")
+        profiled = self.client.get(self.url, {"profile": "1"})["X-Profile-Id"]
+        profiles = list_profiles()
+        self.assertEqual(
+            [(p["id"], p["mode"]) for p in profiles],
+            sorted(
+                [(profiled, "cprofile"), (sampled, "sample")], reverse=True
+            ),
+        )
+        self.assertEqual(
+            profiles[0]["view_name"], "products.views.product_list"
+        )
+
+        response = self.client.get(reverse("ops:profile_list"))
+        self.assertContains(response, profiled)
+        response = self.client.get(
+            reverse("ops:profile_detail", args=[profiled])
+        )
+        self.assertContains(response, "cumulative")
+        response = self.client.get(
+            reverse("ops:profile_download", args=[profiled])
+        )
+        self.assertTrue(b"".join(response.streaming_content))
+        response = self.client.get(
+            reverse("ops:profile_detail", args=["..%2Fsecrets"])
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class MetricsTestCase(TestCase):
+    """
+    Tests for the metrics registry and the /metrics endpoint.
+    """
+    def value(self, name, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        return registry.collect().get(key, 0)
+
+    def test_requests_and_checkouts_are_exposed(self):
+        """
+        Requests are counted and timed by view, checkouts by result, and
+        only allowed scrapers read them.
+        """
+        view = "orders.views.checkout"
+        requests = self.value(
+            "http_requests_total", view=view, method="GET", status="302"
+        )
+        empty = self.value("checkouts_total", result="empty_cart")
+        buyer = User.objects.create_user("buyer", password="x")
+        Profile.objects.update_or_create(
+            user=buyer, defaults={"account_type": "buyer"}
+        )
+        self.client.login(username="buyer", password="x")
+        self.client.get(reverse("orders:checkout"))
+        self.assertEqual(
+            self.value(
+                "http_requests_total", view=view, method="GET", status="302"
+            ),
+            requests + 1,
+        )
+        self.assertEqual(
+            self.value("checkouts_total", result="empty_cart"), empty + 1
+        )
+        self.client.generic("FOO", reverse("orders:checkout"))
+        self.assertEqual(
+            self.value(
+                "http_requests_total", view=view, method="other", status="302"
+            ),
+            1,
+        )
+
+        self.client.logout()
+        response = self.client.get("/metrics", REMOTE_ADDR="10.0.0.1")
+        self.assertEqual(response.status_code, 403)
+        # A local reverse proxy makes every client 127.0.0.1.
+        response = self.client.get("/metrics", REMOTE_ADDR="127.0.0.1")
+        self.assertEqual(response.status_code, 403)
+        with override_settings(METRICS_TOKEN="secret"):
+            response = self.client.get(
+                "/metrics",
+                REMOTE_ADDR="10.0.0.1",
+                headers={"Authorization": "Bearer secret"},
+            )
+        self.assertContains(
+            response, "# TYPE http_request_duration_seconds histogram"
+        )
+        self.assertContains(
+            response,
+            f'http_request_duration_seconds_count{{method="GET",'
+            f'view="{view}"}}',
+        )
+        self.assertContains(response, 'product_cache_lookups_total{')
+
+    def test_pool_waits_are_exposed(self):
+        alias = "metrics-test"
+        pool = get_pool(alias, FakeConnection, max_size=1, timeout=0.05)
+        self.addCleanup(_pools.pop, alias)
+        pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            with self.assertLogs("functions.pool", "WARNING"):
+                pool.acquire()
+        self.assertEqual(
+            self.value("db_pool_events_total", alias=alias, event="timeouts"),
+            1,
+        )
+        self.assertGreaterEqual(
+            self.value("db_pool_wait_seconds_total", alias=alias), 0.05
+        )
+
+    def test_processes_are_summed_and_exited_ones_archived(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        local = Registry()
+        jobs = local.counter("jobs_total", "Jobs run.", ["kind"])
+        with override_settings(METRICS_DIR=directory):
+            jobs.inc(kind="a")
+            # The file of a worker that has since exited.
+            exited = os.path.join(directory, "999999999-0a1b2c3d.json")
+            with open(exited, "w") as output:
+                json.dump([["jobs_total", {"kind": "a"}, 2]], output)
+            self.assertIn('jobs_total{kind="a"} 3', local.exposition())
+            self.assertFalse(os.path.exists(exited))
+            jobs.inc(kind="a")
+            self.assertIn('jobs_total{kind="a"} 4', local.exposition())
+        with self.assertRaises(ValueError):
+            jobs.inc(kind="a", extra="b")
+
+
+class TemplateQueryTestCase(TestCase):
+    """
+    Tests for the template query detector.
+    """
+    def test_queries_are_charged_to_the_template_line(self):
+        vendor = User.objects.create_user("vendor", password="x")
+        store = Store.objects.create(vendor=vendor, name="S", description="D")
+        for name in ("A", "B", "C"):
+            Product.objects.create(
+                store=store, name=name, description="D", price=1, stock=1
+            )
+        template = Template(
+            "{% for product in products %}\n"
+            "{{ product.name }} by {{ product.store.vendor.username }}\n"
+            "{% endfor %}"
+        )
+
+        with record_template_queries() as recording:
+            template.render(Context({"products": Product.objects.all()}))
+        [site] = recording.loop_sites()
+        self.assertEqual(site.line, 2)
+        self.assertEqual(site.source, "{{ product.store.vendor.username }}")
+        # A store and a vendor per product.
+        self.assertEqual(site.loop_queries, 6)
+        [loop] = [s for s in recording.sites.values() if s.line == 1]
+        self.assertEqual((loop.queries, loop.loop_queries), (1, 0))
+        self.assertGreater(loop.seconds, 0)
+
+        products = Product.objects.select_related("store__vendor")
+        with record_template_queries() as recording:
+            template.render(Context({"products": products}))
+        self.assertEqual(recording.loop_sites(), [])
+
+
+@override_settings(MEMORY_PROFILE_SAMPLE_RATE=1, RELEASE="r2")
+class MemoryProfilingTestCase(TestCase):
+    """
+    Tests for per-request memory profiling.
+    """
+    def test_requests_are_sampled_and_compared(self):
+        vendor = User.objects.create_user("vendor", password="x")
+        store = Store.objects.create(vendor=vendor, name="S", description="D")
+        for name in ("A", "B", "C"):
+            Product.objects.create(
+                store=store, name=name, description="D", price=1, stock=1
+            )
+        self.client.get(reverse("products:product_list"))
+        [sample] = MemorySample.objects.all()
+        self.assertEqual(
+            (sample.release, sample.view_name, sample.status),
+            ("r2", "products.views.product_list", 200),
+        )
+        self.assertGreater(sample.peak_kb, 0)
+        self.assertGreaterEqual(sample.peak_kb, sample.retained_kb)
+        self.assertTrue(sample.top_sites)
+
+        self.client.login(username="vendor", password="x")
+        response = self.client.get(reverse("ops:memory_samples"))
+        self.assertEqual(response.status_code, 302)
+        User.objects.create_user("admin", password="x", is_staff=True)
+        self.client.login(username="admin", password="x")
+        response = self.client.get(reverse("ops:memory_samples"))
+        self.assertContains(response, "products.views.product_list")
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "memory.json")
+        call_command("compare_memory", save_baseline=path, stdout=StringIO())
+        with open(path) as source:
+            baseline = json.load(source)
+        self.assertEqual(baseline["release"], "r2")
+        view = baseline["views"]["products.views.product_list"]
+        self.assertEqual(view["samples"], 1)
+
+        # The same release compared with itself did not grow.
+        out = StringIO()
+        call_command("compare_memory", baseline=path, check=True, stdout=out)
+        self.assertIn("same", out.getvalue())
+
+        view["peak_kb"] /= 4
+        with open(path, "w") as output:
+            json.dump(baseline, output)
+        with self.assertRaises(CommandError):
+            call_command(
+                "compare_memory", baseline=path, check=True, stdout=StringIO()
+            )
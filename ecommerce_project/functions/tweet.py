@@ -1,36 +1,121 @@
-import json
-from requests_oauthlib import OAuth1Session
 import datetime
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from requests_oauthlib import OAuth1Session
+
+from .conf import setting
+from .models import OutboxTweet
+from .outbox import (
+    DELIVERY_SECONDS,
+    claim_due,
+    count_results,
+    record_failure,
+    record_success,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class TweetError(Exception):
+    """
+    Raised when the Twitter API rejects a post.
+
+    Attributes:
+        status_code (int): The HTTP status code of the response.
+        retry_after (datetime | None): When the API allows posting again,
+            for rate-limited (429) responses that say so.
+    """
+    def __init__(self, status_code, text, retry_after=None):
+        super().__init__(
+            "Request returned an error: {} {}".format(status_code, text)
+        )
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @property
+    def permanent(self):
+        """
+        True for client errors that will fail the same way on every retry.
+        """
+        return 400 <= self.status_code < 500 and self.status_code != 429
+
+
+class OAuthTransport:
+    """
+    Posts tweets over a long-lived OAuth 1.0a session.
+
+    OAuth1Session is a requests.Session, so the worker reuses pooled
+    keep-alive connections to the API instead of opening one per post.
+
+    Args:
+        consumer_key (str): The consumer key for the Twitter application.
+        consumer_secret (str): The consumer secret for the application.
+        access_token (str): The pre-provisioned access token.
+        access_token_secret (str): The pre-provisioned access token secret.
+        url (str, optional): The endpoint to post to. Defaults to
+            settings.TWEET_API_URL; tests point this at a local fake server.
+    """
+    def __init__(
+        self,
+        consumer_key,
+        consumer_secret,
+        access_token,
+        access_token_secret,
+        url=None,
+    ):
+        self.url = url or setting("TWEET_API_URL")
+        self.timeout = setting("TWEET_TIMEOUT")
+        self.session = OAuth1Session(
+            consumer_key,
+            client_secret=consumer_secret,
+            resource_owner_key=access_token,
+            resource_owner_secret=access_token_secret,
+        )
+
+    def post(self, text):
+        """
+        Post ``text`` and return the requests.Response.
+        """
+        return self.session.post(
+            self.url, json={"text": text}, timeout=self.timeout
+        )
 
 
 class Tweet:
     """
     The `Tweet` class provides functionality to interact with the Twitter API
     using OAuth 1.0a authentication. It implements the Singleton design pattern
-    to ensure only one instance of the class is created. The class allows users
-    to authenticate with the Twitter API and post tweets.
+    to ensure only one instance of the class is created.
+
+    Web requests never use this class directly: they call `queue_tweet()`,
+    and the `publish_tweets` worker posts the queued tweets through the
+    singleton. Access tokens are pre-provisioned in settings (run
+    `python manage.py twitter_login` once to obtain them), so nothing ever
+    blocks waiting for a PIN.
 
-        CONSUMER_KEY (str): The consumer key for the Twitter application.
-        CONSUMER_SECRET (str): The consumer secret for the Twitter application.
+        CONSUMER_KEY (str): The consumer key for the Twitter application,
+            used when settings.TWITTER_CONSUMER_KEY is not set.
+        CONSUMER_SECRET (str): The consumer secret for the Twitter
+            application, used when settings.TWITTER_CONSUMER_SECRET is not
+            set.
         _instance (Tweet): The singleton instance of the `Tweet` class.
 
     Methods:
         __new__(cls):
-            Ensures only one instance of the `Tweet` class is created. If an
-            instance already exists, it returns the existing instance.
-            Otherwise, it creates a new instance and initializes
-            authentication.
+            Ensures only one instance of the `Tweet` class is created. The
+            first call builds the transport from the pre-provisioned tokens.
 
         authenticate():
-            Authenticates the user with the Twitter API using OAuth 1.0a. This
-            involves fetching a request token, directing the user to authorize
-            the application, exchanging the PIN for an access token, and
-            creating an authenticated session for making API requests.
+            Runs the interactive OAuth 1.0a PIN flow and returns the access
+            token pair to copy into settings.
 
         make_tweet(tweet):
-            Posts a tweet to Twitter using the authenticated session. The tweet
-            content is dynamically appended with a timestamp to ensure
-            uniqueness.
+            Posts a tweet through the transport. The tweet content is
+            dynamically appended with a timestamp to ensure uniqueness.
     """
     # Replace these with your ACTUAL Twitter (or X) API credentials.
     CONSUMER_KEY = (
@@ -48,53 +133,67 @@ class Tweet:
         Override the __new__ method to implement the Singleton design pattern
         for the Tweet class.
 
-        This ensures that only one instance of the Tweet class is created. If
-        an instance already exists, it returns the existing instance.
-        Otherwise, it creates a new instance, initializes the `oauth`
-        attribute to None, and calls the `authenticate` method to set up
-        authentication.
+        The first call creates the instance and its transport (by default an
+        OAuthTransport built from settings.TWITTER_ACCESS_TOKEN and
+        settings.TWITTER_ACCESS_TOKEN_SECRET; settings.TWEET_TRANSPORT names
+        a different transport class). If no access token is configured the
+        transport is None and `make_tweet` raises ValueError.
 
         Returns:
             Tweet: The singleton instance of the Tweet class.
         """
         if cls._instance is None:
-            print("Creating the Tweet singleton instance")
-            cls._instance = super(Tweet, cls).__new__(cls)
-            cls._instance.oauth = None
-            cls._instance.authenticate()
+            instance = super(Tweet, cls).__new__(cls)
+            instance.consumer_key = getattr(
+                settings, "TWITTER_CONSUMER_KEY", cls.CONSUMER_KEY
+            )
+            instance.consumer_secret = getattr(
+                settings, "TWITTER_CONSUMER_SECRET", cls.CONSUMER_SECRET
+            )
+            access_token = setting("TWITTER_ACCESS_TOKEN")
+            access_token_secret = setting("TWITTER_ACCESS_TOKEN_SECRET")
+            instance.transport = None
+            if access_token and access_token_secret:
+                transport_class = import_string(
+                    setting("TWEET_TRANSPORT")
+                )
+                instance.transport = transport_class(
+                    instance.consumer_key,
+                    instance.consumer_secret,
+                    access_token,
+                    access_token_secret,
+                )
+            cls._instance = instance
         return cls._instance
 
+    @classmethod
+    def reset(cls):
+        """
+        Drop the singleton so the next call rebuilds it from settings.
+        """
+        cls._instance = None
+
     def authenticate(self):
         """
         Authenticates the user with the Twitter API using OAuth 1.0a.
 
+        This is an interactive, one-off provisioning step (see the
+        `twitter_login` management command); it must never run inside a
+        web request.
+
         This method performs the following steps:
         1. Fetches a request token from Twitter.
         2. Directs the user to authorize the application and obtain a PIN.
         3. Exchanges the PIN for an access token.
-        4. Creates an authenticated OAuth1Session for making API requests.
-
-        Attributes:
-            self.CONSUMER_KEY (str): The consumer key for the Twitter
-            application.
-            self.CONSUMER_SECRET (str): The consumer secret for the Twitter
-            application.
-            self.oauth (OAuth1Session): The authenticated session for making
-            API requests.
-
-        Steps:
-            - Fetches a request token from Twitter's OAuth endpoint.
-            - Prompts the user to visit an authorization URL and provide a PIN.
-            - Exchanges the PIN for an access token and secret.
-            - Initializes an OAuth1Session with the access token
-              for future requests.
 
         Raises:
             ValueError: If there is an error fetching the request token, likely
                         due to invalid consumer key or secret.
 
         Returns:
-            None
+            dict: The "oauth_token" and "oauth_token_secret" to store in
+            settings.TWITTER_ACCESS_TOKEN and
+            settings.TWITTER_ACCESS_TOKEN_SECRET.
         """
         # Step 1: Get request token
         request_token_url = (
@@ -102,18 +201,15 @@ class Tweet:
             "?oauth_callback=oob&x_auth_access_type=write"
         )
         oauth = OAuth1Session(
-            self.CONSUMER_KEY, client_secret=self.CONSUMER_SECRET
+            self.consumer_key, client_secret=self.consumer_secret
         )
         try:
             fetch_response = oauth.fetch_request_token(request_token_url)
         except ValueError:
-            print(
-                (
-                    "Error fetching request token. "
-                    "Check your consumer key and secret."
-                )
+            raise ValueError(
+                "Error fetching request token. "
+                "Check your consumer key and secret."
             )
-            return
         resource_owner_key = fetch_response.get("oauth_token")
         resource_owner_secret = fetch_response.get("oauth_token_secret")
         print("Got OAuth token: %s" % resource_owner_key)
@@ -127,62 +223,159 @@ class Tweet:
         # Step 3: Get the access token
         access_token_url = "https://api.twitter.com/oauth/access_token"
         oauth = OAuth1Session(
-            self.CONSUMER_KEY,
-            client_secret=self.CONSUMER_SECRET,
+            self.consumer_key,
+            client_secret=self.consumer_secret,
             resource_owner_key=resource_owner_key,
             resource_owner_secret=resource_owner_secret,
             verifier=verifier,
         )
         oauth_tokens = oauth.fetch_access_token(access_token_url)
-        access_token = oauth_tokens["oauth_token"]
-        access_token_secret = oauth_tokens["oauth_token_secret"]
-
-        # Step 4: Create an OAuth1Session for making requests
-        self.oauth = OAuth1Session(
-            self.CONSUMER_KEY,
-            client_secret=self.CONSUMER_SECRET,
-            resource_owner_key=access_token,
-            resource_owner_secret=access_token_secret,
-        )
+        return {
+            "oauth_token": oauth_tokens["oauth_token"],
+            "oauth_token_secret": oauth_tokens["oauth_token_secret"],
+        }
 
     def make_tweet(self, tweet):
         """
-        Posts a tweet to Twitter using the provided OAuth authentication.
+        Posts a tweet to Twitter through the configured transport.
 
         Args:
             tweet (str): The content of the tweet to be posted.
 
         Raises:
-            ValueError: If OAuth authentication is not available.
-            Exception: If the request to the Twitter API fails, with details
-                       about the HTTP status code and error message.
+            ValueError: If no access token has been provisioned.
+            TweetError: If the Twitter API rejects the post, with details
+                        about the HTTP status code and error message.
 
         Returns:
-            None: Prints the response status code and the JSON response from
-                  the Twitter API if the tweet is posted successfully.
+            dict: The JSON response from the Twitter API.
         """
-        if self.oauth:
-            # Dynamically append a timestamp to ensure uniqueness:
-            unique_tweet_text = (
-                f"{tweet} (Posted at {datetime.datetime.now().isoformat()})"
-            )
-            response = self.oauth.post(
-                "https://api.twitter.com/2/tweets",
-                json={"text": unique_tweet_text},
-            )
-        else:
+        if self.transport is None:
             raise ValueError("Authentication failed!")
+        # Dynamically append a timestamp to ensure uniqueness:
+        unique_tweet_text = (
+            f"{tweet} (Posted at {datetime.datetime.now().isoformat()})"
+        )
+        response = self.transport.post(unique_tweet_text)
         if response.status_code != 201:
-            raise Exception(
-                "Request returned an error: {} {}".format(
-                    response.status_code,
-                    response.text,
+            retry_after = None
+            reset = response.headers.get("x-rate-limit-reset")
+            if response.status_code == 429 and reset:
+                retry_after = datetime.datetime.fromtimestamp(
+                    int(reset), tz=datetime.timezone.utc
                 )
+            raise TweetError(
+                response.status_code, response.text, retry_after
             )
-        print(
-            "Tweet posted successfully. Response code: {}".format(
-                response.status_code
+        return response.json()
+
+
+def queue_tweet(text):
+    """
+    Queue a social post for the background publisher.
+
+    Args:
+        text (str): The text of the post.
+
+    Returns:
+        OutboxTweet: The queued outbox row.
+    """
+    return OutboxTweet.objects.create(
+        text=text, next_attempt_at=timezone.now()
+    )
+
+
+def _rate_limit_slots():
+    """
+    Return how many posts the rate limit still allows right now.
+
+    The limit is settings.TWEET_RATE_LIMIT posts per
+    settings.TWEET_RATE_WINDOW seconds, counted from the outbox itself so it
+    holds across every worker process.
+    """
+    window_start = timezone.now() - timedelta(
+        seconds=setting("TWEET_RATE_WINDOW")
+    )
+    recent = OutboxTweet.objects.filter(sent_at__gte=window_start).count()
+    return max(setting("TWEET_RATE_LIMIT") - recent, 0)
+
+
+def publish_pending(batch_size=None):
+    """
+    Publish one batch of due tweets.
+
+    Failed posts are retried with exponential back-off; permanent client
+    errors (4xx other than 429) and posts that exhaust
+    settings.TWEET_MAX_ATTEMPTS are marked "dead". A 429 response defers
+    the rest of the batch until the API's rate-limit reset time.
+
+    Args:
+        batch_size (int, optional): The maximum number of tweets to post.
+            Defaults to settings.TWEET_BATCH_SIZE.
+
+    Returns:
+        dict: Counts of "sent", "retried" and "dead" tweets in this batch.
+    """
+    result = {"sent": 0, "retried": 0, "dead": 0}
+    tweeter = Tweet()
+    if tweeter.transport is None:
+        # No access token provisioned yet; leave everything queued.
+        return result
+    batch_size = min(
+        batch_size or setting("TWEET_BATCH_SIZE"), _rate_limit_slots()
+    )
+    if not batch_size:
+        return result
+    tweets = claim_due(OutboxTweet, batch_size, setting("TWEET_LEASE"))
+    if not tweets:
+        return result
+
+    max_attempts = setting("TWEET_MAX_ATTEMPTS")
+    for index, tweet in enumerate(tweets):
+        try:
+            with DELIVERY_SECONDS.time(channel="tweet"):
+                response = tweeter.make_tweet(tweet.text)
+        except TweetError as e:
+            if e.status_code == 429:
+                # Rate limited: give the attempts back and wait for the
+                # reset before touching the rest of the batch.
+                resume_at = e.retry_after or timezone.now() + timedelta(
+                    seconds=setting("TWEET_RATE_WINDOW")
+                )
+                for deferred in tweets[index:]:
+                    OutboxTweet.objects.filter(pk=deferred.pk).update(
+                        attempts=deferred.attempts - 1,
+                        next_attempt_at=resume_at,
+                        last_error=str(e),
+                    )
+                    result["retried"] += 1
+                break
+            dead = record_failure(
+                tweet,
+                e,
+                1 if e.permanent else max_attempts,
+                setting("TWEET_RETRY_DELAY"),
+                setting("TWEET_MAX_RETRY_DELAY"),
             )
-        )
-        json_response = response.json()
-        print(json.dumps(json_response, indent=4, sort_keys=True))
+        except Exception as e:
+            dead = record_failure(
+                tweet,
+                e,
+                max_attempts,
+                setting("TWEET_RETRY_DELAY"),
+                setting("TWEET_MAX_RETRY_DELAY"),
+            )
+        else:
+            tweet.tweet_id = str(response.get("data", {}).get("id", ""))
+            record_success(tweet, "tweet_id")
+            result["sent"] += 1
+            continue
+        if dead:
+            logger.error(
+                "Giving up on tweet #%s: %s", tweet.pk, tweet.last_error
+            )
+            result["dead"] += 1
+        else:
+            result["retried"] += 1
+    count_results("tweet", result)
+    return result
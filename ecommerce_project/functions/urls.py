@@ -0,0 +1,19 @@
+from django.urls import path
+from . import views
+
+app_name = "ops"
+
+urlpatterns = [
+    path("memory/", views.memory_samples, name="memory_samples"),
+    path("profiles/", views.profile_list, name="profile_list"),
+    path(
+        "profiles/<str:profile_id>/",
+        views.profile_detail,
+        name="profile_detail",
+    ),
+    path(
+        "profiles/<str:profile_id>/download/",
+        views.profile_download,
+        name="profile_download",
+    ),
+]
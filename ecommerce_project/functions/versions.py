@@ -0,0 +1,257 @@
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.db import transaction
+
+# Every VersionedLRU in this process, synced by VersionSyncMiddleware.
+_caches = weakref.WeakSet()
+
+
+def version_key(namespace):
+    """
+    Return the shared-cache key holding a namespace's version.
+
+    Namespaces are plain strings such as "catalog", "store:3" or
+    "product:42".
+    """
+    return f"ns:{namespace}"
+
+
+def _initial_version():
+    # Counters start at the current time rather than 0, so one that was
+    # evicted from the shared cache never comes back with an old value.
+    return time.time_ns() // 1000
+
+
+def get_with_versions(key, namespaces):
+    """
+    Read a shared-cache entry together with the versions of the namespaces
+    it depends on and the generation counter, in one round trip.
+
+    Args:
+        key (str): The entry's key.
+        namespaces (Iterable[str]): The namespaces.
+
+    Returns:
+        tuple: The entry (None if missing) and {namespace: version},
+        including "generation".
+    """
+    keys = {version_key(namespace): namespace for namespace in namespaces}
+    keys[version_key("generation")] = "generation"
+    found = cache.get_many([key, *keys])
+    return found.get(key), _versions(keys, found)
+
+
+def get_versions(namespaces):
+    """
+    Return the current version of each namespace, in one round trip to the
+    shared cache. Namespaces without a version yet are given one.
+
+    Args:
+        namespaces (Iterable[str]): The namespaces.
+
+    Returns:
+        dict: {namespace: version}.
+    """
+    keys = {version_key(namespace): namespace for namespace in namespaces}
+    return _versions(keys, cache.get_many(list(keys)))
+
+
+def _versions(keys, found):
+    """
+    Map the version keys read from the shared cache to their namespaces,
+    creating the missing ones.
+    """
+    versions = {}
+    for key, namespace in keys.items():
+        version = found.get(key)
+        if version is None:
+            cache.add(key, _initial_version(), None)
+            version = cache.get(key)
+        versions[namespace] = version
+    return versions
+
+
+def current_generation():
+    """
+    Return the change counter bumped by every ``bump``, so a process can
+    tell with one read whether any namespace changed since it last looked.
+    """
+    return get_versions(["generation"])["generation"]
+
+
+def _incr(key):
+    """
+    Increment a shared counter, creating it if it is missing.
+    """
+    cache.add(key, _initial_version(), None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr(): any new value is fine.
+        cache.set(key, _initial_version(), None)
+
+
+def bump(*namespaces):
+    """
+    Invalidate every cache entry that depends on one of ``namespaces``, in
+    every process.
+
+    The namespace versions change first and the generation last, so a
+    process that sees the new generation also sees the new versions.
+
+    Args:
+        *namespaces (str): The namespaces that changed.
+    """
+    for namespace in namespaces:
+        _incr(version_key(namespace))
+    _incr(version_key("generation"))
+
+
+def bump_on_commit(*namespaces):
+    """
+    Bump namespaces now and again once the current transaction commits.
+
+    The second bump drops anything another process cached from the old
+    rows while the transaction was still open.
+
+    Args:
+        *namespaces (str): The namespaces that changed.
+    """
+    bump(*namespaces)
+    transaction.on_commit(lambda: bump(*namespaces))
+
+
+class VersionedLRU:
+    """
+    A thread-safe, per-process LRU cache whose entries are invalidated by
+    namespace versions kept in the shared cache.
+
+    Each entry records the versions of the namespaces it was built from.
+    ``sync`` reads the shared generation counter (one cache read); only
+    when it moved does it fetch the versions of the namespaces in use and
+    drop the entries whose versions changed. So editing one product drops
+    exactly the entries that depend on it, in every worker, without
+    flushing anything else. VersionSyncMiddleware syncs every instance at
+    the start of each request.
+
+    The TTL bounds staleness where nothing syncs, such as in management
+    commands, or when the shared cache loses its counters.
+
+    Args:
+        max_entries (int): The most entries kept; the least recently used
+            entry is evicted first.
+        ttl (float): Seconds an entry stays valid.
+    """
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = None
+        _caches.add(self)
+
+    def get(self, key):
+        """
+        Return the cached value, or None if missing or expired.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, namespaces=(), versions=None):
+        """
+        Store a value that depends on ``namespaces``.
+
+        Args:
+            key: The cache key.
+            value: The value; must not be None.
+            namespaces (Iterable[str], optional): What the value was built
+                from.
+            versions (dict, optional): The versions of ``namespaces`` and
+                "generation", as returned by ``get_with_versions`` before
+                the value was built, so a change made while building it is
+                not missed. Read now if omitted.
+        """
+        if versions is None:
+            versions = get_versions([*namespaces, "generation"])
+        generation = versions["generation"]
+        versions = {name: versions[name] for name in namespaces}
+        with self._lock:
+            self._data[key] = (
+                value, time.monotonic() + self.ttl, versions, generation
+            )
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def sync(self, generation=None):
+        """
+        Drop the entries whose namespaces changed since they were cached.
+
+        Args:
+            generation (int, optional): The current generation, when the
+                caller already read it.
+        """
+        if generation is None:
+            generation = current_generation()
+        if generation == self._generation:
+            return
+        with self._lock:
+            entries = [
+                (key, entry[2])
+                for key, entry in self._data.items()
+                if entry[3] != generation
+            ]
+        namespaces = {name for _, deps in entries for name in deps}
+        versions = get_versions(namespaces) if namespaces else {}
+        with self._lock:
+            for key, deps in entries:
+                if any(versions[name] != deps[name] for name in deps):
+                    self._data.pop(key, None)
+        self._generation = generation
+
+    def __len__(self):
+        return len(self._data)
+
+
+def sync_all():
+    """
+    Sync every VersionedLRU in this process; costs one shared-cache read
+    unless something changed.
+    """
+    caches = list(_caches)
+    if caches:
+        generation = current_generation()
+        for local in caches:
+            local.sync(generation)
+
+
+class VersionSyncMiddleware:
+    """
+    Drop this process's cache entries that other processes invalidated,
+    before the request reads them.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sync_all()
+        return self.get_response(request)
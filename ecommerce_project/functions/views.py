@@ -0,0 +1,107 @@
+import io
+import pstats
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import FileResponse, Http404, HttpResponse
+from django.shortcuts import render
+
+from .conf import setting
+from .memprofile import summarize
+from .metrics import CONTENT_TYPE, allowed, registry
+from .models import MemorySample
+from .profiling import get_profile, list_profiles
+
+
+def prometheus_metrics(request):
+    """
+    Serve every process's metrics in the Prometheus text format (see
+    functions.metrics).
+    """
+    if not allowed(request):
+        return HttpResponse(status=403)
+    return HttpResponse(registry.exposition(), content_type=CONTENT_TYPE)
+
+
+@staff_member_required
+def memory_samples(request):
+    """
+    Summarize a release's memory samples per view, largest peak first,
+    and list its latest samples (see
+    functions.memprofile.MemoryProfilingMiddleware).
+
+    The release is settings.RELEASE unless "?release=" names another.
+    """
+    release = request.GET.get("release", setting("RELEASE"))
+    summary = sorted(
+        summarize(release).items(), key=lambda item: -item[1]["peak_kb"]
+    )
+    releases = (
+        MemorySample.objects.order_by("release")
+        .values_list("release", flat=True)
+        .distinct()
+    )
+    latest = MemorySample.objects.filter(release=release).order_by("-id")
+    return render(
+        request,
+        "functions/memory_samples.html",
+        {
+            "release": release,
+            "releases": list(releases),
+            "summary": summary,
+            "samples": latest[:50],
+        },
+    )
+
+
+@staff_member_required
+def profile_list(request):
+    """
+    List the profiled requests, newest first (see
+    functions.profiling.ProfilingMiddleware).
+    """
+    return render(
+        request, "functions/profile_list.html", {"profiles": list_profiles()}
+    )
+
+
+@staff_member_required
+def profile_detail(request, profile_id):
+    """
+    Show the hottest functions of a cProfile profile, or the hottest
+    stacks of a sampled one.
+    """
+    found = get_profile(profile_id)
+    if found is None:
+        raise Http404("No such profile.")
+    meta, path = found
+    if meta["mode"] == "cprofile":
+        output = io.StringIO()
+        stats = pstats.Stats(path, stream=output)
+        stats.strip_dirs().sort_stats("cumulative").print_stats(40)
+        summary = output.getvalue()
+    else:
+        with open(path) as source:
+            summary = "".join(source.readlines()[:40])
+    return render(
+        request,
+        "functions/profile_detail.html",
+        {"profile": meta, "summary": summary},
+    )
+
+
+@staff_member_required
+def profile_download(request, profile_id):
+    """
+    Download a profile: a pstats file (for snakeviz or 'python -m
+    pstats') or collapsed stacks (for flamegraph.pl or speedscope).
+    """
+    found = get_profile(profile_id)
+    if found is None:
+        raise Http404("No such profile.")
+    meta, path = found
+    try:
+        return FileResponse(
+            open(path, "rb"), as_attachment=True, filename=meta["file"]
+        )
+    except FileNotFoundError:
+        raise Http404("No such profile.")
@@ -0,0 +1,10 @@
+from django.urls import path
+from . import api_views
+
+urlpatterns = [
+    path(
+        "history/",
+        api_views.order_history,
+        name="api_order_history",
+    ),
+]
@@ -0,0 +1,40 @@
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from .serializers import OrderSerializer
+from .views import ORDER_HISTORY_PAGE_SIZE, buyer_orders
+from functions.pagination import keyset_page
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def order_history(request):
+    """
+    Retrieve a page of the authenticated user's orders, newest first.
+
+    Pages are keyset-paginated, so every page costs the same however deep
+    the buyer pages. Pass the returned "next" URL (or its cursor) to fetch
+    the following page.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Query Parameters:
+        cursor (str, optional): The cursor from the previous page.
+
+    Returns:
+        Response: A Response object containing "next" (the URL of the
+        following page, or None) and "results" (the serialized orders).
+    """
+    page = keyset_page(
+        buyer_orders(request.user),
+        request.query_params.get("cursor"),
+        ORDER_HISTORY_PAGE_SIZE,
+    )
+    next_url = None
+    if page.has_next:
+        next_url = request.build_absolute_uri(
+            f"{request.path}?cursor={page.next_cursor}"
+        )
+    serializer = OrderSerializer(page.items, many=True)
+    return Response({"next": next_url, "results": serializer.data})
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from orders.purchases import backfill_purchases, purchased
+from reviews.models import Review
+
+
+class Command(BaseCommand):
+    """
+    Build the purchase index used for verified reviews from past orders.
+
+    Checkout keeps the index up to date, so this only needs to run once
+    after deploying it. Existing rows are skipped, so it is safe to run
+    again. With --reverify the "verified" flag of every review is then
+    recomputed in a single UPDATE.
+
+    Usage:
+        python manage.py backfill_purchases
+        python manage.py backfill_purchases --reverify
+    """
+    help = "Backfill the purchase index from existing orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Rows inserted per statement.",
+        )
+        parser.add_argument(
+            "--reverify",
+            action="store_true",
+            help="Recompute Review.verified from the purchase index.",
+        )
+
+    def handle(self, *args, **options):
+        count = backfill_purchases(options["batch_size"])
+        self.stdout.write(f"Indexed {count} buyer/product pairs.")
+        if options["reverify"]:
+            updated = Review.objects.update(verified=purchased())
+            self.stdout.write(f"Re-verified {updated} reviews.")
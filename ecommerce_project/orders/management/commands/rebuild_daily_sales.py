@@ -0,0 +1,38 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from orders.rollups import rebuild_daily_sales
+
+
+class Command(BaseCommand):
+    """
+    Recompute the daily sales rollup from the order items.
+
+    Checkout keeps the rollup up to date, so this is only needed after
+    deploying the rollup for the first time, after editing orders by hand,
+    or to repair a range.
+
+    Usage:
+        python manage.py rebuild_daily_sales
+        python manage.py rebuild_daily_sales --since 2025-01-01
+    """
+    help = "Rebuild the DailySales rollup from OrderItem."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since",
+            type=date.fromisoformat,
+            default=None,
+            help="First day to rebuild (YYYY-MM-DD). Defaults to all.",
+        )
+        parser.add_argument(
+            "--until",
+            type=date.fromisoformat,
+            default=None,
+            help="Last day to rebuild (YYYY-MM-DD). Defaults to all.",
+        )
+
+    def handle(self, *args, **options):
+        count = rebuild_daily_sales(options["since"], options["until"])
+        self.stdout.write(f"Wrote {count} daily sales rows.")
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.7 on 2026-10-19 04:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_item_count(apps, schema_editor):
+    """
+    Store the number of units on every existing order.
+    """
+    Order = apps.get_model("orders", "Order")
+    for order in Order.objects.annotate(units=Sum("items__quantity")):
+        if order.units:
+            Order.objects.filter(pk=order.pk).update(item_count=order.units)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="item_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name="orderitem",
+            name="order",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="items",
+                to="orders.order",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["user", "-created_at", "-id"], name="order_user_created_idx"
+            ),
+        ),
+        migrations.RunPython(backfill_item_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 5.1.7 on 2026-10-19 04:16
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_vendor_fields(apps, schema_editor):
+    """
+    Copy the store, vendor and order time onto every existing order item.
+    """
+    OrderItem = apps.get_model("orders", "OrderItem")
+    Order = apps.get_model("orders", "Order")
+    Product = apps.get_model("products", "Product")
+    product = Product.objects.filter(pk=OuterRef("product_id"))
+    OrderItem.objects.update(
+        store_id=Subquery(product.values("store_id")[:1]),
+        vendor_id=Subquery(product.values("store__vendor_id")[:1]),
+        created_at=Subquery(
+            Order.objects.filter(pk=OuterRef("order_id")).values(
+                "created_at"
+            )[:1]
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0002_order_history"),
+        ("products", "0004_alter_product_image"),
+        ("store", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="orderitem",
+            name="created_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name="orderitem",
+            name="store",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="order_items",
+                to="store.store",
+            ),
+        ),
+        migrations.AddField(
+            model_name="orderitem",
+            name="vendor",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="sold_items",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.RunPython(
+            backfill_vendor_fields, migrations.RunPython.noop
+        ),
+        migrations.AddIndex(
+            model_name="orderitem",
+            index=models.Index(
+                fields=["store", "-created_at", "-id"],
+                name="orderitem_store_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="orderitem",
+            index=models.Index(
+                fields=["vendor", "-created_at", "-id"],
+                name="orderitem_vendor_created_idx",
+            ),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 from products.models import Product
+from store.models import Store
 
 
 class Order(models.Model):
@@ -16,6 +18,12 @@ class Order(models.Model):
             created.
         total (DecimalField): The total amount for the order, with a maximum
             of 10 digits and 2 decimal places. Defaults to 0.0.
+        item_count (PositiveIntegerField): The number of units in the order,
+            stored at checkout so order lists never count OrderItems.
+
+    Indexes:
+        (user, -created_at, -id): Serves the buyer's order history, newest
+            first, as an index range scan at any depth of pagination.
 
     Methods:
         __str__(): Returns a string representation of the order in the format
@@ -26,6 +34,15 @@ class Order(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0.0)
+    item_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "-created_at", "-id"],
+                name="order_user_created_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"Order #{self.id} by {self.user.username}"
@@ -37,8 +54,8 @@ class OrderItem(models.Model):
     specified quantity and price.
 
     Attributes:
-        order (ForeignKey): A reference to the associated Order.
-        Deletes the item if the order is deleted.
+        order (ForeignKey): A reference to the associated Order, available
+        as ``order.items``. Deletes the item if the order is deleted.
         product (ForeignKey): A reference to the associated Product.
         Deletes the item if the product is deleted.
         quantity (PositiveIntegerField): The number of units of the product
@@ -46,17 +63,136 @@ class OrderItem(models.Model):
         price (DecimalField): The price of the product at the time of the
             order, stored as a snapshot with up to 10 digits and 2 decimal
             places.
+        store (ForeignKey): The store that sold the product, copied from the
+            product at purchase time.
+        vendor (ForeignKey): The vendor who owned that store at purchase
+            time.
+        created_at (DateTimeField): The order's creation time, copied onto
+            the item so vendor lookups never join the order table.
+
+    Indexes:
+        (store, -created_at, -id): Serves a store's fulfilment list, newest
+            first, as an index range scan.
+        (vendor, -created_at, -id): The same across all of a vendor's
+            stores.
 
     Methods:
         __str__(): Returns a string representation of the order item in the
             format "quantity x product name".
     """
-    order = models.ForeignKey(Order, on_delete=models.CASCADE)
+    order = models.ForeignKey(
+        Order, on_delete=models.CASCADE, related_name="items"
+    )
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
     price = models.DecimalField(
         max_digits=10, decimal_places=2
     )  # Price snapshot
+    # Denormalised at purchase time for the vendor fulfilment list.
+    store = models.ForeignKey(
+        Store,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name="order_items",
+    )
+    vendor = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name="sold_items",
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["store", "-created_at", "-id"],
+                name="orderitem_store_created_idx",
+            ),
+            models.Index(
+                fields=["vendor", "-created_at", "-id"],
+                name="orderitem_vendor_created_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.quantity} x {self.product.name}"
+
+
+class DailySales(models.Model):
+    """
+    Units sold and revenue per store, product and day.
+
+    Rows are maintained at checkout (see ``orders.rollups.record_sales``) in
+    the same transaction as the order, so sales reports read a handful of
+    rows per day instead of aggregating the whole order history. The
+    ``rebuild_daily_sales`` management command recomputes them from
+    OrderItem.
+
+    Attributes:
+        store (ForeignKey): The store that made the sales.
+        product (ForeignKey): The product sold.
+        date (DateField): The day of the sales, in the project time zone.
+        units (PositiveIntegerField): The number of units sold that day.
+        revenue (DecimalField): The revenue from those units.
+
+    Constraints:
+        (store, date, product) is unique; its index also serves date range
+        reports for a store.
+    """
+    store = models.ForeignKey(
+        Store, on_delete=models.CASCADE, related_name="daily_sales"
+    )
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="daily_sales"
+    )
+    date = models.DateField()
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["store", "date", "product"],
+                name="daily_sales_store_date_product",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.store} / {self.product} on {self.date}"
+
+
+class Purchase(models.Model):
+    """
+    Records that a buyer has bought a product at least once.
+
+    Checkout writes one row per buyer and product (repeat purchases are
+    ignored by the unique constraint), so "has this buyer bought this
+    product?" is a single probe of the unique index instead of a join of
+    OrderItem and Order. Reviews use it for their "Verified Purchase"
+    badge.
+
+    Attributes:
+        buyer (ForeignKey): The user who bought the product.
+        product (ForeignKey): The product bought.
+        created_at (DateTimeField): When the buyer first bought it.
+    """
+    buyer = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="purchases"
+    )
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="purchases"
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["buyer", "product"], name="purchase_buyer_product"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.buyer} bought {self.product}"
@@ -0,0 +1,106 @@
+from django.db.models import Exists, Min, OuterRef
+
+from .models import OrderItem, Purchase
+
+
+def record_purchases(buyer, items):
+    """
+    Add the products of new order items to the buyer's purchase index.
+
+    Call this inside the checkout transaction. Products the buyer already
+    owns are skipped by the unique (buyer, product) constraint, so the
+    whole order is recorded in one INSERT with no prior lookups.
+
+    Args:
+        buyer (User): The buyer who placed the order.
+        items (Iterable[OrderItem]): The new order items.
+    """
+    Purchase.objects.bulk_create(
+        [
+            Purchase(
+                buyer=buyer,
+                product_id=item.product_id,
+                created_at=item.created_at,
+            )
+            for item in items
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def has_purchased(user, product):
+    """
+    Return True if ``user`` has bought ``product``.
+
+    A single existence probe of the (buyer, product) unique index.
+
+    Args:
+        user (User): The user to check.
+        product (Product | int): The product, or its id.
+
+    Returns:
+        bool: True if the user has bought the product.
+    """
+    if not user.is_authenticated:
+        return False
+    return Purchase.objects.filter(buyer=user, product=product).exists()
+
+
+def purchased(buyer="reviewer", product="product"):
+    """
+    Return an Exists() expression for use in annotate() or filter().
+
+    For example ``reviews.annotate(purchased=purchased())`` flags every
+    review whose author bought the product in the query that fetches the
+    reviews, with no per-review lookups.
+
+    Args:
+        buyer (str, optional): The outer field holding the buyer. Defaults
+            to "reviewer".
+        product (str, optional): The outer field holding the product.
+            Defaults to "product".
+
+    Returns:
+        Exists: The correlated existence subquery.
+    """
+    return Exists(
+        Purchase.objects.filter(
+            buyer=OuterRef(buyer), product=OuterRef(product)
+        )
+    )
+
+
+def backfill_purchases(batch_size=1000):
+    """
+    Build the purchase index from the existing order items.
+
+    Safe to run more than once: rows that already exist are skipped.
+
+    Args:
+        batch_size (int, optional): Rows inserted per statement. Defaults
+            to 1000.
+
+    Returns:
+        int: The number of (buyer, product) pairs found in the orders.
+    """
+    pairs = (
+        OrderItem.objects.values("order__user_id", "product_id")
+        .annotate(first=Min("created_at"))
+        .order_by("order__user_id", "product_id")
+    )
+    count = 0
+    batch = []
+    for pair in pairs.iterator(chunk_size=batch_size):
+        batch.append(
+            Purchase(
+                buyer_id=pair["order__user_id"],
+                product_id=pair["product_id"],
+                created_at=pair["first"],
+            )
+        )
+        if len(batch) >= batch_size:
+            Purchase.objects.bulk_create(batch, ignore_conflicts=True)
+            count += len(batch)
+            batch = []
+    Purchase.objects.bulk_create(batch, ignore_conflicts=True)
+    return count + len(batch)
@@ -0,0 +1,179 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import DailySales, OrderItem
+
+
+def record_sales(items):
+    """
+    Add order items to the daily sales rollup.
+
+    Call this inside the checkout transaction so the rollup commits or
+    rolls back with the order. Each (store, product, day) row is bumped
+    with an atomic ``F()`` update, so concurrent checkouts never lose
+    sales; the row is created on the first sale of the day.
+
+    Args:
+        items (Iterable[OrderItem]): The new order items. Items without a
+            store are skipped.
+    """
+    totals = defaultdict(lambda: [0, 0])
+    for item in items:
+        if item.store_id is None:
+            continue
+        day = timezone.localdate(item.created_at)
+        key = (item.store_id, item.product_id, day)
+        totals[key][0] += item.quantity
+        totals[key][1] += item.price * item.quantity
+
+    for (store_id, product_id, day), (units, revenue) in totals.items():
+        _bump(store_id, product_id, day, units, revenue)
+
+
+def _bump(store_id, product_id, day, units, revenue):
+    """
+    Add ``units`` and ``revenue`` to one rollup row, creating it if needed.
+    """
+    row = DailySales.objects.filter(
+        store_id=store_id, product_id=product_id, date=day
+    )
+    updates = {"units": F("units") + units, "revenue": F("revenue") + revenue}
+    if row.update(**updates):
+        return
+    try:
+        # The savepoint keeps the caller's transaction usable if another
+        # checkout creates the row first.
+        with transaction.atomic():
+            DailySales.objects.create(
+                store_id=store_id,
+                product_id=product_id,
+                date=day,
+                units=units,
+                revenue=revenue,
+            )
+    except IntegrityError:
+        row.update(**updates)
+
+
+def rebuild_daily_sales(start=None, end=None):
+    """
+    Recompute the daily sales rollup from OrderItem.
+
+    Rows in the date range are deleted and rebuilt in one transaction,
+    so reports never see a half-built range.
+
+    Args:
+        start (date, optional): The first day to rebuild. Defaults to the
+            first sale.
+        end (date, optional): The last day to rebuild. Defaults to the
+            latest sale.
+
+    Returns:
+        int: The number of rollup rows written.
+    """
+    items = OrderItem.objects.filter(store__isnull=False).annotate(
+        day=TruncDate("created_at")
+    )
+    rows = DailySales.objects.all()
+    if start:
+        items = items.filter(day__gte=start)
+        rows = rows.filter(date__gte=start)
+    if end:
+        items = items.filter(day__lte=end)
+        rows = rows.filter(date__lte=end)
+    totals = items.values("store_id", "product_id", "day").annotate(
+        total_units=Sum("quantity"),
+        total_revenue=Sum(F("price") * F("quantity")),
+    )
+    with transaction.atomic():
+        rows.delete()
+        created = DailySales.objects.bulk_create(
+            [
+                DailySales(
+                    store_id=row["store_id"],
+                    product_id=row["product_id"],
+                    date=row["day"],
+                    units=row["total_units"],
+                    revenue=row["total_revenue"],
+                )
+                for row in totals.order_by()
+            ],
+            batch_size=1000,
+        )
+    return len(created)
+
+
+def report_range(params, days=30):
+    """
+    Read a report's date range from request parameters.
+
+    Args:
+        params (QueryDict): The request's GET parameters; "start" and "end"
+            are optional YYYY-MM-DD dates.
+        days (int, optional): The length of the default range, ending
+            today. Defaults to 30.
+
+    Returns:
+        tuple[date, date]: The first and last day of the range. Missing or
+        malformed dates fall back to the default range.
+    """
+    try:
+        end = parse_date(params.get("end") or "")
+        start = parse_date(params.get("start") or "")
+    except ValueError:
+        start = end = None
+    end = end or timezone.localdate()
+    start = start or end - timedelta(days=days - 1)
+    if start > end:
+        start, end = end, start
+    return start, end
+
+
+def sales_report(stores, start, end, top=5):
+    """
+    Summarise sales for some stores over a date range, from the rollup only.
+
+    Every query reads the (store, date, product) index of DailySales, so
+    the cost depends on the number of days and products in the range, not
+    on how many orders were placed.
+
+    Args:
+        stores (QuerySet | Iterable[Store]): The stores to report on.
+        start (date): The first day of the range.
+        end (date): The last day of the range, inclusive.
+        top (int, optional): The number of top products. Defaults to 5.
+
+    Returns:
+        dict: "start", "end", "units", "revenue", "days" (a list of
+        {"date", "units", "revenue"}, one per day with sales) and
+        "top_products" (a list of {"product_id", "name", "units",
+        "revenue"}, best-selling by revenue first).
+    """
+    rows = DailySales.objects.filter(
+        store__in=stores, date__gte=start, date__lte=end
+    )
+    totals = rows.aggregate(units=Sum("units"), revenue=Sum("revenue"))
+    days = (
+        rows.values("date")
+        .annotate(units=Sum("units"), revenue=Sum("revenue"))
+        .order_by("date")
+    )
+    top_products = (
+        rows.values("product_id", name=F("product__name"))
+        .annotate(units=Sum("units"), revenue=Sum("revenue"))
+        .order_by("-revenue", "product_id")[:top]
+    )
+    return {
+        "start": start,
+        "end": end,
+        "units": totals["units"] or 0,
+        "revenue": totals["revenue"] or 0,
+        "days": list(days),
+        "top_products": list(top_products),
+    }
@@ -0,0 +1,48 @@
+from rest_framework import serializers
+from .models import Order, OrderItem
+
+
+class OrderItemSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the OrderItem model, nested inside OrderSerializer.
+
+    It includes the following fields:
+    - product: The id of the ordered product.
+    - product_name: The name of the ordered product.
+    - quantity: The number of units ordered.
+    - price: The unit price at the time of the order.
+    """
+    product_name = serializers.CharField(source="product.name")
+
+    class Meta:
+        model = OrderItem
+        fields = [
+            "product",
+            "product_name",
+            "quantity",
+            "price",
+        ]
+
+
+class OrderSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the Order model, used by the order history API.
+
+    It includes the following fields:
+    - id: The unique identifier for the order.
+    - created_at: When the order was placed.
+    - item_count: The number of units in the order.
+    - total: The order total.
+    - items: The order's items (prefetched by the view).
+    """
+    items = OrderItemSerializer(many=True)
+
+    class Meta:
+        model = Order
+        fields = [
+            "id",
+            "created_at",
+            "item_count",
+            "total",
+            "items",
+        ]
@@ -3,8 +3,10 @@ from django.urls import reverse
 from django.contrib.auth.models import User
 from products.models import Product
 from store.models import Store
-from .models import Order
+from .models import DailySales, Order, OrderItem
+from .rollups import rebuild_daily_sales
 from accounts.models import Profile
+from functions.models import OutboxEmail
 
 
 class OrdersTestCase(TestCase):
@@ -112,5 +114,163 @@ class OrdersTestCase(TestCase):
         response = self.client.get(reverse("orders:checkout"))
         self.assertEqual(response.status_code, 302)
         self.assertEqual(Order.objects.filter(user=self.buyer).count(), 1)
+        # The invoice is queued in the outbox rather than sent inline.
+        self.assertTrue(
+            OutboxEmail.objects.filter(to=["buyer@example.com"]).exists()
+        )
         session = self.client.session
         self.assertEqual(session.get("cart"), {})
+
+    def test_checkout_stores_item_count_and_total(self):
+        """
+        Test that checkout precomputes the order's item count and total,
+        and records the store and vendor on each item.
+        """
+        session = self.client.session
+        session["cart"] = {str(self.product.id): 3}
+        session.save()
+        self.client.login(username="buyer", password="pass123")
+        self.client.get(reverse("orders:checkout"))
+        order = Order.objects.get(user=self.buyer)
+        self.assertEqual(order.item_count, 3)
+        self.assertEqual(order.total, 30)
+        item = order.items.get()
+        self.assertEqual(item.store, self.store)
+        self.assertEqual(item.vendor, self.vendor)
+        self.assertEqual(item.created_at, order.created_at)
+
+    def test_out_of_stock_checkout_keeps_nothing(self):
+        """
+        Test that a checkout failing on a product out of stock rolls the
+        whole order back: no order, no items and no stock changes, even
+        for the products that were in stock.
+        """
+        sold_out = Product.objects.create(
+            store=self.store,
+            name="Sold Out",
+            description="Desc",
+            price=5.00,
+            stock=0,
+        )
+        session = self.client.session
+        session["cart"] = {str(self.product.id): 2, str(sold_out.id): 1}
+        session.save()
+        self.client.login(username="buyer", password="pass123")
+        response = self.client.get(reverse("orders:checkout"))
+        self.assertRedirects(response, reverse("orders:view_cart"))
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 10)
+        self.assertFalse(OutboxEmail.objects.exists())
+        # The cart is kept so the buyer can adjust it.
+        self.assertEqual(len(self.client.session["cart"]), 2)
+
+    def test_order_history_keyset_pages(self):
+        """
+        Test the buyer's order history page and API.
+
+        Creates 25 orders and checks that:
+        - The first page shows the 20 newest orders and a cursor link.
+        - Following the cursor shows the remaining 5 orders.
+        - Each page costs the same number of queries, with the items and
+          products of the page prefetched together.
+        - The API returns the same pages.
+        """
+        for i in range(25):
+            order = Order.objects.create(
+                user=self.buyer, total=10, item_count=1
+            )
+            OrderItem.objects.create(
+                order=order, product=self.product, quantity=1, price=10
+            )
+        newest = Order.objects.filter(user=self.buyer).latest("id")
+        self.client.login(username="buyer", password="pass123")
+
+        response = self.client.get(reverse("orders:order_history"))
+        self.assertEqual(response.status_code, 200)
+        page = response.context["page"]
+        self.assertEqual(len(page), 20)
+        self.assertEqual(page.items[0], newest)
+        self.assertTrue(page.has_next)
+
+        # Session, user, profile, orders, items + products.
+        with self.assertNumQueries(5):
+            response = self.client.get(
+                reverse("orders:order_history"),
+                {"cursor": page.next_cursor},
+            )
+        self.assertEqual(len(response.context["page"]), 5)
+        self.assertFalse(response.context["page"].has_next)
+
+        response = self.client.get(reverse("api_order_history"))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data["results"]), 20)
+        self.assertEqual(data["results"][0]["id"], newest.id)
+        self.assertEqual(
+            data["results"][0]["items"][0]["product_name"], "Test Product"
+        )
+        response = self.client.get(data["next"])
+        self.assertEqual(len(response.json()["results"]), 5)
+        self.assertIsNone(response.json()["next"])
+
+    def test_checkout_updates_daily_sales(self):
+        """
+        Test that each checkout adds to the daily sales rollup, and that
+        rebuilding the rollup from the order items gives the same figures.
+        """
+        self.client.login(username="buyer", password="pass123")
+        for quantity in (2, 3):
+            session = self.client.session
+            session["cart"] = {str(self.product.id): quantity}
+            session.save()
+            self.client.get(reverse("orders:checkout"))
+        row = DailySales.objects.get()
+        self.assertEqual(row.store, self.store)
+        self.assertEqual(row.product, self.product)
+        self.assertEqual(row.units, 5)
+        self.assertEqual(row.revenue, 50)
+
+        DailySales.objects.update(units=0, revenue=0)
+        self.assertEqual(rebuild_daily_sales(), 1)
+        row = DailySales.objects.get()
+        self.assertEqual((row.units, row.revenue), (5, 50))
+
+    def test_failed_checkout_leaves_rollup_matching_rebuild(self):
+        """
+        Test that a checkout failing on stock adds nothing to the daily
+        sales rollup nor to the order items it is rebuilt from, so the
+        live rollup and a rebuild agree.
+        """
+        sold_out = Product.objects.create(
+            store=self.store,
+            name="Sold Out",
+            description="Desc",
+            price=5.00,
+            stock=0,
+        )
+        self.client.login(username="buyer", password="pass123")
+        for cart in (
+            {str(self.product.id): 2},
+            {str(self.product.id): 3, str(sold_out.id): 1},
+        ):
+            session = self.client.session
+            session["cart"] = cart
+            session.save()
+            self.client.get(reverse("orders:checkout"))
+
+        def figures():
+            return sorted(
+                DailySales.objects.values_list(
+                    "product_id", "date", "units", "revenue"
+                )
+            )
+
+        live = figures()
+        self.assertEqual(
+            [(product, units) for product, _, units, _ in live],
+            [(self.product.id, 2)],
+        )
+        rebuild_daily_sales()
+        self.assertEqual(figures(), live)
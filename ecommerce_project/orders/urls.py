@@ -8,4 +8,5 @@ urlpatterns = [
     path("cart/", views.view_cart, name="view_cart"),
     path("checkout/", views.checkout, name="checkout"),
     path("remove/<int:product_id>/", views.remove_item, name="remove_item"),
+    path("history/", views.order_history, name="order_history"),
 ]
@@ -3,13 +3,30 @@ from accounts.decorators import (
     buyer_required,
 )  # Import buyer_required if it exists in accounts.decorators
 from products.models import Product
+from products.cache import get_product_or_404
 from .models import Order, OrderItem
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 # from django.urls import reverse
-from django.core.mail import EmailMessage
+from django.db import transaction
+from django.db.models import Prefetch
 from django.template.loader import render_to_string
 from django.conf import settings
+from functions.mail import queue_email
+from functions.metrics import registry
+from functions.pagination import keyset_page
+from functions.routers import use_primary
+from .rollups import record_sales
+from .purchases import record_purchases
+
+# Orders shown per page of the buyer's order history.
+ORDER_HISTORY_PAGE_SIZE = 20
+
+CHECKOUTS = registry.counter(
+    "checkouts_total",
+    "Checkouts by result: success, out_of_stock or empty_cart.",
+    ["result"],
+)
 
 
 @login_required
@@ -25,8 +42,10 @@ def add_to_cart(request, product_id):
 
     Retrieves the product using the provided product_id and validates
     the quantity submitted via the form. Ensures the quantity is at least 1
-    and does not exceed the available stock. Updates the cart stored in the
-    product and quantity.
+    and does not exceed the available stock. The product comes from the
+    product cache, so its stock may be a few seconds old; checkout checks
+    stock again on the primary database, inside its transaction. Updates
+    the cart stored in the session with the product and quantity.
 
     If the quantity is invalid or exceeds stock, an error message is displayed,
     and the user is redirected to the product detail page.
@@ -35,8 +54,9 @@ def add_to_cart(request, product_id):
     Returns:
         HttpResponseRedirect: Redirects the user to the product detail page.
     """
-    # Retrieve the product using the passed product_id
-    product = get_object_or_404(Product, id=product_id)
+    # Retrieve the product using the passed product_id. The stock check
+    # below may use a cached row; checkout checks stock again.
+    product = get_product_or_404(product_id)
 
     # Get the quantity from the form
     quantity_str = request.POST.get("quantity", "1")
@@ -109,6 +129,7 @@ def view_cart(request):
     )
 
 
+@use_primary
 @buyer_required
 @login_required(login_url="accounts:login")
 def checkout(request):
@@ -116,7 +137,7 @@ def checkout(request):
     Handles the checkout process for the user's cart.
     This function retrieves the cart from the session, creates an order,
     processes each item in the cart, updates product stock, calculates
-    the total cost, and sends an invoice email to the user. If the cart
+    the total cost, and queues an invoice email to the user. If the cart
     is empty or a product is out of stock, appropriate messages are displayed.
 
     Args:
@@ -133,16 +154,20 @@ def checkout(request):
            and redirect.
         3. Create a new order for the logged-in user.
         4. Iterate through the cart items:
-            - Retrieve the product and its price.
-            - Create an OrderItem for each product.
-            - Check stock availability.
-            - Update stock if sufficient.
-            - Handle out-of-stock scenarios with a warning message
-              and redirect.
+            - Retrieve the product, its price and its store.
+            - Check stock availability. If a product is short, roll the
+              whole order back (no order, items or stock changes are
+              kept), display a warning message and redirect to the cart.
+            - Create an OrderItem for each product, recording the store and
+              vendor so the vendor's fulfilment list needs no joins.
+            - Update the product's stock.
             - Calculate the total cost of the order.
-        5. Save the total cost to the order.
+        5. Save the total cost and the number of units to the order, add
+           the items to the daily sales rollup and record the products in
+           the buyer's purchase index (for verified reviews).
         6. Clear the cart from the session.
-        7. Generate and send an invoice email to the user.
+        7. Queue an invoice email in the outbox (sent by the
+           send_outbox_emails worker).
         8. Display a success message and redirect to the product list page.
 
     Raises:
@@ -150,41 +175,65 @@ def checkout(request):
     """
     cart = request.session.get("cart", {})
     if not cart:
+        CHECKOUTS.inc(result="empty_cart")
         messages.error(request, "Your cart is empty.")
         return redirect("products:product_list")
 
-    order = Order.objects.create(user=request.user)
-    total = 0
-    for product_id, quantity in cart.items():
-        product = get_object_or_404(Product, id=product_id)
-        price = product.price
-        OrderItem.objects.create(
-            order=order,
-            product=product,
-            quantity=quantity,
-            price=price
-        )
-        if product.stock >= quantity:
+    with transaction.atomic():
+        order = Order.objects.create(user=request.user)
+        total = 0
+        item_count = 0
+        items = []
+        for product_id, quantity in cart.items():
+            product = get_object_or_404(
+                Product.objects.select_related("store"), id=product_id
+            )
+            if product.stock < quantity:
+                # Returning normally would commit the block: roll back the
+                # order, the items created so far and their stock updates.
+                transaction.set_rollback(True)
+                CHECKOUTS.inc(result="out_of_stock")
+                messages.warning(request, f"{product.name} is out of stock.")
+                return redirect("orders:view_cart")
+            price = product.price
+            item = OrderItem.objects.create(
+                order=order,
+                product=product,
+                quantity=quantity,
+                price=price,
+                store=product.store,
+                vendor_id=product.store.vendor_id,
+                created_at=order.created_at,
+            )
             product.stock -= quantity
             product.save()
-        else:
-            messages.warning(request, f"{product.name} is out of stock.")
-            return redirect("orders:view_cart")
-            # handle partial order or fail the checkout
-        total += price * quantity
-
-    order.total = total
-    order.save()
+            items.append(item)
+            total += price * quantity
+            item_count += quantity
+
+        order.total = total
+        order.item_count = item_count
+        order.save()
+        record_sales(items)
+        record_purchases(request.user, items)
+
+        # Queue the invoice email in the same transaction as the order; the
+        # outbox worker delivers it, so checkout never waits on SMTP.
+        subject = f"Invoice for Order #{order.id}"
+        message = render_to_string(
+            "orders/invoice_email.html", {"order": order, "items": items}
+        )
+        queue_email(
+            subject,
+            message,
+            [request.user.email],
+            from_email=settings.EMAIL_HOST_USER,
+            html=True,
+        )
 
     # Clear the cart after checkout.
     request.session["cart"] = {}
-    # Generate and send invoice email.
-    subject = f"Invoice for Order #{order.id}"
-    message = render_to_string("orders/invoice_email.html", {"order": order})
-    email = EmailMessage(
-        subject, message, settings.EMAIL_HOST_USER, [request.user.email]
-    )
-    email.send()
+    CHECKOUTS.inc(result="success")
     messages.success(
         request, "Checkout complete. An invoice has been sent to your email."
     )
@@ -224,3 +273,50 @@ def remove_item(request, product_id):
     # IMPORTANT: Redirect to your cart display page, NOT the checkout route
     # or wherever you show the updated cart
     return redirect("orders:view_cart")
+
+
+def buyer_orders(user):
+    """
+    Return the buyer's orders with their items and products prefetched.
+
+    Ordering and pagination are left to ``keyset_page``, which walks the
+    (user, created_at, id) index newest first. The items of a whole page
+    are fetched, joined to their products, in a single extra query.
+
+    Args:
+        user (User): The buyer whose orders are listed.
+
+    Returns:
+        QuerySet: The buyer's orders.
+    """
+    return Order.objects.filter(user=user).prefetch_related(
+        Prefetch(
+            "items", queryset=OrderItem.objects.select_related("product")
+        )
+    )
+
+
+@login_required(login_url="accounts:login")
+@buyer_required
+def order_history(request):
+    """
+    Display the logged-in buyer's past orders, newest first.
+
+    Pages are keyset-paginated: the "Older orders" link carries an opaque
+    cursor for the last order shown, so every page costs the same however
+    many orders the buyer has placed. Each order shows its precomputed
+    item count and total.
+
+    Args:
+        request (HttpRequest): The HTTP request object. The optional
+            ``cursor`` query parameter selects the page.
+
+    Returns:
+        HttpResponse: The rendered "orders/order_history.html" template.
+    """
+    page = keyset_page(
+        buyer_orders(request.user),
+        request.GET.get("cursor"),
+        ORDER_HISTORY_PAGE_SIZE,
+    )
+    return render(request, "orders/order_history.html", {"page": page})
@@ -13,6 +13,18 @@ class ProductsConfig(AppConfig):
             models in this app. Defaults to "django.db.models.BigAutoField".
         name (str): The full Python path to the application, in this case,
             "products".
+
+    Methods:
+        ready():
+            Imports `products.signals` so saving or deleting a product
+            invalidates the product cache.
     """
     default_auto_field = "django.db.models.BigAutoField"
     name = "products"
+
+    def ready(self):
+        """
+        Register the signal handlers that keep the product cache in step
+        with the Product table.
+        """
+        import products.signals  # noqa: F401
@@ -0,0 +1,248 @@
+import copy
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.http import Http404
+
+from functions.conf import setting
+from functions.versions import VersionedLRU, bump_on_commit, get_with_versions
+from .models import Product
+
+# Stored in the caches for ids with no product, so repeated 404s are cached.
+_MISSING = "missing"
+
+
+class ProductCache:
+    """
+    Read-through cache of Product rows: a per-process LRU (tier 1) in front
+    of the shared Django cache (tier 2), in front of the database.
+
+    Each product has a namespace version ("product:<id>", see
+    functions.versions), bumped by ``invalidate`` when the product is
+    saved or deleted. Shared entries carry the version they were built
+    from and are ignored once it is out of date, so a rebuild that raced
+    with a save can never put the old row back. Local entries are dropped
+    in every process by VersionSyncMiddleware.
+
+    When a product is missing from both tiers one caller, holding a short
+    lock in the shared cache, reads the database and fills the cache. The
+    others serve the out-of-date entry if there is one, or wait for the
+    rebuild (up to settings.PRODUCT_CACHE_WAIT seconds) before giving up
+    and reading the database themselves.
+
+    Hits and misses are counted per tier; see ``stats``.
+    """
+    def __init__(self):
+        self.local = VersionedLRU(
+            setting("PRODUCT_CACHE_LOCAL_SIZE"),
+            setting("PRODUCT_CACHE_LOCAL_TTL"),
+        )
+        self._lock = threading.Lock()
+        self._counters = {
+            "local_hits": 0,
+            "shared_hits": 0,
+            "misses": 0,
+            "stale_hits": 0,
+            "waits": 0,
+        }
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def get(self, product_id):
+        """
+        Return a copy of the product with this id, or None if there is no
+        such product.
+
+        Args:
+            product_id (int | str): The product's primary key.
+
+        Returns:
+            Product | None: The product.
+        """
+        product_id = int(product_id)
+        value = self.local.get(product_id)
+        if value is not None:
+            self._count("local_hits")
+            return self._copy(value)
+
+        # The entry and its namespace share a name; the version lives under
+        # functions.versions.version_key(namespace).
+        data_key = namespace = f"product:{product_id}"
+        deadline = None
+        while True:
+            entry, versions = get_with_versions(data_key, [namespace])
+            if entry is not None and entry[0] == versions[namespace]:
+                self._count("shared_hits")
+                self.local.set(product_id, entry[1], [namespace], versions)
+                return self._copy(entry[1])
+            lock_key = f"{data_key}:lock"
+            if cache.add(lock_key, 1, setting("PRODUCT_CACHE_LOCK")):
+                try:
+                    return self._copy(
+                        self._rebuild(product_id, namespace, versions)
+                    )
+                finally:
+                    cache.delete(lock_key)
+            if entry is not None:
+                # Someone else is rebuilding: the previous version is
+                # good enough for the next few milliseconds.
+                self._count("stale_hits")
+                return self._copy(entry[1])
+            now = time.monotonic()
+            if deadline is None:
+                self._count("waits")
+                deadline = now + setting("PRODUCT_CACHE_WAIT")
+            elif now >= deadline:
+                # The rebuilder is slow or died; do not pile up behind it.
+                return self._copy(self._load(product_id))
+            time.sleep(0.02)
+
+    def _load(self, product_id):
+        """
+        Read the product from the database (a cache miss).
+        """
+        self._count("misses")
+        # Views check product.store (its vendor, its name) on most reads.
+        products = Product.objects.select_related("store")
+        product = products.filter(pk=product_id).first()
+        return product if product is not None else _MISSING
+
+    def _rebuild(self, product_id, namespace, versions):
+        """
+        Load the product and store it in both tiers, tagged with the
+        versions read before the database query.
+        """
+        value = self._load(product_id)
+        cache.set(
+            f"product:{product_id}",
+            (versions[namespace], value),
+            setting("PRODUCT_CACHE_TTL"),
+        )
+        self.local.set(product_id, value, [namespace], versions)
+        return value
+
+    @staticmethod
+    def _copy(value):
+        # Callers may modify and save the product; never hand out the
+        # cached instance itself.
+        return None if value == _MISSING else copy.copy(value)
+
+    def invalidate(self, product_id):
+        """
+        Drop a product from this process's local tier and the shared tier.
+
+        Other processes drop it from their local tier on their next
+        request, when they see the product's namespace version change; the
+        caller bumps it (see ``invalidate_product``).
+        """
+        product_id = int(product_id)
+        self.local.delete(product_id)
+        cache.delete(f"product:{product_id}")
+
+    def stats(self):
+        """
+        Return this process's hit counters and hit ratios.
+
+        Returns:
+            dict: "local_hits", "shared_hits", "stale_hits", "misses" and
+            "waits", plus "local_ratio" and "shared_ratio" (the share of
+            lookups answered by each tier).
+        """
+        with self._lock:
+            stats = dict(self._counters)
+        lookups = (
+            stats["local_hits"]
+            + stats["shared_hits"]
+            + stats["stale_hits"]
+            + stats["misses"]
+        )
+        stats["local_ratio"] = stats["local_hits"] / lookups if lookups else 0
+        stats["shared_ratio"] = (
+            (stats["shared_hits"] + stats["stale_hits"]) / lookups
+            if lookups
+            else 0
+        )
+        return stats
+
+    def reset(self):
+        """
+        Clear the local tier and the counters (used by tests).
+        """
+        self.local.clear()
+        with self._lock:
+            for name in self._counters:
+                self._counters[name] = 0
+
+
+product_cache = ProductCache()
+
+
+def get_product_or_404(product_id):
+    """
+    Return the product with this id from the product cache.
+
+    A drop-in replacement for ``get_object_or_404(Product, id=product_id)``
+    on read-mostly views.
+
+    Raises:
+        Http404: If there is no such product.
+    """
+    product = product_cache.get(product_id)
+    if product is None:
+        raise Http404("No Product matches the given query.")
+    return product
+
+
+def product_namespaces(product_id, store_id=None):
+    """
+    Return the version namespaces a product's changes invalidate: the
+    product, its store and the whole catalog.
+    """
+    namespaces = [f"product:{product_id}", "catalog"]
+    if store_id is not None:
+        namespaces.append(f"store:{store_id}")
+    return namespaces
+
+
+def invalidate_product(product_id, store_id=None):
+    """
+    Invalidate a product in every process, now and again once the current
+    transaction commits.
+
+    The second invalidation drops anything a reader re-cached from the old
+    row while the transaction was still open. Outside a transaction both
+    run at once.
+
+    Args:
+        product_id (int): The saved or deleted product.
+        store_id (int, optional): Its store, whose namespace is bumped too.
+    """
+    product_cache.invalidate(product_id)
+    bump_on_commit(*product_namespaces(product_id, store_id))
+    transaction.on_commit(lambda: product_cache.invalidate(product_id))
+
+
+def invalidate_store_products(store_id):
+    """
+    Invalidate the cached products of a store in every process, now and
+    again once the current transaction commits. Cached products carry
+    their store row, so a saved store makes them stale.
+
+    Args:
+        store_id (int): The saved store.
+    """
+    product_ids = list(
+        Product.objects.filter(store_id=store_id).values_list("pk", flat=True)
+    )
+
+    def invalidate():
+        for product_id in product_ids:
+            product_cache.invalidate(product_id)
+
+    invalidate()
+    bump_on_commit(*(f"product:{product_id}" for product_id in product_ids))
+    transaction.on_commit(invalidate)
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.7 on 2026-10-19 05:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0004_alter_product_image"),
+        ("store", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["store", "price"], name="product_store_price_idx"
+            ),
+        ),
+    ]
@@ -18,5 +18,13 @@ class Product(models.Model):
         default=0, help_text="Number of items in stock."
     )
 
+    class Meta:
+        indexes = [
+            # A store's products by price, without sorting the store.
+            models.Index(
+                fields=["store", "price"], name="product_store_price_idx"
+            ),
+        ]
+
     def __str__(self):
         return self.name
\ No newline at end of file
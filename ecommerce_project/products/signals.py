@@ -0,0 +1,30 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .cache import invalidate_product
+from .models import Product
+
+
+@receiver(post_save, sender=Product)
+def invalidate_on_save(sender, instance, **kwargs):
+    """
+    Signal handler that drops a saved product from the product cache.
+
+    Args:
+        sender (type): The model class that sent the signal.
+        instance (Product): The product that was saved.
+        **kwargs: Additional keyword arguments passed by the signal.
+    """
+    invalidate_product(instance.pk, instance.store_id)
+
+
+@receiver(post_delete, sender=Product)
+def invalidate_on_delete(sender, instance, **kwargs):
+    """
+    Signal handler that drops a deleted product from the product cache.
+
+    Args:
+        sender (type): The model class that sent the signal.
+        instance (Product): The product that was deleted.
+        **kwargs: Additional keyword arguments passed by the signal.
+    """
+    invalidate_product(instance.pk, instance.store_id)
@@ -1,8 +1,11 @@
+from django.core.cache import cache
 from django.test import TestCase, Client
 from django.urls import reverse
 from django.contrib.auth.models import User
 from store.models import Store
+from reviews.models import Review
 from .models import Product
+from .cache import product_cache
 
 
 class ProductsTestCase(TestCase):
@@ -23,6 +26,15 @@ class ProductsTestCase(TestCase):
     - test_product_detail: Ensures that the product detail view is accessible,
       returns a status code of 200, and displays the correct product
       description in the response.
+
+    - test_product_cache: Checks that product lookups are answered by the
+      local and shared cache tiers and that saves and deletes invalidate
+      both.
+
+    - test_shared_page_cache: Checks that product pages are served from the
+      shared page cache to visitors and logged-in users alike, purged by
+      product and review changes only, with the per-user parts loaded
+      separately.
     """
     def setUp(self):
         """
@@ -78,3 +90,100 @@ class ProductsTestCase(TestCase):
         )
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, self.product.description)
+
+    def test_product_cache(self):
+        """
+        Test the two-tier product cache.
+
+        The first lookup reads the database, the next is answered by the
+        local tier and, once that is cleared, by the shared tier. Saving
+        the product must replace it in both tiers and deleting it must
+        make lookups return None.
+        """
+        cache.clear()
+        product_cache.reset()
+        with self.assertNumQueries(1):
+            product_cache.get(self.product.id)
+        with self.assertNumQueries(0):
+            cached = product_cache.get(self.product.id)
+            product_cache.local.clear()
+            product_cache.get(self.product.id)
+            # The store comes with the product.
+            self.assertEqual(cached.store.vendor_id, self.store.vendor_id)
+        self.assertEqual(cached.name, "Test Product")
+        stats = product_cache.stats()
+        self.assertEqual(
+            (stats["misses"], stats["local_hits"], stats["shared_hits"]),
+            (1, 1, 1),
+        )
+        # Changing the returned copy must not change the cached product.
+        cached.name = "Changed"
+        self.assertEqual(
+            product_cache.get(self.product.id).name, "Test Product"
+        )
+
+        self.product.name = "Renamed Product"
+        self.product.save()
+        self.assertEqual(
+            product_cache.get(self.product.id).name, "Renamed Product"
+        )
+        self.store.name = "Renamed Store"
+        self.store.save()
+        self.assertEqual(
+            product_cache.get(self.product.id).store.name, "Renamed Store"
+        )
+        self.product.delete()
+        self.assertIsNone(product_cache.get(cached.id))
+
+    def test_shared_page_cache(self):
+        """
+        Test the full-page cache of product pages.
+
+        The second anonymous visit is served without touching the database
+        and carries the page's surrogate keys. Changing another vendor's
+        store and products keeps the page; changing this product or one of
+        its reviews purges it. A logged-in user gets the same cached page
+        once the signed-in cookie is set, and their buttons from the
+        fragments endpoint.
+        """
+        cache.clear()
+        url = reverse("products:product_detail", args=[self.product.id])
+        self.assertEqual(self.client.get(url)["X-Page-Cache"], "miss")
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response["X-Page-Cache"], "hit")
+        self.assertContains(response, "Test Product")
+        self.assertIn(f"product:{self.product.id}", response["Surrogate-Key"])
+        self.assertIn("public", response["Cache-Control"])
+
+        other = User.objects.create_user(username="other", password="x")
+        other_store = Store.objects.create(vendor=other, name="Other")
+        Product.objects.create(store=other_store, name="Other", price=1)
+        self.assertEqual(self.client.get(url)["X-Page-Cache"], "hit")
+        self.product.price = 12
+        self.product.save()
+        self.assertEqual(self.client.get(url)["X-Page-Cache"], "miss")
+        Review.objects.create(
+            product=self.product, reviewer=self.vendor, rating=5, title="Ok"
+        )
+        response = self.client.get(url)
+        self.assertEqual(response["X-Page-Cache"], "miss")
+        self.assertContains(response, "Ok")
+
+        self.client.login(username="vendor", password="pass123")
+        response = self.client.get(url)
+        self.assertNotIn("X-Page-Cache", response)
+        self.assertContains(response, "Welcome, vendor")
+        self.assertIn("signed_in", response.cookies)
+        response = self.client.get(url)
+        self.assertEqual(response["X-Page-Cache"], "hit")
+        self.assertNotContains(response, "Welcome, vendor")
+
+        response = self.client.get(
+            reverse("accounts:fragments"),
+            {"names": "nav,product_actions", "product": self.product.id},
+        )
+        fragments = response.json()["fragments"]
+        self.assertIn("Welcome, vendor", fragments["nav"])
+        self.assertIn("Edit", fragments["product_actions"])
+        self.assertIn("no-store", response["Cache-Control"])
@@ -3,34 +3,47 @@ from django.contrib.auth.decorators import login_required
 from accounts.decorators import vendor_required  # Import vendor_required
 # decorator
 from .models import Product
+from .cache import get_product_or_404
 from .forms import ProductForm
 from store.models import Store
 # from django.urls import reverse
 from django.contrib import messages
-from functions.tweet import Tweet  # For tweeting new products (Phase 2)
+from functions.tweet import queue_tweet  # Tweets new products (Phase 2)
+from functions.pagecache import cache_shared_page, tag_page
 from django.contrib.auth.models import User
 
 
+@cache_shared_page
 def product_list(request):
     """
     Handles the retrieval and display of a list of products.
 
+    Served from the shared page cache until any product or store changes.
+    The page must not depend on the user: see functions.pagecache.
+
     Args:
         request (HttpRequest): The HTTP request object.
 
     Returns:
         HttpResponse: A rendered HTML page displaying the list of products.
     """
-    products = Product.objects.all()
+    tag_page(request, "catalog")
+    # Each card links to its vendor.
+    products = Product.objects.select_related("store__vendor")
     return render(
         request, "products/product_list.html", {"products": products}
     )
 
 
+@cache_shared_page
 def product_detail(request, product_id):
     """
     View function to display the details of a specific product.
 
+    Served from the shared page cache until the product, its reviews, its
+    store or its vendor changes. The vendor and buyer buttons are per-user
+    fragments (see accounts.views.user_fragments).
+
     Args:
         request (HttpRequest): The HTTP request object.
         product_id (int): The unique identifier of the product to retrieve.
@@ -41,9 +54,20 @@ def product_detail(request, product_id):
     Raises:
         Http404: If the product with the given ID does not exist.
     """
-    product = get_object_or_404(Product, id=product_id)
+    tag_page(request, f"product:{product_id}", f"product:{product_id}:reviews")
+    product = get_product_or_404(product_id)
+    tag_page(
+        request,
+        f"store:{product.store_id}",
+        f"vendor:{product.store.vendor_id}",
+    )
+    reviews = product.reviews.select_related("reviewer").order_by(
+        "-created_at"
+    )
     return render(
-        request, "products/product_detail.html", {"product": product}
+        request,
+        "products/product_detail.html",
+        {"product": product, "reviews": reviews},
     )
 
 
@@ -68,7 +92,8 @@ def create_product(request, store_id):
         2. If the request method is POST:
             - Validates the submitted ProductForm.
             - Saves the new product instance and associates it with the store.
-            - Optionally attempts to tweet about the new product.
+            - Queues a tweet about the new product for the publish_tweets
+              worker.
             - Displays a success message and redirects to the vendor dashboard.
         3. If the request method is not POST:
             - Displays an empty ProductForm for the user to fill out.
@@ -77,10 +102,6 @@ def create_product(request, store_id):
         Renders the "products/product_form.html" template with the form
         and store context. This includes the form data and the store
         information for rendering the template.
-
-    Exceptions:
-        - If the tweet about the new product fails, logs the error and
-          continues without interrupting the flow.
     """
     store = get_object_or_404(Store, id=store_id, vendor=request.user)
     if request.method == "POST":
@@ -95,11 +116,8 @@ def create_product(request, store_id):
                 f"{product.name}\n"
                 f"{product.description}"
             )
-            tweet_data = {"text": new_product_tweet}
-            try:
-                Tweet().make_tweet(tweet_data)
-            except Exception as e:
-                print("Tweet failed:", e)
+            # Queued for the publish_tweets worker; never waits on Twitter.
+            queue_tweet(new_product_tweet)
             messages.success(request, "Product created successfully.")
             return redirect("store:vendor_dashboard")
     else:
@@ -140,7 +158,11 @@ def edit_product(request, product_id):
             - Displays the product form pre-filled with the product's current
               details.
     """
-    product = get_object_or_404(Product, id=product_id)
+    # Forms are saved over the fresh row; the cached copy may be seconds old.
+    if request.method == "POST":
+        product = get_object_or_404(Product, id=product_id)
+    else:
+        product = get_product_or_404(product_id)
 
     # Check if current user owns this product
     if product.store.vendor != request.user:
@@ -186,7 +208,10 @@ def delete_product(request, product_id):
             deletion or access denial, or a rendered confirmation page
             for GET requests.
     """
-    product = get_object_or_404(Product, id=product_id)
+    if request.method == "POST":
+        product = get_object_or_404(Product, id=product_id)
+    else:
+        product = get_product_or_404(product_id)
 
     # Check if current user owns this product
     if product.store.vendor != request.user:
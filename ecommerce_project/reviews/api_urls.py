@@ -7,4 +7,14 @@ urlpatterns = [
         api_views.list_reviews,
         name="api_list_reviews",
     ),
+    path(
+        "summary/<int:product_id>/",
+        api_views.review_summary,
+        name="api_review_summary",
+    ),
+    path(
+        "summary/",
+        api_views.review_summaries,
+        name="api_review_summaries",
+    ),
 ]
@@ -1,13 +1,34 @@
+from django.utils.cache import patch_cache_control
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
+from rest_framework import status
+from functions.conf import setting
 from .serializers import ReviewSerializer
-from .models import Review
+from .models import ProductRating, Review
+from .ratings import summary
+
+# Product ids accepted by one batch summary request.
+MAX_SUMMARY_IDS = 100
+
+
+def _cached(response):
+    """
+    Let browsers and shared caches reuse a rating summary for
+    settings.REVIEW_SUMMARY_MAX_AGE seconds.
+    """
+    patch_cache_control(
+        response,
+        public=True,
+        max_age=setting("REVIEW_SUMMARY_MAX_AGE"),
+    )
+    return response
 
 
 @api_view(["GET"])
 def list_reviews(request, product_id):
     """
-    Retrieve and return a list of reviews for a specific product.
+    Retrieve and return a list of reviews for a specific product, newest
+    first.
 
     Args:
         request (HttpRequest): The HTTP request object.
@@ -18,6 +39,72 @@ def list_reviews(request, product_id):
         Response: A Response object containing serialized review data
         for the specified product.
     """
-    reviews = Review.objects.filter(product__id=product_id)
+    reviews = Review.objects.filter(product__id=product_id).order_by(
+        "-created_at"
+    )
     serializer = ReviewSerializer(reviews, many=True)
     return Response(serializer.data)
+
+
+@api_view(["GET"])
+def review_summary(request, product_id):
+    """
+    Retrieve the review count, average rating and 1-5 star histogram of a
+    product.
+
+    The figures come from the product's maintained ProductRating row (one
+    primary-key lookup), never from the Review table. The response may be
+    cached for a short time.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+        product_id (int): The ID of the product.
+
+    Returns:
+        Response: A Response object containing "product", "count",
+        "average" (None when there are no reviews) and "histogram".
+    """
+    rating = ProductRating.objects.filter(product_id=product_id).first()
+    return _cached(Response(summary(rating, product_id)))
+
+
+@api_view(["GET"])
+def review_summaries(request):
+    """
+    Retrieve the rating summaries of many products in one request.
+
+    All the ProductRating rows are fetched with a single primary-key
+    lookup, so listing pages can draw every product's stars at once.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Query Parameters:
+        ids (str): Comma-separated product IDs, at most 100.
+
+    Returns:
+        Response: A Response object containing a list of summaries, one
+        per requested product in the order given, or an error message with
+        a 400 BAD REQUEST status if ``ids`` is missing, malformed or too
+        long.
+    """
+    try:
+        ids = [
+            int(product_id)
+            for product_id in request.query_params.get("ids", "").split(",")
+            if product_id.strip()
+        ]
+    except ValueError:
+        ids = []
+    if not ids or len(ids) > MAX_SUMMARY_IDS:
+        return Response(
+            {
+                "error": "Pass between 1 and "
+                f"{MAX_SUMMARY_IDS} comma-separated product ids."
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    ids = list(dict.fromkeys(ids))
+    ratings = ProductRating.objects.in_bulk(ids)
+    summaries = [summary(ratings.get(pk), pk) for pk in ids]
+    return _cached(Response(summaries))
@@ -14,6 +14,18 @@ class ReviewsConfig(AppConfig):
             "django.db.models.BigAutoField".
         name (str): The full Python path to the application,
             in this case "reviews".
+
+    Methods:
+        ready():
+            Imports `reviews.signals` so the handlers that maintain the
+            products' rating totals are registered.
     """
     default_auto_field = "django.db.models.BigAutoField"
     name = "reviews"
+
+    def ready(self):
+        """
+        Register the signal handlers that keep ProductRating rows in step
+        with reviews.
+        """
+        import reviews.signals  # noqa: F401
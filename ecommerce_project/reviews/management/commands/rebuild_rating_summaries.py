@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from reviews.ratings import rebuild_rating_summaries
+
+
+class Command(BaseCommand):
+    """
+    Recompute every product's rating totals from the reviews.
+
+    The totals are maintained by signal handlers as reviews change, so
+    this is only needed after changing reviews with queryset.update() or
+    raw SQL (which send no signals).
+
+    Usage:
+        python manage.py rebuild_rating_summaries
+    """
+    help = "Rebuild the ProductRating totals from the Review table."
+
+    def handle(self, *args, **options):
+        count = rebuild_rating_summaries()
+        self.stdout.write(f"Rebuilt ratings for {count} products.")
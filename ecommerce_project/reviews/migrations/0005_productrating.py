@@ -0,0 +1,62 @@
+# Generated by Django 5.1.7 on 2026-10-19 04:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_ratings(apps, schema_editor):
+    """
+    Compute the rating totals of every product that already has reviews.
+    """
+    Review = apps.get_model("reviews", "Review")
+    ProductRating = apps.get_model("reviews", "ProductRating")
+    totals = (
+        Review.objects.values("product_id")
+        .annotate(
+            count=Count("id"),
+            total=Sum("rating"),
+            **{
+                f"star_{rating}": Count("id", filter=Q(rating=rating))
+                for rating in range(1, 6)
+            },
+        )
+        .order_by()
+    )
+    ProductRating.objects.bulk_create(
+        [ProductRating(**row) for row in totals], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0004_alter_product_image"),
+        ("reviews", "0004_alter_review_rating"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductRating",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="rating",
+                        serialize=False,
+                        to="products.product",
+                    ),
+                ),
+                ("count", models.PositiveIntegerField(default=0)),
+                ("total", models.PositiveIntegerField(default=0)),
+                ("star_1", models.PositiveIntegerField(default=0)),
+                ("star_2", models.PositiveIntegerField(default=0)),
+                ("star_3", models.PositiveIntegerField(default=0)),
+                ("star_4", models.PositiveIntegerField(default=0)),
+                ("star_5", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
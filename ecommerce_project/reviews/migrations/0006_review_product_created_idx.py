@@ -0,0 +1,22 @@
+# Generated by Django 5.1.7 on 2026-10-19 05:01
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0005_product_store_price_idx"),
+        ("reviews", "0005_productrating"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="review",
+            index=models.Index(
+                fields=["product", "-created_at"], name="review_product_created_idx"
+            ),
+        ),
+    ]
@@ -27,6 +27,10 @@ class Review(models.Model):
         verified (BooleanField): Indicates whether the reviewer purchased
         the product (default is False).
 
+    Indexes:
+        (product, -created_at): Serves a product's reviews, newest first,
+        without sorting them.
+
     Methods:
         __str__(): Returns a string representation of the review, including
         the product name and reviewer username.
@@ -49,5 +53,61 @@ class Review(models.Model):
         default=False
     )  # True if the reviewer purchased the product
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["product", "-created_at"],
+                name="review_product_created_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"Review for {self.product.name} by {self.reviewer.username}"
+
+
+class ProductRating(models.Model):
+    """
+    Running review totals for one product.
+
+    The row is kept up to date by the signal handlers in reviews.signals
+    whenever a review is created, edited or deleted, so rating summaries
+    are a primary-key lookup and never read the Review table. The
+    ``rebuild_rating_summaries`` management command recomputes the rows.
+
+    Attributes:
+        product (OneToOneField): The product, also the primary key.
+        count (PositiveIntegerField): The number of reviews.
+        total (PositiveIntegerField): The sum of all ratings.
+        star_1 ... star_5 (PositiveIntegerField): The number of reviews
+            with each rating.
+
+    Methods:
+        average(): Returns the mean rating, or None with no reviews.
+        histogram(): Returns {rating: number of reviews} for ratings 1-5.
+    """
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="rating",
+    )
+    count = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    star_1 = models.PositiveIntegerField(default=0)
+    star_2 = models.PositiveIntegerField(default=0)
+    star_3 = models.PositiveIntegerField(default=0)
+    star_4 = models.PositiveIntegerField(default=0)
+    star_5 = models.PositiveIntegerField(default=0)
+
+    def average(self):
+        if not self.count:
+            return None
+        return round(self.total / self.count, 2)
+
+    def histogram(self):
+        return {
+            rating: getattr(self, f"star_{rating}") for rating in range(1, 6)
+        }
+
+    def __str__(self):
+        return f"Rating for product #{self.product_id}"
@@ -0,0 +1,98 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import ProductRating, Review
+
+
+def apply_rating_change(product_id, old=None, new=None):
+    """
+    Move one review's rating into the product's running totals.
+
+    Pass ``new`` alone for a new review, ``old`` alone for a deleted one
+    and both for an edit. The row is changed with a single ``F()`` update
+    so concurrent reviews never lose counts; it is created on the
+    product's first review.
+
+    Args:
+        product_id (int): The reviewed product.
+        old (int, optional): The rating before the change.
+        new (int, optional): The rating after the change.
+    """
+    if old == new:
+        return
+    deltas = {}
+    if old is not None:
+        deltas[f"star_{old}"] = -1
+        deltas["count"] = -1
+        deltas["total"] = -old
+    if new is not None:
+        deltas[f"star_{new}"] = deltas.get(f"star_{new}", 0) + 1
+        deltas["count"] = deltas.get("count", 0) + 1
+        deltas["total"] = deltas.get("total", 0) + new
+    updates = {
+        field: F(field) + delta for field, delta in deltas.items() if delta
+    }
+    row = ProductRating.objects.filter(product_id=product_id)
+    if not updates or row.update(**updates):
+        return
+    if old is not None:
+        # Nothing to subtract from; rebuild_rating_summaries repairs a
+        # missing row.
+        return
+    try:
+        with transaction.atomic():
+            ProductRating.objects.create(product_id=product_id, **deltas)
+    except IntegrityError:
+        # Another review created the row first.
+        row.update(**updates)
+
+
+def rebuild_rating_summaries():
+    """
+    Recompute every product's rating totals from the Review table.
+
+    Returns:
+        int: The number of products with reviews.
+    """
+    totals = (
+        Review.objects.values("product_id")
+        .annotate(
+            count=Count("id"),
+            total=Sum("rating"),
+            **{
+                f"star_{rating}": Count("id", filter=Q(rating=rating))
+                for rating in range(1, 6)
+            },
+        )
+        .order_by()
+    )
+    with transaction.atomic():
+        ProductRating.objects.all().delete()
+        created = ProductRating.objects.bulk_create(
+            [ProductRating(**row) for row in totals], batch_size=1000
+        )
+    return len(created)
+
+
+def summary(rating, product_id):
+    """
+    Return the API representation of a product's ratings.
+
+    Args:
+        rating (ProductRating | None): The product's totals, or None when
+            it has no reviews.
+        product_id (int): The product.
+
+    Returns:
+        dict: "product", "count", "average" and "histogram" (the number of
+        reviews for each rating, keyed "1" to "5").
+    """
+    rating = rating or ProductRating(product_id=product_id)
+    return {
+        "product": product_id,
+        "count": rating.count,
+        "average": rating.average(),
+        "histogram": {
+            str(stars): count for stars, count in rating.histogram().items()
+        },
+    }
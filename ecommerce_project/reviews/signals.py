@@ -0,0 +1,65 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from functions.versions import bump_on_commit
+from .models import Review
+from .ratings import apply_rating_change
+
+
+@receiver(pre_save, sender=Review)
+def remember_old_rating(sender, instance, **kwargs):
+    """
+    Signal handler that remembers the stored rating of a review about to be
+    edited, so update_rating_on_save can move it in the product's totals.
+
+    Args:
+        sender (type): The model class that sent the signal.
+        instance (Review): The review being saved.
+        **kwargs: Additional keyword arguments passed by the signal.
+    """
+    instance._old_rating = None
+    if instance.pk:
+        instance._old_rating = (
+            Review.objects.filter(pk=instance.pk)
+            .values_list("product_id", "rating")
+            .first()
+        )
+
+
+@receiver(post_save, sender=Review)
+def update_rating_on_save(sender, instance, created, **kwargs):
+    """
+    Signal handler that adds a new or edited review to the product's rating
+    totals (reviews.ProductRating) and purges the product's cached review
+    pages.
+
+    Args:
+        sender (type): The model class that sent the signal.
+        instance (Review): The review that was saved.
+        created (bool): Whether a new review was created.
+        **kwargs: Additional keyword arguments passed by the signal.
+    """
+    old = None if created else getattr(instance, "_old_rating", None)
+    if old and old[0] != instance.product_id:
+        # Moved to another product: take it off the old one first.
+        apply_rating_change(old[0], old=old[1])
+        bump_on_commit(f"product:{old[0]}:reviews")
+        old = None
+    apply_rating_change(
+        instance.product_id, old=old[1] if old else None, new=instance.rating
+    )
+    bump_on_commit(f"product:{instance.product_id}:reviews")
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_on_delete(sender, instance, **kwargs):
+    """
+    Signal handler that removes a deleted review from the product's rating
+    totals and purges the product's cached review pages.
+
+    Args:
+        sender (type): The model class that sent the signal.
+        instance (Review): The review that was deleted.
+        **kwargs: Additional keyword arguments passed by the signal.
+    """
+    apply_rating_change(instance.product_id, old=instance.rating)
+    bump_on_commit(f"product:{instance.product_id}:reviews")
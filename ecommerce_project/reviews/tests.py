@@ -3,8 +3,11 @@ from django.urls import reverse
 from django.contrib.auth.models import User
 from products.models import Product
 from store.models import Store
-from .models import Review
+from .models import ProductRating, Review
 from accounts.models import Profile
+from orders.models import Order, OrderItem, Purchase
+from django.core.management import call_command
+from io import StringIO
 
 
 class ReviewsTestCase(TestCase):
@@ -108,3 +111,100 @@ class ReviewsTestCase(TestCase):
         )
         self.assertEqual(response.status_code, 302)
         self.assertTrue(Review.objects.filter(title="Great Product").exists())
+
+    def test_verified_purchase(self):
+        """
+        Test the verified-purchase check.
+
+        Checks that:
+        - A review is not verified before the buyer has bought the product.
+        - Checkout records the purchase, and the next review is verified.
+        - The review list flags purchases in the query that fetches the
+          reviews.
+        - backfill_purchases rebuilds the index from past orders.
+        """
+        self.client.login(username="reviewer", password="pass123")
+        data = {"title": "Nice", "content": "", "rating": 4}
+        url = reverse("reviews:add_review", args=[self.product.id])
+        self.client.post(url, data)
+        self.assertFalse(Review.objects.get().verified)
+
+        session = self.client.session
+        session["cart"] = {str(self.product.id): 1}
+        session.save()
+        self.client.get(reverse("orders:checkout"))
+        self.assertTrue(
+            Purchase.objects.filter(
+                buyer=self.buyer, product=self.product
+            ).exists()
+        )
+        self.client.post(url, data)
+        self.assertTrue(Review.objects.get().verified)
+
+        Review.objects.update(verified=False)
+        # Session, user, profile (base.html navigation), then the reviews
+        # with their reviewers and purchase flags; the product was cached
+        # by the review above.
+        with self.assertNumQueries(4):
+            response = self.client.get(
+                reverse("reviews:review_list", args=[self.product.id])
+            )
+        self.assertContains(response, "Verified Purchase")
+
+        Purchase.objects.all().delete()
+        order = Order.objects.create(user=self.vendor)
+        OrderItem.objects.create(order=order, product=self.product, price=10)
+        call_command("backfill_purchases", "--reverify", stdout=StringIO())
+        self.assertEqual(Purchase.objects.count(), 2)
+        self.assertTrue(Review.objects.get().verified)
+
+    def test_rating_summary_api(self):
+        """
+        Test that the rating totals follow reviews as they are created,
+        edited and deleted, and that the summary endpoints serve them from
+        ProductRating without reading the Review table.
+        """
+        other = User.objects.create_user(username="other", password="x")
+        review = Review.objects.create(
+            product=self.product, reviewer=self.buyer, rating=5, title="A"
+        )
+        Review.objects.create(
+            product=self.product, reviewer=other, rating=2, title="B"
+        )
+        review.rating = 4
+        review.save()
+
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse("api_review_summary", args=[self.product.id])
+            )
+        self.assertEqual(
+            response.json(),
+            {
+                "product": self.product.id,
+                "count": 2,
+                "average": 3.0,
+                "histogram": {"1": 0, "2": 1, "3": 0, "4": 1, "5": 0},
+            },
+        )
+        self.assertIn("max-age=60", response["Cache-Control"])
+
+        review.delete()
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse("api_review_summaries"),
+                {"ids": f"{self.product.id},999999"},
+            )
+        first, missing = response.json()
+        self.assertEqual(first["count"], 1)
+        self.assertEqual(first["histogram"]["2"], 1)
+        self.assertEqual(missing["count"], 0)
+        self.assertIsNone(missing["average"])
+        response = self.client.get(
+            reverse("api_review_summaries"), {"ids": "x"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+        ProductRating.objects.all().delete()
+        call_command("rebuild_rating_summaries", stdout=StringIO())
+        self.assertEqual(ProductRating.objects.get().total, 2)
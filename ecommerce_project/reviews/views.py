@@ -1,10 +1,12 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import render, redirect
 from .models import Review
 from .forms import ReviewForm
-from products.models import Product
+from products.cache import get_product_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from accounts.decorators import buyer_required  # Import buyer_required
+from orders.purchases import has_purchased, purchased
+from functions.pagecache import cache_shared_page, tag_page
 
 
 # Define the function to check if the user purchased the product
@@ -21,15 +23,11 @@ def check_if_user_purchased_product(user, product):
         bool: True if the user has purchased the product, False otherwise.
 
     Note:
-        This function currently contains placeholder logic and always
-        returns False.
-        Replace the placeholder logic with the actual implementation to check
-        the user's purchase history.
+        Checkout records every (buyer, product) pair in the purchase index
+        (orders.Purchase), so this is a single probe of its unique index
+        rather than a scan of the user's orders.
     """
-    # Replace the following logic with the actual implementation
-    # return product.orders.filter(user=user).exists()
-    return False  # Temporarily return False until order logic is implemented.
-    # Implement proper logic later.
+    return has_purchased(user, product)
 
 
 @login_required
@@ -69,7 +67,7 @@ def add_review(request, product_id):
     Raises:
         Http404: If the product with the given ID does not exist.
     """
-    product = get_object_or_404(Product, id=product_id)
+    product = get_product_or_404(product_id)
 
     # Check if the user has already reviewed the product.
     # I want to restrict users to only one review per product.
@@ -99,10 +97,16 @@ def add_review(request, product_id):
     )
 
 
+@cache_shared_page
 def review_list(request, product_id):
     """
     Handles the retrieval and display of reviews for a specific product.
 
+    Each review is flagged ``purchased`` when its author has bought the
+    product, in the same query that fetches the reviews, so the "Verified
+    Purchase" badges cost no extra lookups. Served from the shared page
+    cache until the product or its reviews change.
+
     Args:
         request (HttpRequest): The HTTP request object.
         product_id (int): The ID of the product for which reviews are to be
@@ -115,8 +119,13 @@ def review_list(request, product_id):
     Raises:
         Http404: If the product with the given ID does not exist.
     """
-    product = get_object_or_404(Product, id=product_id)
-    reviews = product.reviews.all()
+    tag_page(request, f"product:{product_id}", f"product:{product_id}:reviews")
+    product = get_product_or_404(product_id)
+    reviews = (
+        product.reviews.select_related("reviewer")
+        .annotate(purchased=purchased())
+        .order_by("-created_at")
+    )
     return render(
         request,
         "reviews/review_list.html",
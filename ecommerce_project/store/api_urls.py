@@ -4,4 +4,5 @@ from . import api_views
 urlpatterns = [
     path("list/", api_views.list_stores, name="api_list_stores"),
     path("add/", api_views.add_store, name="api_add_store"),
+    path("sales/", api_views.sales_report, name="api_store_sales"),
 ]
@@ -9,6 +9,7 @@ from .serializers import StoreSerializer
 from .models import Store
 from rest_framework.authentication import BasicAuthentication
 from rest_framework.permissions import IsAuthenticated
+from orders import rollups
 
 
 @api_view(["GET"])
@@ -88,3 +89,42 @@ def store_list(request):
         stores = Store.objects.all()
     serializer = StoreSerializer(stores, many=True)
     return Response(serializer.data)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def sales_report(request):
+    """
+    Retrieve revenue, units and top products for the logged-in vendor.
+
+    The figures are read from the DailySales rollup only, so the response
+    time does not grow with the vendor's order history.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Query Parameters:
+        start (str, optional): The first day (YYYY-MM-DD). Defaults to 29
+            days before ``end``.
+        end (str, optional): The last day (YYYY-MM-DD). Defaults to today.
+        store (int, optional): One of the vendor's stores to report on.
+            Defaults to all of them.
+
+    Returns:
+        Response: A Response object containing the report, or an error
+        message with a 404 NOT FOUND status if ``store`` is not the id of
+        one of the vendor's stores.
+    """
+    stores = Store.objects.filter(vendor=request.user)
+    store_id = request.query_params.get("store")
+    if store_id:
+        if store_id.isdecimal():
+            stores = stores.filter(id=store_id)
+        else:
+            stores = stores.none()
+        if not stores.exists():
+            return Response(
+                {"error": "Store not found"}, status=status.HTTP_404_NOT_FOUND
+            )
+    start, end = rollups.report_range(request.query_params)
+    return Response(rollups.sales_report(stores, start, end))
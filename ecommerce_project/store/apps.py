@@ -14,6 +14,17 @@ class StoreConfig(AppConfig):
         "django.db.models.BigAutoField".
         name (str): The full Python path to the application,
         in this case "store".
+
+    Methods:
+        ready():
+            Imports `store.signals` so saving or deleting a store
+            invalidates the caches built from it.
     """
     default_auto_field = "django.db.models.BigAutoField"
     name = "store"
+
+    def ready(self):
+        """
+        Register the signal handlers that bump the stores' cache versions.
+        """
+        import store.signals  # noqa: F401
@@ -0,0 +1,25 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from functions.versions import bump_on_commit
+from products.cache import invalidate_store_products
+from .models import Store
+
+
+@receiver(post_save, sender=Store)
+@receiver(post_delete, sender=Store)
+def invalidate_store(sender, instance, **kwargs):
+    """
+    Signal handler that invalidates everything cached from a saved or
+    deleted store, in every process, by bumping the store's, its vendor's
+    and the catalog's version namespaces (see functions.versions), and the
+    cached products that carry the store.
+
+    Args:
+        sender (type): The model class that sent the signal.
+        instance (Store): The store that was saved or deleted.
+        **kwargs: Additional keyword arguments passed by the signal.
+    """
+    bump_on_commit(
+        f"store:{instance.pk}", f"vendor:{instance.vendor_id}", "catalog"
+    )
+    invalidate_store_products(instance.pk)
@@ -2,6 +2,11 @@ from django.test import TestCase, Client
 from django.urls import reverse
 from django.contrib.auth.models import User
 from .models import Store
+from products.models import Product
+from orders.models import DailySales, Order, OrderItem
+from accounts.models import Profile
+from reviews.models import Review
+from datetime import date
 
 
 class StoreTestCase(TestCase):
@@ -109,3 +114,178 @@ class StoreTestCase(TestCase):
         )
         self.assertEqual(response.status_code, 302)
         self.assertFalse(Store.objects.filter(id=self.store.id).exists())
+
+    def test_vendor_orders(self):
+        """
+        Test the vendor's fulfilment list.
+
+        Checks that:
+        - Only order lines of the vendor's own stores are listed, newest
+          first.
+        - The ``store`` filter narrows the list to one store.
+        - Another vendor's store cannot be selected.
+        """
+        product = Product.objects.create(
+            store=self.store, name="Mug", description="Desc", price=5
+        )
+        other_vendor = User.objects.create_user(
+            username="vendor2", password="pass123"
+        )
+        other_store = Store.objects.create(
+            vendor=other_vendor, name="Other", description="Desc"
+        )
+        other_product = Product.objects.create(
+            store=other_store, name="Cup", description="Desc", price=5
+        )
+        buyer = User.objects.create_user(username="buyer1", password="x")
+        for item_product in (product, other_product, product):
+            order = Order.objects.create(user=buyer)
+            OrderItem.objects.create(
+                order=order,
+                product=item_product,
+                price=5,
+                store=item_product.store,
+                vendor=item_product.store.vendor,
+                created_at=order.created_at,
+            )
+
+        response = self.client.get(reverse("store:vendor_orders"))
+        self.assertEqual(response.status_code, 200)
+        items = response.context["page"].items
+        self.assertEqual(len(items), 2)
+        self.assertTrue(all(item.product == product for item in items))
+        self.assertGreater(items[0].order_id, items[1].order_id)
+
+        response = self.client.get(
+            reverse("store:vendor_orders"), {"store": self.store.id}
+        )
+        self.assertEqual(len(response.context["page"]), 2)
+        response = self.client.get(
+            reverse("store:vendor_orders"), {"store": other_store.id}
+        )
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(
+            reverse("store:vendor_orders"), {"store": "abc"}
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_vendor_orders_skip_failed_checkouts(self):
+        """
+        Test that a checkout failing on stock leaves nothing in the
+        vendor's fulfilment list, not even the lines that were in stock.
+        """
+        in_stock = Product.objects.create(
+            store=self.store, name="Mug", description="Desc", price=5,
+            stock=5,
+        )
+        sold_out = Product.objects.create(
+            store=self.store, name="Cup", description="Desc", price=5,
+            stock=0,
+        )
+        buyer = User.objects.create_user(username="buyer1", password="x")
+        profile, _ = Profile.objects.get_or_create(user=buyer)
+        profile.account_type = "buyer"
+        profile.save()
+        shopper = Client()
+        shopper.login(username="buyer1", password="x")
+        session = shopper.session
+        session["cart"] = {str(in_stock.id): 2, str(sold_out.id): 1}
+        session.save()
+        response = shopper.get(reverse("orders:checkout"))
+        self.assertRedirects(response, reverse("orders:view_cart"))
+
+        response = self.client.get(reverse("store:vendor_orders"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["page"]), 0)
+
+    def test_vendor_analytics(self):
+        """
+        Test the sales analytics page and API.
+
+        Both read the DailySales rollup for the requested date range and
+        report the revenue, units and top products of the vendor's stores.
+        """
+        mug = Product.objects.create(
+            store=self.store, name="Mug", description="Desc", price=5
+        )
+        cup = Product.objects.create(
+            store=self.store, name="Cup", description="Desc", price=20
+        )
+        DailySales.objects.bulk_create(
+            [
+                DailySales(
+                    store=self.store,
+                    product=mug,
+                    date=date(2025, 3, 1),
+                    units=4,
+                    revenue=20,
+                ),
+                DailySales(
+                    store=self.store,
+                    product=cup,
+                    date=date(2025, 3, 2),
+                    units=2,
+                    revenue=40,
+                ),
+                # Outside the range below.
+                DailySales(
+                    store=self.store,
+                    product=mug,
+                    date=date(2025, 4, 1),
+                    units=100,
+                    revenue=500,
+                ),
+            ]
+        )
+        params = {"start": "2025-03-01", "end": "2025-03-31"}
+        response = self.client.get(reverse("store:vendor_analytics"), params)
+        self.assertEqual(response.status_code, 200)
+        report = response.context["report"]
+        self.assertEqual(report["units"], 6)
+        self.assertEqual(report["revenue"], 60)
+        self.assertEqual(len(report["days"]), 2)
+        self.assertEqual(report["top_products"][0]["name"], "Cup")
+
+        response = self.client.get(reverse("api_store_sales"), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["units"], 6)
+        response = self.client.get(reverse("api_store_sales"), {"store": 0})
+        self.assertEqual(response.status_code, 404)
+        for name in ("store:vendor_analytics", "api_store_sales"):
+            response = self.client.get(reverse(name), {"store": "abc"})
+            self.assertEqual(response.status_code, 404)
+
+    def test_vendor_dashboard_summaries(self):
+        """
+        Test that the dashboard shows each store's inventory and rating
+        figures, computed in one query however many stores there are.
+        """
+        mug = Product.objects.create(
+            store=self.store, name="Mug", description="Desc", price=5, stock=4
+        )
+        Product.objects.create(
+            store=self.store, name="Cup", description="Desc", price=20
+        )
+        for rating in (4, 5):
+            Review.objects.create(
+                product=mug, reviewer=self.user, rating=rating, title="Ok"
+            )
+        for i in range(5):
+            Store.objects.create(
+                vendor=self.user, name=f"Store {i}", description="Desc"
+            )
+
+        # Session, user, profile, stores.
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse("store:vendor_dashboard"))
+        stores = {store.name: store for store in response.context["stores"]}
+        self.assertEqual(len(stores), 6)
+        store = stores["Test Store"]
+        self.assertEqual(store.product_count, 2)
+        self.assertEqual(store.stock_units, 4)
+        self.assertEqual(store.inventory_value, 20)
+        self.assertEqual(store.out_of_stock, 1)
+        self.assertEqual(store.review_count, 2)
+        self.assertEqual(store.avg_rating, 4.5)
+        self.assertIsNone(stores["Store 0"].avg_rating)
+        self.assertEqual(stores["Store 0"].inventory_value, 0)
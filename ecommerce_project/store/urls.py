@@ -5,6 +5,8 @@ app_name = "store"
 
 urlpatterns = [
     path("dashboard/", views.vendor_dashboard, name="vendor_dashboard"),
+    path("orders/", views.vendor_orders, name="vendor_orders"),
+    path("analytics/", views.vendor_analytics, name="vendor_analytics"),
     path("create/", views.create_store, name="create_store"),
     path("edit/<int:store_id>/", views.edit_store, name="edit_store"),
     path("delete/<int:store_id>/", views.delete_store, name="delete_store"),
@@ -1,22 +1,188 @@
+from django.http import Http404
 from django.shortcuts import render, redirect, get_object_or_404
 from accounts.decorators import vendor_required  # Import vendor_required
 from django.contrib.auth.decorators import login_required
+from django.db.models import (
+    Avg,
+    Count,
+    DecimalField,
+    F,
+    IntegerField,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+)
+from django.db.models.functions import Coalesce
 from .models import Store
 from products.models import Product
+from orders.models import OrderItem
+from orders.rollups import report_range, sales_report
+from reviews.models import Review
 from .forms import StoreForm
 # from django.urls import reverse
 from django.contrib import messages
-from functions.tweet import Tweet  # For Phase 2 Twitter integration
+from functions.tweet import queue_tweet  # For Phase 2 Twitter integration
+from functions.pagination import keyset_page
+
+# Order lines shown per page of the vendor's fulfilment list.
+VENDOR_ORDERS_PAGE_SIZE = 25
+
+
+def with_summaries(stores):
+    """
+    Annotate stores with their inventory and rating figures.
+
+    Everything is computed by the database in the single query that lists
+    the stores, so the dashboard costs the same however many stores and
+    products a vendor has. The product aggregates share one join; the
+    average rating comes from a correlated subquery so reviews never
+    multiply the product rows.
+
+    Args:
+        stores (QuerySet): The stores to annotate.
+
+    Returns:
+        QuerySet: The stores, each with ``product_count``, ``stock_units``,
+        ``inventory_value`` (price x stock summed over products),
+        ``out_of_stock`` (products with no stock), ``review_count`` and
+        ``avg_rating`` (None when the store has no reviews).
+    """
+    reviews = (
+        Review.objects.filter(product__store=OuterRef("pk"))
+        .order_by()
+        .values("product__store")
+    )
+    return stores.annotate(
+        product_count=Count("products"),
+        stock_units=Coalesce(Sum("products__stock"), 0),
+        inventory_value=Coalesce(
+            Sum(
+                F("products__price") * F("products__stock"),
+                output_field=DecimalField(max_digits=14, decimal_places=2),
+            ),
+            0,
+            output_field=DecimalField(max_digits=14, decimal_places=2),
+        ),
+        out_of_stock=Count("products", filter=Q(products__stock=0)),
+        review_count=Coalesce(
+            Subquery(
+                reviews.annotate(count=Count("id")).values("count"),
+                output_field=IntegerField(),
+            ),
+            0,
+        ),
+        avg_rating=Subquery(
+            reviews.annotate(rating=Avg("rating")).values("rating")
+        ),
+    )
+
+
+def selected_store(stores, store_id):
+    """
+    Return the store a ``store`` query parameter selects.
+
+    Args:
+        stores (QuerySet): The stores the user may select.
+        store_id (str | None): The parameter's value.
+
+    Returns:
+        Store | None: The store, or None when no store is selected.
+
+    Raises:
+        Http404: If ``store_id`` is not the id of one of ``stores``.
+    """
+    if not store_id:
+        return None
+    try:
+        store_id = int(store_id)
+    except ValueError:
+        raise Http404("No such store.")
+    return get_object_or_404(stores, id=store_id)
 
 
 @login_required(login_url="accounts:login")
 @vendor_required
 def vendor_dashboard(request):
-    # Display stores belonging to the logged-in vendor.
-    stores = Store.objects.filter(vendor=request.user)
+    # Display stores belonging to the logged-in vendor, with their
+    # inventory and rating summaries computed in the same query.
+    stores = with_summaries(
+        Store.objects.filter(vendor=request.user).order_by("name")
+    )
     return render(request, "store/vendor_dashboard.html", {"stores": stores})
 
 
+@login_required(login_url="accounts:login")
+@vendor_required
+def vendor_analytics(request):
+    """
+    Show the logged-in vendor's revenue, units and top products.
+
+    Figures come from the DailySales rollup maintained at checkout, so the
+    page costs the same however many orders the vendor has received.
+
+    Args:
+        request (HttpRequest): The HTTP request object. The optional
+            ``start`` and ``end`` query parameters (YYYY-MM-DD) select the
+            date range, the last 30 days by default; ``store`` narrows the
+            report to one of the vendor's stores.
+
+    Returns:
+        HttpResponse: The rendered "store/vendor_analytics.html" template.
+
+    Raises:
+        Http404: If ``store`` is not one of the vendor's stores.
+    """
+    stores = Store.objects.filter(vendor=request.user)
+    store = selected_store(stores, request.GET.get("store"))
+    start, end = report_range(request.GET)
+    report = sales_report([store] if store else stores, start, end)
+    return render(
+        request,
+        "store/vendor_analytics.html",
+        {"report": report, "stores": stores, "store": store},
+    )
+
+
+@login_required(login_url="accounts:login")
+@vendor_required
+def vendor_orders(request):
+    """
+    List the order lines the logged-in vendor has to fulfil, newest first.
+
+    Order items carry their store, vendor and order time from checkout, so
+    the list is read straight from the (vendor, created_at, id) index, or
+    the (store, created_at, id) index when the optional ``store`` query
+    parameter narrows it to one of the vendor's stores. Pages are
+    keyset-paginated with the ``cursor`` query parameter, so every page
+    costs the same however many orders the vendor has received.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        HttpResponse: The rendered "store/vendor_orders.html" template.
+
+    Raises:
+        Http404: If ``store`` is not one of the vendor's stores.
+    """
+    stores = Store.objects.filter(vendor=request.user)
+    store = selected_store(stores, request.GET.get("store"))
+    items = OrderItem.objects.filter(vendor=request.user)
+    if store:
+        items = OrderItem.objects.filter(store=store)
+    page = keyset_page(
+        items.select_related("order__user", "product"),
+        request.GET.get("cursor"),
+        VENDOR_ORDERS_PAGE_SIZE,
+    )
+    return render(
+        request,
+        "store/vendor_orders.html",
+        {"page": page, "stores": stores, "store": store},
+    )
+
+
 @login_required(login_url="accounts:login")
 @vendor_required
 def create_store(request):
@@ -24,8 +190,8 @@ def create_store(request):
     Handle the creation of a new store by a vendor.
     This view processes a POST request containing store details submitted via a
     form. If the form is valid, it saves the store instance, associates it
-    with the logged-in user (vendor), and optionally sends a tweet announcing
-    the new store. If the request method is not POST, it renders an empty
+    with the logged-in user (vendor), and queues a tweet announcing the new
+    store. If the request method is not POST, it renders an empty
     form for creating a store.
 
     Args:
@@ -36,10 +202,6 @@ def create_store(request):
         HttpResponse: Redirects to the vendor dashboard upon successful
         store creation. Otherwise, renders the store creation form template.
 
-    Raises:
-        Exception: Logs any errors that occur while attempting to send a tweet,
-        but does not interrupt the flow of the application.
-
     Template:
         store/store_form.html: The template used to render the store creation
         form.
@@ -50,7 +212,8 @@ def create_store(request):
 
     Notes:
         - The `StoreForm` is used to validate and save the store data.
-        - The `Tweet` class is used to send a tweet about the new store.
+        - `queue_tweet` queues a tweet about the new store; the
+          publish_tweets worker posts it.
         - The logged-in user is assumed to be the vendor creating the store.
     """
     if request.method == "POST":
@@ -68,25 +231,8 @@ def create_store(request):
                 f"{store.name}\n\n"
                 f"{store.description}"
             )
-            tweet_data = {"text": new_store_tweet}
-            try:
-                # Ensure that the Tweet instance is created.
-                if not hasattr(Tweet, "_instance") or Tweet._instance is None:
-                    tweet_obj = (
-                        Tweet()
-                    )  # This should create and set the singleton instance.
-                else:
-                    tweet_obj = Tweet._instance
-                tweet_data = {
-                    "text": (
-                        f"New store open on eStore!\n{store.name}\n"
-                        f"{store.description}"
-                    )
-                }
-                tweet_obj.make_tweet(tweet_data)
-            except Exception as e:
-                # Log the error but do not interrupt the flow.
-                print("Error sending tweet:", e)
+            # Queued for the publish_tweets worker; never waits on Twitter.
+            queue_tweet(new_store_tweet)
 
             messages.success(request, "Store created successfully.")
 